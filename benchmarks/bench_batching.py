@@ -0,0 +1,92 @@
+"""Бенчмарк микро-пакетов legacy completions (OpenAICompletionBackend).
+
+Вместо OpenAI - заглушка клиента с задержкой --call-latency на вызов и
+--item-latency на каждый промпт в пачке. Запросы приходят пуассоновским
+потоком с частотой --rate в секунду; для каждого окна сбора печатается
+количество вызовов API, средний размер пачки и задержки ответа.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_batching.py [--requests N] [--rate R] [--windows 0,5,10,20]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from botcore.openai_backend import OpenAICompletionBackend  # noqa: E402
+
+
+class StubCompletions:
+    """client.completions с фиксированной стоимостью вызова и промпта"""
+    def __init__(self, call_latency: float, item_latency: float):
+        self.call_latency = call_latency
+        self.item_latency = item_latency
+        self.calls = 0
+
+    async def create(self, model, prompt, max_tokens, temperature):
+        prompts = prompt if isinstance(prompt, list) else [prompt]
+        self.calls += 1
+        await asyncio.sleep(self.call_latency + self.item_latency * len(prompts))
+        # Порядок choices намеренно перемешан: сопоставление идёт по index
+        choices = [SimpleNamespace(index=i, text=" ответ на " + p.rsplit("Пользователь: ", 1)[1].split("\n")[0])
+                   for i, p in enumerate(prompts)]
+        random.shuffle(choices)
+        usage = {"prompt_tokens": 10 * len(prompts), "completion_tokens": 5 * len(prompts)}
+        return SimpleNamespace(choices=choices, usage=usage)
+
+
+async def run_window(window_ms: float, args) -> None:
+    stub = StubCompletions(args.call_latency, args.item_latency)
+    backend = OpenAICompletionBackend(SimpleNamespace(completions=stub), "stub",
+                                      batch_window=window_ms / 1000, max_batch=args.max_batch)
+    rng = random.Random(1)
+    latencies = []
+    mismatched = 0
+
+    async def one(i: int):
+        nonlocal mismatched
+        started = time.perf_counter()
+        completion = await backend.generate([{"role": "user", "content": f"вопрос {i:06d}"}])
+        latencies.append(time.perf_counter() - started)
+        if not completion.text.endswith(f"{i:06d}"):
+            mismatched += 1
+
+    tasks = []
+    started = time.perf_counter()
+    for i in range(args.requests):
+        tasks.append(asyncio.create_task(one(i)))
+        await asyncio.sleep(rng.expovariate(args.rate))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    print(f"окно {window_ms:5.1f} мс: вызовов API {stub.calls:5}   пачка {args.requests / stub.calls:5.1f}   "
+          f"p50 {statistics.median(latencies) * 1000:6.1f} мс   p99 {latencies[int(len(latencies) * 0.99)] * 1000:6.1f} мс   "
+          f"всего {elapsed:.2f} с   ошибок сопоставления {mismatched}")
+
+
+async def main_async(args):
+    for window in args.windows:
+        await run_window(window, args)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000, help="Количество запросов")
+    parser.add_argument("--rate", type=float, default=500, help="Запросов в секунду")
+    parser.add_argument("--windows", type=lambda s: [float(x) for x in s.split(",")], default=[0, 5, 10, 20],
+                        help="Окна сбора пачки в мс через запятую (0 - без пачек)")
+    parser.add_argument("--max-batch", type=int, default=16, help="Максимальный размер пачки")
+    parser.add_argument("--call-latency", type=float, default=0.3, help="Задержка вызова API, с")
+    parser.add_argument("--item-latency", type=float, default=0.005, help="Добавка за каждый промпт, с")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
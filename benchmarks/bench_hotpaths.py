@@ -0,0 +1,157 @@
+"""Микробенчмарки горячих путей обработки текста с сохранённым эталоном.
+
+Замеряются функции, через которые проходит каждое сообщение: экранирование
+MarkdownV2, нарезка ответа на части, удаление <think>, разбор PDF,
+декодирование текстовых файлов (включая запасную кодировку) и проверка
+расширения документа. Входные данные - ответы с кириллицей и разметкой,
+PDF на десятки страниц, многомегабайтные логи.
+
+Результаты сравниваются с benchmarks/baselines/hotpaths.json; замедление
+больше --threshold (после повторного замера) помечается и даёт код
+выхода 1. Эталон зависит от машины и версии Python - после смены
+окружения или намеренного изменения производительности его нужно
+перезаписать с --save.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_hotpaths.py [--save] [--threshold 0.25] [--filter pdf]
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import timeit
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_markdown import make_input  # noqa: E402
+from benchmarks.loadtest import make_pdf  # noqa: E402
+from botcore.attachments import decode_text, extract_text_from_pdf, truncate_text  # noqa: E402
+from botcore.config import BotConfig  # noqa: E402
+from botcore.llm import strip_think  # noqa: E402
+from botcore.markdown import chunk_text, escape_markdown_v2  # noqa: E402
+from botcore.pipeline import Pipeline  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "hotpaths.json")
+
+LOG_LINE = "2025-03-14 12:00:{s:02d} INFO [worker-{w}] Пользователь {u} отправил запрос /api/v1/chat за {ms} мс\n"
+
+Case = Tuple[str, Callable[[], object]]
+
+
+def make_log(size: int) -> str:
+    lines = []
+    total = 0
+    i = 0
+    while total < size:
+        line = LOG_LINE.format(s=i % 60, w=i % 8, u=1000 + i % 997, ms=i % 500)
+        lines.append(line)
+        total += len(line)
+        i += 1
+    return "".join(lines)
+
+
+def make_think_answer(think_chars: int, answer_chars: int) -> str:
+    return "<think>" + make_input(think_chars) + "</think>\n" + make_input(answer_chars)
+
+
+def cases() -> List[Case]:
+    answer_4k = make_input(4_000)
+    answer_75k = make_input(75_000)
+    escaped_75k = escape_markdown_v2(answer_75k)
+    backslashes = ("\\" * 7 + "ё") * 20_000
+    think = make_think_answer(6_000, 2_000)
+    plain = make_input(2_000)
+    pdf = make_pdf(60)
+    log_utf8 = make_log(5 * 2**20).encode("utf-8")
+    log_cp1251 = make_log(2 * 2**20).encode("cp1251")
+    encodings = ("utf-8", "cp1251")
+    pipeline = Pipeline(BotConfig("bench", "stub", "", accept_pdf=True), backend=None)
+    filenames = [f"file{i}{ext}" for i, ext in
+                 enumerate([".PY", ".txt", ".md", ".pdf", ".exe", ".json", ".tar.gz", ".LOG", "", ".csv"] * 100)]
+    return [
+        ("escape_markdown_v2 4k", lambda: escape_markdown_v2(answer_4k)),
+        ("escape_markdown_v2 75k", lambda: escape_markdown_v2(answer_75k)),
+        ("chunk_text 75k/4000", lambda: chunk_text(escaped_75k, 4000)),
+        ("chunk_text backslashes/2000", lambda: chunk_text(backslashes, 2000)),
+        ("strip_think with block", lambda: strip_think(think)),
+        ("strip_think without block", lambda: strip_think(plain)),
+        ("extract_text_from_pdf 60 pages", lambda: extract_text_from_pdf(pdf, 10**9)),
+        ("extract_text_from_pdf limit 30k", lambda: extract_text_from_pdf(pdf, 30_000)),
+        ("decode_text utf-8 5MB", lambda: truncate_text(decode_text(log_utf8, encodings), 75_000)),
+        ("decode_text cp1251 2MB", lambda: truncate_text(decode_text(log_cp1251, encodings), 75_000)),
+        ("is_supported_document x1000", lambda: [pipeline.is_supported_document(f) for f in filenames]),
+    ]
+
+
+def measure(func: Callable[[], object], repeat: int) -> float:
+    """Лучшее время одного вызова, с"""
+    timer = timeit.Timer(func)
+    number = timer.autorange()[0]
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def environment() -> Dict[str, str]:
+    return {"python": platform.python_version(), "machine": platform.machine(), "system": platform.system()}
+
+
+def load_baseline() -> Dict:
+    if not os.path.exists(BASELINE):
+        return {}
+    with open(BASELINE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def format_time(seconds: float) -> str:
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:9.2f} мс "
+    return f"{seconds * 1e6:9.1f} мкс"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--save", action="store_true", help="Записать результаты как новый эталон")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Допустимое замедление, доля")
+    parser.add_argument("--repeat", type=int, default=7, help="Количество замеров, берётся минимум")
+    parser.add_argument("--filter", default="", help="Только случаи, содержащие подстроку")
+    args = parser.parse_args()
+
+    baseline = load_baseline()
+    reference = baseline.get("results", {})
+    if baseline and baseline.get("environment") != environment():
+        print(f"Эталон снят в другом окружении ({baseline.get('environment')}), сравнение приблизительное")
+
+    results = {}
+    regressions = []
+    for name, func in cases():
+        if args.filter not in name:
+            continue
+        best = measure(func, args.repeat)
+        if name in reference and best / reference[name] - 1 > args.threshold:
+            # Разовый выброс (соседний процесс, частота CPU) не считается регрессией
+            best = min(best, measure(func, args.repeat))
+        results[name] = best
+        line = f"{name:<34} {format_time(best)}"
+        if name in reference:
+            change = best / reference[name] - 1
+            line += f"   эталон {format_time(reference[name])}   {change:+7.1%}"
+            if change > args.threshold:
+                line += "   РЕГРЕССИЯ"
+                regressions.append(name)
+        print(line)
+
+    if args.save:
+        merged = {**reference, **results}
+        os.makedirs(os.path.dirname(BASELINE), exist_ok=True)
+        with open(BASELINE, "w", encoding="utf-8") as f:
+            json.dump({"environment": environment(), "results": merged}, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"Эталон записан: {BASELINE}")
+    elif regressions:
+        print(f"Замедление больше {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
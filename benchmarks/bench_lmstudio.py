@@ -0,0 +1,239 @@
+"""Сценарии LMStudioClient на заглушке LM Studio (benchmarks/mock_lmstudio.py).
+
+Сценарии (--scenario, по умолчанию все):
+- concurrency - один сервер с --slots слотами, растущее число одновременных
+  пользователей: пропускная способность, токены в секунду, p50/p95 и
+  глубина очереди на сервере;
+- failover - два сервера, второй отвечает ошибками (--error-rate) и рвёт
+  соединения (--drop-rate): сколько ошибок дошло до пользователя и сколько
+  запросов спасло переключение на живой сервер;
+- health - два сервера, первый падает на --down-at секунд и поднимается:
+  по секундам видно, как быстро предохранитель перестаёт слать на него
+  запросы и как быстро фоновая проверка возвращает его в работу;
+- stream - потоковая выдача с <think>: время до первого токена, до первого
+  видимого токена после </think> и до конца ответа.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_lmstudio.py [--scenario concurrency,failover,health,stream] [--slots 2]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.mock_lmstudio import MockLMStudio, MockSettings  # noqa: E402
+from botcore import shared  # noqa: E402
+from botcore.llm import LLMError  # noqa: E402
+from botcore.lmstudio import LMStudioClient  # noqa: E402
+
+BASE_PORT = 18500
+SCENARIOS = ("concurrency", "failover", "health", "stream")
+
+
+def url(port: int) -> str:
+    return f"http://127.0.0.1:{port}/v1/chat/completions"
+
+
+def history(user: int, turn: int) -> List[dict]:
+    """Диалог пользователя: системный промпт, прошлые реплики, новый вопрос"""
+    messages = [{"role": "system", "content": "Ты полезный ассистент. " * 20}]
+    for i in range(turn):
+        messages.append({"role": "user", "content": f"вопрос {user}.{i} " * 10})
+        messages.append({"role": "assistant", "content": f"ответ {user}.{i} " * 30})
+    messages.append({"role": "user", "content": f"вопрос {user}.{turn} " * 10})
+    return messages
+
+
+def ms(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] * 1000 if values else 0.0
+
+
+async def concurrency(args):
+    print(f"== concurrency: слотов {args.slots}, {args.tps:g} ток/с, ответ {args.answer_tokens} ток.")
+    for users in args.users:
+        mock = MockLMStudio(MockSettings(slots=args.slots, ttft=args.ttft, tps=args.tps,
+                                         answer_tokens=args.answer_tokens))
+        await mock.start(port=BASE_PORT)
+        client = LMStudioClient(url(BASE_PORT), "bench")
+        timings = []
+
+        async def user_loop(user: int):
+            for turn in range(args.turns):
+                started = time.perf_counter()
+                await client.complete(history(user, turn), session_key=str(user))
+                timings.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user_loop(u) for u in range(users)))
+        elapsed = time.perf_counter() - started
+        stats = mock.stats
+        print(f"  пользователей {users:3}: {len(timings) / elapsed:6.2f} запр/с   "
+              f"{stats['completion_tokens'] / elapsed:7.1f} ток/с   p50 {ms(timings, 0.5):7.0f} мс   "
+              f"p95 {ms(timings, 0.95):7.0f} мс   очередь до {stats['queued_peak']:.0f}   "
+              f"из KV-кэша {stats['cached_tokens'] / max(1, stats['cached_tokens'] + stats['prefill_tokens']):.0%}")
+        await client.stop_probes()
+        await mock.stop()
+
+
+async def failover(args):
+    print(f"== failover: второй сервер - ошибки {args.error_rate:.0%}, обрывы {args.drop_rate:.0%}")
+    for servers in (1, 2):
+        # В режиме одного сервера работает только сбойный
+        mocks = [MockLMStudio(MockSettings(slots=4, ttft=0.01, tps=0, answer_tokens=20, tag=f"#{i}",
+                                           error_rate=args.error_rate if i == servers - 1 else 0,
+                                           drop_rate=args.drop_rate if i == servers - 1 else 0), seed=i)
+                 for i in range(servers)]
+        for i, mock in enumerate(mocks):
+            await mock.start(port=BASE_PORT + i)
+        client = LMStudioClient([url(BASE_PORT + i) for i in range(servers)], "bench", probe_interval=0.5,
+                                sticky=True)
+        errors = Counter()
+        served = Counter()
+
+        async def one(i: int):
+            try:
+                answer = await client.complete(history(i % 20, 0), session_key=str(i % 20))
+            except LLMError as e:
+                errors[str(e)] += 1
+                return
+            served[answer.rsplit("#", 1)[1]] += 1
+
+        started = time.perf_counter()
+        for start in range(0, args.requests, 16):
+            await asyncio.gather(*(one(i) for i in range(start, min(args.requests, start + 16))))
+        elapsed = time.perf_counter() - started
+        failed = sum(m.stats["errors"] + m.stats["drops"] for m in mocks)
+        print(f"  серверов {servers}: {elapsed:.2f} с, сбоев на серверах {failed}, "
+              f"ошибок у пользователей {sum(errors.values())}, ответили " +
+              ", ".join(f"#{k} {v}" for k, v in sorted(served.items())))
+        for status in await client.status():
+            print(f"    {status['url']}: предохранитель {status['breaker']}, ошибок {status['failed']}")
+        await client.stop_probes()
+        for mock in mocks:
+            await mock.stop()
+
+
+async def health(args):
+    print(f"== health: сервер #0 недоступен с {args.down_at:g} по {args.down_at + args.down_for:g} с, "
+          f"проверка раз в {args.probe_interval:g} с")
+    mocks = [MockLMStudio(MockSettings(slots=8, ttft=0.02, tps=0, answer_tokens=20, tag=f"#{i}"), seed=i)
+             for i in range(2)]
+    for i, mock in enumerate(mocks):
+        await mock.start(port=BASE_PORT + i)
+    # Как в скриптах morkvaai: без sticky при малой нагрузке поднявшийся сервер
+    # не получает запросов, пока второй не станет медленнее
+    client = LMStudioClient([url(BASE_PORT + i) for i in range(2)], "bench", probe_interval=args.probe_interval,
+                            sticky=True)
+    client.start_probes()
+    buckets = defaultdict(Counter)
+    latencies = defaultdict(list)
+    started = time.perf_counter()
+
+    async def one(i: int):
+        sent = time.perf_counter()
+        second = int(sent - started)
+        try:
+            answer = await client.complete(history(i % 20, 0), session_key=str(i % 20))
+            buckets[second]["#" + answer.rsplit("#", 1)[1]] += 1
+        except LLMError:
+            buckets[second]["ошибка"] += 1
+        latencies[second].append(time.perf_counter() - sent)
+
+    async def chaos():
+        await asyncio.sleep(args.down_at)
+        await mocks[0].stop()
+        await asyncio.sleep(args.down_for)
+        await mocks[0].start(port=BASE_PORT)
+
+    chaos_task = asyncio.create_task(chaos())
+    tasks = []
+    i = 0
+    while time.perf_counter() - started < args.duration:
+        tasks.append(asyncio.create_task(one(i)))
+        i += 1
+        await asyncio.sleep(1 / args.rate)
+    await asyncio.gather(chaos_task, *tasks)
+    for second in sorted(buckets):
+        counts = buckets[second]
+        print(f"  {second:3} с: " + ", ".join(f"{k} {v}" for k, v in sorted(counts.items())) +
+              f"   p50 {ms(latencies[second], 0.5):.0f} мс   max {ms(latencies[second], 1.0):.0f} мс")
+    await client.stop_probes()
+    for mock in mocks:
+        await mock.stop()
+
+
+async def stream(args):
+    print(f"== stream: think {args.think_tokens} ток., ответ {args.answer_tokens} ток., {args.tps:g} ток/с")
+    mock = MockLMStudio(MockSettings(slots=1, ttft=args.ttft, tps=args.tps, answer_tokens=args.answer_tokens,
+                                     think_tokens=args.think_tokens))
+    await mock.start(port=BASE_PORT)
+    payload = {"model": "bench", "messages": history(0, 0), "stream": True}
+    started = time.perf_counter()
+    first = visible = None
+    thinking = False
+    async with shared.http_session().post(url(BASE_PORT), json=payload) as response:
+        async for line in response.content:
+            if not line.startswith(b"data: ") or line.strip() == b"data: [DONE]":
+                continue
+            delta = json.loads(line[6:])["choices"][0]["delta"].get("content")
+            if not delta:
+                continue
+            now = time.perf_counter() - started
+            first = first if first is not None else now
+            if delta == "<think>":
+                thinking = True
+            elif delta.startswith("</think>"):
+                thinking = False
+            elif not thinking and visible is None:
+                visible = now
+    total = time.perf_counter() - started
+    print(f"  первый токен {first * 1000:.0f} мс, первый видимый {visible * 1000:.0f} мс, "
+          f"весь ответ {total * 1000:.0f} мс (без стрима пользователь ждёт весь ответ)")
+    await mock.stop()
+
+
+async def main_async(args):
+    for scenario in args.scenario:
+        await globals()[scenario](args)
+    await shared.close_shared()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", type=lambda s: s.split(","), default=list(SCENARIOS),
+                        help="Сценарии через запятую: " + ", ".join(SCENARIOS))
+    parser.add_argument("--slots", type=int, default=2, help="Параллельных генераций на сервере")
+    parser.add_argument("--users", type=lambda s: [int(x) for x in s.split(",")], default=[1, 2, 4, 8],
+                        help="Одновременных пользователей через запятую (concurrency)")
+    parser.add_argument("--turns", type=int, default=4, help="Запросов на пользователя (concurrency)")
+    parser.add_argument("--ttft", type=float, default=0.1, help="Время до первого токена, с")
+    parser.add_argument("--tps", type=float, default=200.0, help="Токенов в секунду")
+    parser.add_argument("--answer-tokens", type=int, default=60, help="Токенов в ответе")
+    parser.add_argument("--think-tokens", type=int, default=40, help="Токенов в <think> (stream)")
+    parser.add_argument("--requests", type=int, default=400, help="Запросов (failover)")
+    parser.add_argument("--error-rate", type=float, default=0.2, help="Доля ошибок 500 (failover)")
+    parser.add_argument("--drop-rate", type=float, default=0.1, help="Доля обрывов (failover)")
+    parser.add_argument("--duration", type=float, default=8.0, help="Длительность, с (health)")
+    parser.add_argument("--rate", type=float, default=20.0, help="Запросов в секунду (health)")
+    parser.add_argument("--down-at", type=float, default=2.0, help="Когда падает сервер #0, с (health)")
+    parser.add_argument("--down-for", type=float, default=3.0, help="Сколько он лежит, с (health)")
+    parser.add_argument("--probe-interval", type=float, default=1.0, help="Интервал проверки /v1/models, с")
+    args = parser.parse_args()
+    # Клиент пишет в лог каждую ошибку сервера, а их здесь сотни
+    logging.disable(logging.ERROR)
+    unknown = set(args.scenario) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"неизвестные сценарии: {', '.join(sorted(unknown))}")
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
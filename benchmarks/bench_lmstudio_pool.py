@@ -0,0 +1,140 @@
+"""Бенчмарк пула серверов LMStudioClient на локальных заглушках.
+
+Поднимает --servers OpenAI-совместимых заглушек с разной задержкой ответа
+(первая самая быстрая, каждая следующая медленнее в --spread раз) и шлёт
+--requests запросов от --users пользователей с параллельностью --concurrency.
+Печатает распределение запросов по серверам, задержки и долю запросов,
+попавших на «свой» сервер пользователя. С --kill одна заглушка
+останавливается посередине прогона - проверка переключения на живые.
+С --kill --hang она не закрывает порт, а перестаёт отвечать: запросы к ней
+обрываются по --timeout, и предохранитель должен увести пользователей
+на живые серверы.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_lmstudio_pool.py [--servers N] [--requests R] [--sticky] [--kill [--hang]]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from botcore import shared  # noqa: E402
+from botcore.llm import LLMError  # noqa: E402
+from botcore.lmstudio import LMStudioClient  # noqa: E402
+
+BASE_PORT = 18300
+
+
+async def start_stub(port: int, latency: float, hung: asyncio.Event, release: asyncio.Event) -> web.AppRunner:
+    """Заглушка LM Studio: /v1/models и /v1/chat/completions с фиксированной задержкой.
+
+    Пока выставлен hung, заглушка принимает запросы и не отвечает до release.
+    """
+    async def models(request):
+        if hung.is_set():
+            await release.wait()
+        return web.json_response({"data": [{"id": "bench"}]})
+
+    async def chat(request):
+        await request.json()
+        if hung.is_set():
+            await release.wait()
+        await asyncio.sleep(latency)
+        return web.json_response({"choices": [{"message": {"content": f"ответ {port}"}}]})
+
+    app = web.Application()
+    app.router.add_get("/v1/models", models)
+    app.router.add_post("/v1/chat/completions", chat)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+async def main_async(args):
+    latencies = [args.latency * args.spread ** i for i in range(args.servers)]
+    hung = [asyncio.Event() for _ in latencies]
+    release = asyncio.Event()
+    runners = [await start_stub(BASE_PORT + i, latency, hung[i], release) for i, latency in enumerate(latencies)]
+    urls = [f"http://127.0.0.1:{BASE_PORT + i}/v1/chat/completions" for i in range(args.servers)]
+    client = LMStudioClient(urls, "bench", sticky=args.sticky, probe_interval=0.5, timeout=args.timeout)
+
+    served_by = Counter()
+    user_servers = defaultdict(Counter)
+    timings = []
+    errors = Counter()
+    queue = asyncio.Queue()
+    for i in range(args.requests):
+        queue.put_nowait(i)
+
+    async def worker():
+        while not queue.empty():
+            i = queue.get_nowait()
+            user = i % args.users
+            if args.kill and i == args.requests // 2:
+                if args.hang:
+                    hung[0].set()
+                else:
+                    await runners[0].cleanup()
+            started = time.perf_counter()
+            try:
+                answer = await client.complete([{"role": "user", "content": "привет"}], session_key=str(user))
+            except LLMError as e:
+                errors[str(e)] += 1
+                continue
+            timings.append(time.perf_counter() - started)
+            port = int(answer.rsplit(" ", 1)[1])
+            served_by[port] += 1
+            user_servers[user][port] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    print(f"{args.requests} запросов, {args.servers} серверов, sticky={args.sticky}, "
+          f"kill={'hang' if args.kill and args.hang else args.kill}: "
+          f"{elapsed:.2f} с, {len(timings) / elapsed:.0f} запросов/с")
+    for i, latency in enumerate(latencies):
+        print(f"  сервер {i} (задержка {latency * 1000:.0f} мс): {served_by[BASE_PORT + i]} запросов")
+    if timings:
+        timings.sort()
+        print(f"  p50 {statistics.median(timings) * 1000:.0f} мс   p99 {timings[int(len(timings) * 0.99)] * 1000:.0f} мс")
+    affinity = sum(c.most_common(1)[0][1] for c in user_servers.values()) / max(1, sum(served_by.values()))
+    print(f"  на «своём» сервере пользователя: {affinity:.0%}")
+    for text, count in errors.items():
+        print(f"  ошибок «{text}»: {count}")
+
+    print(f"  сервер 0: предохранитель {client.endpoints[0].breaker.state}, ошибок {client.endpoints[0].failed}")
+
+    await client.stop_probes()
+    release.set()
+    for runner in runners[1 if args.kill and not args.hang else 0:]:
+        await runner.cleanup()
+    await shared.close_shared()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--servers", type=int, default=3, help="Количество заглушек")
+    parser.add_argument("--requests", type=int, default=2000, help="Количество запросов")
+    parser.add_argument("--users", type=int, default=50, help="Количество пользователей")
+    parser.add_argument("--concurrency", type=int, default=32, help="Параллельных запросов")
+    parser.add_argument("--latency", type=float, default=0.01, help="Задержка самой быстрой заглушки, с")
+    parser.add_argument("--spread", type=float, default=2.0, help="Во сколько раз каждая следующая медленнее")
+    parser.add_argument("--sticky", action="store_true", help="Привязка пользователей к серверам")
+    parser.add_argument("--kill", action="store_true", help="Остановить первую заглушку посередине прогона")
+    parser.add_argument("--hang", action="store_true", help="С --kill: заглушка не закрывает порт, а зависает")
+    parser.add_argument("--timeout", type=float, default=1.0, help="Таймаут запроса клиента, с")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Микробенчмарк экранирования MarkdownV2: старые реализации против botcore.markdown.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_markdown.py [--number N]
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from botcore.markdown import escape_markdown_v2  # noqa: E402
+
+# --- Старые реализации (как были в main-telegram.py и morkvaai.py) ---
+MDV2_SPECIAL = r'[_*[\]()~`>#+\-=|{}.!]'
+
+
+def legacy_re_sub(text: str) -> str:
+    return re.sub(MDV2_SPECIAL, lambda m: '\\' + m.group(0), text or "")
+
+
+def legacy_replace_chain(text: str) -> str:
+    special_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
+    for char in special_chars:
+        text = text.replace(char, f'\\{char}')
+    return text
+
+
+# --- Однопроходные кандидаты, проигравшие на CPython 3.11 ---
+_TRANSLATE_TABLE = str.maketrans({ch: '\\' + ch for ch in '_*[]()~`>#+-=|{}.!'})
+_SPLIT_BEFORE_SPECIAL = re.compile(r'(?=[_*[\]()~`>#+\-=|{}.!])')
+
+
+def candidate_translate(text: str) -> str:
+    return text.translate(_TRANSLATE_TABLE)
+
+
+def candidate_split_join(text: str) -> str:
+    return '\\'.join(_SPLIT_BEFORE_SPECIAL.split(text))
+
+
+# Типичный ответ модели: кириллица, списки, код, ссылки и пунктуация
+SAMPLE_ANSWER = (
+    "## Ответ\n"
+    "Вот пример функции на Python (см. документацию: https://docs.python.org/3/library/re.html):\n"
+    "```python\n"
+    "def add(a: int, b: int) -> int:\n"
+    "    return a + b  # сумма [a, b]\n"
+    "```\n"
+    "- Шаг 1. Установите пакет: `pip install -U openai==1.40.0`.\n"
+    "- Шаг 2! Задайте переменные {OPENAI_API_KEY} и TELEGRAM_BOT_TOKEN=...\n"
+    "> Важно: *не* публикуйте ключи | токены ~никогда~.\n"
+    "Итого: 2 + 2 = 4, а 10 - 3 = 7. Обычный текст без спецсимволов тоже встречается часто, "
+    "поэтому здесь есть длинные фразы на русском языке без разметки\n"
+)
+
+
+def make_input(size: int) -> str:
+    repeats = size // len(SAMPLE_ANSWER) + 1
+    return (SAMPLE_ANSWER * repeats)[:size]
+
+
+IMPLEMENTATIONS = [
+    ("re.sub + lambda", legacy_re_sub),
+    ("18 x str.replace", legacy_replace_chain),
+    ("str.translate", candidate_translate),
+    ("re.split + join", candidate_split_join),
+    ("botcore.markdown", escape_markdown_v2),
+]
+
+SIZES = [("4k", 4_000), ("75k", 75_000)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=0, help="Количество вызовов на замер (0 - автоматически)")
+    parser.add_argument("--repeat", type=int, default=5, help="Количество замеров, берётся минимум")
+    args = parser.parse_args()
+
+    for label, size in SIZES:
+        text = make_input(size)
+        expected = legacy_re_sub(text)
+        print(f"\n=== Вход {label} ({len(text)} символов) ===")
+        baseline = None
+        for name, func in IMPLEMENTATIONS:
+            assert func(text) == expected, f"{name}: результат отличается от эталона"
+            timer = timeit.Timer(lambda: func(text))
+            number = args.number or timer.autorange()[0]
+            best = min(timer.repeat(repeat=args.repeat, number=number)) / number
+            if baseline is None:
+                baseline = best
+            print(f"{name:<20} {best * 1e6:10.1f} мкс/вызов   x{baseline / best:5.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Бенчмарк памяти истории диалогов на большом числе пользователей.
+
+Каждый вариант запускается в отдельном процессе и заполняет историю
+--users синтетических пользователей по --turns реплик, после чего печатается
+объём живых объектов (tracemalloc) и прирост RSS процесса. RSS может быть
+выше: освобождённую память pymalloc не всегда возвращает системе, но
+переиспользует под новые сессии.
+
+Варианты:
+- legacy - defaultdict(lambda: deque(maxlen=...)) со словарём на реплику, как было в скриптах;
+- compact - ConversationMemory поверх MemoryStore (реплики - кортежи Turn);
+- compressed - то же после того, как записи остыли и сжаты zlib;
+- evicted - то же после вытеснения простаивающих пользователей.
+
+Запуск из корня репозитория (Linux):
+    python benchmarks/bench_memory.py [--users N] [--turns T]
+"""
+import argparse
+import asyncio
+import gc
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import defaultdict, deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from botcore.memory import ConversationMemory  # noqa: E402
+from botcore.storage import MemoryStore  # noqa: E402
+
+MEMORY_SIZE = 10
+VARIANTS = ["legacy", "compact", "compressed", "evicted"]
+WORDS = ("как", "настроить", "сервер", "ошибка", "python", "бот", "ответ", "память", "файл",
+         "запрос", "модель", "почему", "не", "работает", "код", "функция", "список", "данные")
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def make_text(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 30)))
+
+
+def turns_for(user_id: int, turns: int):
+    rng = random.Random(user_id)
+    for i in range(turns):
+        yield ("user" if i % 2 == 0 else "assistant"), make_text(rng)
+
+
+def fill_legacy(users: int, turns: int):
+    user_memory = defaultdict(lambda: deque(maxlen=MEMORY_SIZE))
+    for user_id in range(users):
+        for role, content in turns_for(user_id, turns):
+            user_memory[user_id].append({"role": role, "content": content})
+    return user_memory
+
+
+async def fill_compact(users: int, turns: int, variant: str):
+    store = MemoryStore(idle_ttl=3600 if variant == "evicted" else None, compress=variant == "compressed")
+    memory = ConversationMemory(MEMORY_SIZE, "system", store, "bench")
+    for user_id in range(users):
+        pairs = list(turns_for(user_id, turns))
+        for i in range(0, len(pairs), 2):
+            await memory.append(user_id, *({"role": role, "content": content} for role, content in pairs[i:i + 2]))
+    if variant in ("compressed", "evicted"):
+        # Два прохода: сначала записи остывают, затем сжимаются или вытесняются
+        store._data.sweep()
+        store._data.sweep()
+    return store
+
+
+def run_variant(variant: str, users: int, turns: int):
+    gc.collect()
+    before = rss_bytes()
+    tracemalloc.start()
+    started = time.perf_counter()
+    if variant == "legacy":
+        data = fill_legacy(users, turns)
+        entries = len(data)
+    else:
+        data = asyncio.run(fill_compact(users, turns, variant))
+        entries = len(data)
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    live = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    grown = rss_bytes() - before
+    print(f"{variant:<11} {live / 2**20:8.1f} МБ живых   {live / users:6.0f} байт/польз.   "
+          f"RSS +{grown / 2**20:7.1f} МБ   записей {entries:>8}   заполнение {elapsed:6.1f} с")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1_000_000, help="Количество пользователей")
+    parser.add_argument("--turns", type=int, default=4, help="Реплик на пользователя")
+    parser.add_argument("--variant", choices=VARIANTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args.variant, args.users, args.turns)
+        return
+    print(f"{args.users} пользователей по {args.turns} реплик")
+    for variant in VARIANTS:
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--variant", variant,
+                        "--users", str(args.users), "--turns", str(args.turns)], check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Бенчмарк стабильности префикса промпта при разных шагах обрезки истории.
+
+Прогоняет --users диалогов по --turns обменов через Pipeline.build_context
+и ConversationMemory. Для каждого запроса считается, какая часть промпта
+(в байтах JSON) совпадает с началом предыдущего запроса того же
+пользователя. Столько провайдер может взять из кэша префикса; кэш OpenAI
+срабатывает с 1024 токенов, поэтому учитываются и запросы с длинным общим
+префиксом (--min-prefix байт).
+
+Запуск из корня репозитория:
+    python benchmarks/bench_prefix_cache.py [--turns T] [--steps 0,2,5,10]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from botcore.config import BotConfig  # noqa: E402
+from botcore.memory import ConversationMemory  # noqa: E402
+from botcore.pipeline import Pipeline, Request  # noqa: E402
+from botcore.storage import MemoryStore  # noqa: E402
+
+SYSTEM_PROMPT = "Вы Begemot AI. Отвечайте кратко и по делу. " * 20
+
+
+def common_prefix(a: bytes, b: bytes) -> int:
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+async def run_step(step: int, args) -> None:
+    config = BotConfig("bench", "stub", SYSTEM_PROMPT, memory_size=args.memory, history_trim_step=step)
+    memory = ConversationMemory(config.memory_size, config.system_prompt, MemoryStore(), "bench",
+                                trim_step=config.trim_step)
+    pipeline = Pipeline(config, backend=None, memory=memory)
+    rng = random.Random(7)
+    total = reused = long_hits = 0
+    for user in range(args.users):
+        previous = b""
+        for turn in range(args.turns):
+            text = " ".join(rng.choice(("вопрос", "про", "код", "сервер", "ошибка", "python")) for _ in range(30))
+            request = Request("bench", user, user, "u", None, False, True, text, prompt=text)
+            await pipeline.build_context(request)
+            payload = json.dumps(request.messages, ensure_ascii=False).encode()
+            shared = common_prefix(previous, payload) if previous else 0
+            total += len(payload)
+            reused += shared
+            long_hits += shared >= args.min_prefix
+            previous = payload
+            await memory.append(user, {"role": "user", "content": text},
+                                {"role": "assistant", "content": text[::-1]})
+    requests = args.users * args.turns
+    print(f"шаг обрезки {step:3}: общий префикс {reused / total:6.1%} байт промпта, "
+          f"запросов с префиксом >= {args.min_prefix} байт: {long_hits / requests:6.1%}, "
+          f"средний промпт {total / requests / 1024:5.1f} КБ")
+
+
+async def main_async(args):
+    for step in args.steps:
+        await run_step(step, args)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50, help="Количество пользователей")
+    parser.add_argument("--turns", type=int, default=40, help="Обменов на пользователя")
+    parser.add_argument("--memory", type=int, default=10, help="memory_size")
+    parser.add_argument("--steps", type=lambda s: [int(x) for x in s.split(",")], default=[0, 2, 5, 10],
+                        help="Шаги обрезки истории через запятую")
+    parser.add_argument("--min-prefix", type=int, default=4096, help="Порог длинного префикса, байт")
+    args = parser.parse_args()
+    # build_context пишет в лог каждый запрос
+    logging.disable(logging.INFO)
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
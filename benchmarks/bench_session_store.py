@@ -0,0 +1,66 @@
+"""Бенчмарк хранилищ сессий: задержка добавления реплики в историю.
+
+Сравнивает память процесса, SQLite с записью на каждое сообщение и SQLite
+с отложенной пакетной записью (WriteBehindStore).
+
+Запуск из корня репозитория:
+    python benchmarks/bench_session_store.py [--turns N] [--users U]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from botcore.memory import ConversationMemory  # noqa: E402
+from botcore.storage import MemoryStore, SQLiteStore, WriteBehindStore  # noqa: E402
+
+
+async def bench(name: str, store, turns: int, users: int):
+    memory = ConversationMemory(10, "system", store, "bench")
+    latencies = []
+    started = time.perf_counter()
+    for i in range(turns):
+        user_id = i % users
+        t = time.perf_counter()
+        await memory.load(user_id)
+        await memory.append(user_id, {"role": "user", "content": f"вопрос {i}"},
+                            {"role": "assistant", "content": f"ответ {i}"})
+        latencies.append(time.perf_counter() - t)
+    close_started = time.perf_counter()
+    await store.close()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    print(f"{name:<22} p50 {statistics.median(latencies) * 1e6:8.1f} мкс   "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1e6:8.1f} мкс   "
+          f"всего {elapsed:6.2f} с (закрытие {time.perf_counter() - close_started:.3f} с)")
+
+
+async def main_async(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        await bench("memory", MemoryStore(), args.turns, args.users)
+        await bench("sqlite", SQLiteStore(os.path.join(tmp, "direct.db")), args.turns, args.users)
+        await bench("sqlite write-behind", WriteBehindStore(SQLiteStore(os.path.join(tmp, "wb.db")), 1.0),
+                    args.turns, args.users)
+
+        # После рестарта история читается из файла
+        replay = ConversationMemory(10, "system", SQLiteStore(os.path.join(tmp, "wb.db")), "bench")
+        restored = sum([len(await replay.history(u)) for u in range(args.users)])
+        await replay.store.close()
+        print(f"Восстановлено после перезапуска: {restored} реплик у {args.users} пользователей")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=5000, help="Количество обменов репликами")
+    parser.add_argument("--users", type=int, default=500, help="Количество пользователей")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Бенчмарк холодного старта ботов: время импорта скрипта по `python -X importtime`.
+
+Каждый скрипт загружается (без запуска main) в свежем процессе с фиктивными
+токенами; из вывода -X importtime берётся суммарное время и самые тяжёлые
+пакеты верхнего уровня. Скрипт копируется во временную папку, чтобы .env
+репозитория не подменил фиктивные токены.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_startup.py [--repeat N] [--top K] [скрипт ...]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BOTS = ["main-telegram.py", "gpt5.py", "main-discord.py", "search_main.py",
+        "turbo-instruct.py", "morkvaai.py", "morkvaai-discord.py"]
+
+FAKE_ENV = {
+    "TELEGRAM_BOT_TOKEN": "123456:" + "A" * 35,
+    "DISCORD_BOT_TOKEN": "x" * 59,
+    "OPENAI_API_KEY": "sk-bench",
+}
+
+LOADER = (
+    "import sys; sys.path.insert(0, {root!r}); "
+    "from botcore.runner import load_bot_module; load_bot_module({path!r})"
+)
+
+
+def import_profile(script: str):
+    """Один холодный импорт: (всего мкс, {пакет: мкс}) или текст ошибки"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, os.path.basename(script))
+        shutil.copy(os.path.join(ROOT, script), path)
+        env = {**os.environ, **FAKE_ENV}
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", LOADER.format(root=ROOT, path=path)],
+            cwd=tmp, env=env, capture_output=True, text=True,
+        )
+    if proc.returncode != 0:
+        return proc.stderr.strip().splitlines()[-1]
+    packages = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        # Верхний уровень дерева импортов - без отступа перед именем
+        if name.startswith(" ") and not name.startswith("  "):
+            packages[name.strip()] = packages.get(name.strip(), 0) + int(cumulative)
+    return sum(packages.values()), packages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("scripts", nargs="*", default=BOTS, help="Скрипты ботов (по умолчанию все)")
+    parser.add_argument("--repeat", type=int, default=3, help="Количество запусков, берётся минимум")
+    parser.add_argument("--top", type=int, default=5, help="Сколько самых тяжёлых пакетов показать")
+    args = parser.parse_args()
+
+    for script in args.scripts:
+        runs = [import_profile(script) for _ in range(args.repeat)]
+        if isinstance(runs[0], str):
+            print(f"{script:<22} ошибка импорта: {runs[0]}")
+            continue
+        total, packages = min(runs, key=lambda r: r[0])
+        heavy = sorted(packages.items(), key=lambda item: -item[1])[:args.top]
+        print(f"{script:<22} {total / 1000:8.1f} мс   "
+              + ", ".join(f"{name} {us / 1000:.0f}" for name, us in heavy))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Нагрузочный бенчмарк webhook-режима: синтетические обновления Telegram через HTTP POST.
+
+По умолчанию поднимает в процессе WebhookServer с фиктивным диспетчером, который
+"обрабатывает" обновление за --handler-ms, и меряет задержку ответа (ack),
+пропускную способность и число отказов 503 при переполнении очереди.
+С --url шлёт обновления на уже запущенного бота (TELEGRAM_WEBHOOK_URL).
+
+Запуск из корня репозитория:
+    python benchmarks/bench_webhook.py [--updates N] [--concurrency C] [--queue Q]
+    python benchmarks/bench_webhook.py --url http://127.0.0.1:8080/telegram/<id бота> --secret S
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from botcore.adapters.telegram_webhook import SECRET_HEADER, WebhookReceiver, attach, detach  # noqa: E402
+
+BENCH_BOT_ID = 42
+LISTEN = "127.0.0.1:8089"
+
+
+class FakeBot:
+    id = BENCH_BOT_ID
+
+
+class FakeDispatcher:
+    """Имитирует обработку: ожидание ответа модели без нагрузки на CPU"""
+    def __init__(self, handler_ms: float):
+        self.delay = handler_ms / 1000
+        self.processed = 0
+
+    async def feed_raw_update(self, bot, update):
+        await asyncio.sleep(self.delay)
+        self.processed += 1
+
+
+def make_update(update_id: int) -> dict:
+    user = {"id": 100000 + update_id % 1000, "is_bot": False, "first_name": "Bench"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user["id"], "type": "private"},
+            "from": user,
+            "text": f"Синтетический вопрос №{update_id}",
+        },
+    }
+
+
+async def post_updates(url: str, secret: str, updates: int, concurrency: int):
+    latencies = []
+    statuses = {}
+    semaphore = asyncio.Semaphore(concurrency)
+    headers = {SECRET_HEADER: secret} if secret else {}
+
+    async with aiohttp.ClientSession(headers=headers) as session:
+        async def one(update_id: int):
+            async with semaphore:
+                started = time.perf_counter()
+                async with session.post(url, json=make_update(update_id)) as resp:
+                    await resp.read()
+                latencies.append(time.perf_counter() - started)
+                statuses[resp.status] = statuses.get(resp.status, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(1, updates + 1)))
+        elapsed = time.perf_counter() - started
+    return latencies, statuses, elapsed
+
+
+def report(latencies, statuses, elapsed):
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"Обновлений: {len(latencies)} за {elapsed:.2f} с ({len(latencies) / elapsed:.0f} в секунду)")
+    print(f"Ack: p50 {statistics.median(latencies) * 1000:.2f} мс, p99 {p99 * 1000:.2f} мс, max {latencies[-1] * 1000:.2f} мс")
+    print(f"Статусы: {dict(sorted(statuses.items()))}")
+
+
+async def run_local(args):
+    dispatcher = FakeDispatcher(args.handler_ms)
+    receiver = WebhookReceiver(dispatcher, FakeBot(), args.secret, args.queue, args.workers)
+    receiver.start()
+    path = await attach(receiver, LISTEN)
+    try:
+        latencies, statuses, elapsed = await post_updates(
+            f"http://{LISTEN}{path}", args.secret, args.updates, args.concurrency)
+        report(latencies, statuses, elapsed)
+        started = time.perf_counter()
+        await receiver.stop(timeout=600)
+        print(f"Обработано: {dispatcher.processed}, отклонено: {receiver.rejected}, "
+              f"дообработка очереди: {time.perf_counter() - started:.2f} с")
+    finally:
+        await detach(receiver, LISTEN)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="Адрес webhook запущенного бота; без него - локальный сервер")
+    parser.add_argument("--secret", default="bench-secret", help="Значение X-Telegram-Bot-Api-Secret-Token")
+    parser.add_argument("--updates", type=int, default=5000, help="Количество обновлений")
+    parser.add_argument("--concurrency", type=int, default=100, help="Одновременных POST-запросов")
+    parser.add_argument("--queue", type=int, default=1000, help="Размер очереди (локальный режим)")
+    parser.add_argument("--workers", type=int, default=32, help="Число воркеров (локальный режим)")
+    parser.add_argument("--handler-ms", type=float, default=50, help="Время обработки обновления (локальный режим)")
+    args = parser.parse_args()
+
+    if args.url:
+        report(*asyncio.run(post_updates(args.url, args.secret, args.updates, args.concurrency)))
+    else:
+        asyncio.run(run_local(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,506 @@
+"""Нагрузочный тест ботов без сети: поддельные Telegram Bot API, Discord и OpenAI.
+
+Скрипты ботов загружаются как есть (runner.load_bot_module) с фиктивными
+токенами. Запросы к OpenAI уходят в заглушку benchmarks/mock_openai.py,
+запросы к LM Studio (скрипты с lm_client) - в benchmarks/mock_lmstudio.py
+на порту --port + 1, запросы aiogram - в поддельный Bot API (getMe,
+sendMessage, getFile, скачивание файлов). Заглушки работают в дочернем
+процессе, чтобы пик RSS относился только к ботам. Апдейты Telegram подаются в Dispatcher
+(feed_raw_update), сообщения Discord - поддельными объектами в on_message
+скрипта, так что проходят настоящие обработчики, конвейер и адаптеры.
+
+Поток сообщений пуассоновский с частотой --rate; смесь задаётся --mix:
+text - короткий вопрос, long - длинный текст, photo - фото с подписью,
+pdf - PDF-документ, group - упоминание бота в группе, noise - сообщение
+в группе без упоминания (должно отсекаться префильтром). Печатаются
+пропускная способность, p50/p95/p99 по видам сообщений, исходы конвейера
+и пиковый RSS.
+
+Запуск из корня репозитория:
+    python benchmarks/loadtest.py [--platform telegram|discord|both] [--rate R] [--duration S]
+        [--mix text=60,long=5,photo=10,pdf=10,group=10,noise=5] [--latency 0.5]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import mock_lmstudio, mock_openai  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FAKE_ENV = {
+    "TELEGRAM_BOT_TOKEN": "123456:" + "A" * 35,
+    "DISCORD_BOT_TOKEN": "x" * 59,
+    "OPENAI_API_KEY": "sk-bench",
+}
+
+BOT_ID = 123456
+BOT_USERNAME = "bench_bot"
+KINDS = ("text", "long", "photo", "pdf", "group", "noise")
+QUESTIONS = ("Как ускорить python код?", "Что такое asyncio?", "Объясни разницу между list и tuple",
+             "Почему сервер отвечает 502?", "Напиши регулярку для email", "Как работает GIL?")
+
+
+def make_pdf(pages: int, lines: int = 40) -> bytes:
+    """Минимальный PDF с текстом на каждой странице (шрифт Helvetica, латиница)"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", b"", b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in range(pages):
+        text = " ".join(f"({'Line %d of page %d: load test document text.' % (i, page)}) Tj 0 -14 Td"
+                        for i in range(lines))
+        stream = f"BT /F1 10 Tf 40 800 Td {text} ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), pages)
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def make_files(args) -> Dict[str, bytes]:
+    rng = random.Random(3)
+    return {
+        "photo": rng.randbytes(args.photo_kb * 1024),
+        "pdf": make_pdf(args.pdf_pages),
+    }
+
+
+# =========================
+# Поддельный Telegram Bot API (дочерний процесс)
+# =========================
+
+class FakeTelegramAPI:
+    """Отвечает на методы Bot API, которые вызывает адаптер, с задержкой --send-latency"""
+    def __init__(self, args):
+        self.send_latency = args.send_latency
+        self.download_latency = args.download_latency
+        self.files = make_files(args)
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.message_id = 0
+
+    async def method(self, request: web.Request) -> web.Response:
+        name = request.match_info["method"]
+        data = await request.post()
+        self.calls[name] += 1
+        if name == "getMe":
+            result = {"id": BOT_ID, "is_bot": True, "first_name": "Bench", "username": BOT_USERNAME}
+        elif name in ("sendMessage", "editMessageReplyMarkup", "editMessageText"):
+            await asyncio.sleep(self.send_latency)
+            self.message_id += 1
+            result = {"message_id": self.message_id, "date": int(time.time()),
+                      "chat": {"id": int(data.get("chat_id", 0)), "type": "private"},
+                      "from": {"id": BOT_ID, "is_bot": True, "first_name": "Bench"},
+                      "text": data.get("text", "")}
+        elif name == "getFile":
+            file_id = data["file_id"]
+            kind = file_id.split("-", 1)[0]
+            result = {"file_id": file_id, "file_unique_id": file_id, "file_size": len(self.files[kind]),
+                      "file_path": f"{kind}/{file_id}"}
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def download(self, request: web.Request) -> web.Response:
+        self.calls["download"] += 1
+        await asyncio.sleep(self.download_latency)
+        kind = request.match_info["path"].split("/", 1)[0]
+        return web.Response(body=self.files[kind])
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.calls)
+
+    def add_routes(self, app: web.Application):
+        app.router.add_post("/bot{token}/{method}", self.method)
+        app.router.add_get("/file/bot{token}/{path:.+}", self.download)
+        app.router.add_get("/stats", self.stats)
+
+
+async def serve_fakes(args):
+    app = web.Application(client_max_size=64 * 2**20)
+    mock_openai.MockOpenAI(mock_openai.settings_from(args)).add_routes(app)
+    FakeTelegramAPI(args).add_routes(app)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.port).start()
+    # Скрипты morkvaai ходят в LM Studio, а не в OpenAI
+    await mock_lmstudio.MockLMStudio(mock_lmstudio.settings_from(args)).start(port=args.port + 1)
+    print("ready", flush=True)
+    await asyncio.Event().wait()
+
+
+def start_fakes(args) -> subprocess.Popen:
+    argv = [sys.executable, os.path.abspath(__file__), "--serve-fakes"] + sys.argv[1:]
+    proc = subprocess.Popen(argv, stdout=subprocess.PIPE, text=True)
+    if proc.stdout.readline().strip() != "ready":
+        proc.kill()
+        raise SystemExit("Заглушки не запустились")
+    return proc
+
+
+# =========================
+# Поддельные объекты Discord
+# =========================
+
+class FakeUser:
+    def __init__(self, user_id: int, name: str, bot: bool = False):
+        self.id = user_id
+        self.name = name
+        self.display_name = name
+        self.bot = bot
+        self.mention = f"<@{user_id}>"
+
+    def mentioned_in(self, message) -> bool:
+        return self in message.mentions
+
+
+class FakeSent:
+    def __init__(self, message_id: int):
+        self.id = message_id
+
+
+class FakeTyping:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeChannel:
+    counter = 0
+
+    def __init__(self, channel_id: int, send_latency: float):
+        self.id = channel_id
+        self.name = f"chan-{channel_id}"
+        self.send_latency = send_latency
+        self.sent = 0
+
+    async def send(self, content=None, **kwargs):
+        await asyncio.sleep(self.send_latency)
+        self.sent += 1
+        FakeChannel.counter += 1
+        return FakeSent(FakeChannel.counter)
+
+    def typing(self):
+        return FakeTyping()
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+        self.name = f"guild-{guild_id}"
+
+
+class FakeAttachment:
+    def __init__(self, filename: str, content_type: str, data: bytes, latency: float):
+        self.filename = filename
+        self.content_type = content_type
+        self.size = len(data)
+        self._data = data
+        self._latency = latency
+
+    async def read(self) -> bytes:
+        await asyncio.sleep(self._latency)
+        return self._data
+
+
+class FakeMessage:
+    def __init__(self, message_id: int, author: FakeUser, channel: FakeChannel, guild, content: str,
+                 mentions: List[FakeUser], attachments: List[FakeAttachment]):
+        self.id = message_id
+        self.author = author
+        self.channel = channel
+        self.guild = guild
+        self.content = content
+        self.mentions = mentions
+        self.attachments = attachments
+        self.reference = None
+        # commands.Context берёт состояние подключения из сообщения
+        self._state = None
+
+
+# =========================
+# Генерация нагрузки
+# =========================
+
+def load_script(script: str, tmp: str, lmstudio_url: str):
+    """Загружает копию скрипта: .env репозитория не должен подменить фиктивные токены"""
+    from botcore.lmstudio import LMStudioClient
+    from botcore.runner import load_bot_module
+    path = os.path.join(tmp, os.path.basename(script))
+    shutil.copy(os.path.join(ROOT, script), path)
+    module = load_bot_module(path)
+    if hasattr(module, "lm_client"):
+        # Адреса LM Studio заданы в скрипте константой - подменяем клиента целиком
+        module.lm_client = module.pipeline.backend = LMStudioClient(lmstudio_url, module.MODEL_NAME, sticky=True,
+                                                                   timeout=module.CONFIG.model_timeout)
+    return module
+
+
+def question(rng: random.Random, kind: str) -> str:
+    if kind == "long":
+        return " ".join(rng.choice(QUESTIONS) for _ in range(150))
+    return rng.choice(QUESTIONS)
+
+
+class TelegramDriver:
+    platform = "telegram"
+
+    def __init__(self, module, base_url: str):
+        from aiogram.client.session.aiohttp import AiohttpSession
+        from aiogram.client.telegram import TelegramAPIServer
+        self.module = module
+        self.bot = module.bot
+        self.bot.session = AiohttpSession(api=TelegramAPIServer.from_base(base_url))
+        self.update_id = 0
+
+    async def start(self):
+        await self.module.adapter.load_identity()
+
+    async def close(self):
+        await self.bot.session.close()
+
+    async def send(self, rng: random.Random, kind: str, user: int, files: Dict[str, bytes]):
+        self.update_id += 1
+        group = kind in ("group", "noise")
+        chat = {"id": -1000 - user % 10, "type": "supergroup", "title": "load"} if group \
+            else {"id": user, "type": "private"}
+        message = {"message_id": self.update_id, "date": int(time.time()), "chat": chat,
+                   "from": {"id": user, "is_bot": False, "first_name": f"user{user}"}}
+        text = question(rng, kind)
+        if kind == "group":
+            text = f"@{BOT_USERNAME} {text}"
+        if kind == "photo":
+            message["photo"] = [{"file_id": f"photo-{self.update_id}", "file_unique_id": f"p{self.update_id}",
+                                 "width": 1280, "height": 960, "file_size": len(files["photo"])}]
+            message["caption"] = text
+        elif kind == "pdf":
+            message["document"] = {"file_id": f"pdf-{self.update_id}", "file_unique_id": f"d{self.update_id}",
+                                   "file_name": "report.pdf", "mime_type": "application/pdf",
+                                   "file_size": len(files["pdf"])}
+            message["caption"] = text
+        else:
+            message["text"] = text
+        await self.module.dp.feed_raw_update(self.bot, {"update_id": self.update_id, "message": message})
+
+
+class DiscordDriver:
+    platform = "discord"
+
+    def __init__(self, module, args):
+        self.module = module
+        self.me = FakeUser(BOT_ID, BOT_USERNAME, bot=True)
+        # bot.user берётся из состояния подключения, которого без логина нет
+        module.bot._connection.user = self.me
+        self.args = args
+        self.guild = FakeGuild(1)
+        self.channels: Dict[int, FakeChannel] = {}
+        self.message_id = 0
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    def channel(self, channel_id: int) -> FakeChannel:
+        if channel_id not in self.channels:
+            self.channels[channel_id] = FakeChannel(channel_id, self.args.send_latency)
+        return self.channels[channel_id]
+
+    async def send(self, rng: random.Random, kind: str, user: int, files: Dict[str, bytes]):
+        self.message_id += 1
+        group = kind in ("group", "noise")
+        author = FakeUser(user, f"user{user}")
+        text = question(rng, kind)
+        mentions = []
+        if kind == "group":
+            text = f"{self.me.mention} {text}"
+            mentions = [self.me]
+        attachments = []
+        latency = self.args.download_latency
+        if kind == "photo":
+            attachments.append(FakeAttachment("photo.jpg", "image/jpeg", files["photo"], latency))
+        elif kind == "pdf":
+            attachments.append(FakeAttachment("report.pdf", "application/pdf", files["pdf"], latency))
+        message = FakeMessage(self.message_id, author, self.channel(1000 + user % 10 if group else user),
+                              self.guild if group else None, text, mentions, attachments)
+        message._state = self.module.bot._connection
+        await self.module.on_message(message)
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in KINDS:
+            raise argparse.ArgumentTypeError(f"неизвестный вид сообщения: {kind}")
+        mix[kind] = float(weight)
+    return mix
+
+
+def percentile(values: List[float], q: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+def rss_mb() -> float:
+    """Текущий RSS процесса (Linux), МБ"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return 0.0
+
+
+async def run_load(drivers, args):
+    files = make_files(args)
+    rng = random.Random(11)
+    kinds, weights = zip(*args.mix.items())
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+
+    async def one(driver, kind: str, user: int):
+        started = time.perf_counter()
+        try:
+            await driver.send(rng, kind, user, files)
+        except Exception as e:
+            errors[f"{driver.platform}:{type(e).__name__}"] += 1
+            return
+        latencies[f"{driver.platform}:{kind}"].append(time.perf_counter() - started)
+
+    tasks = []
+    started = time.perf_counter()
+    # Моменты прихода считаются от старта, чтобы накладные расходы цикла не снижали частоту
+    arrival = 0.0
+    while arrival < args.duration:
+        driver = rng.choice(drivers)
+        tasks.append(asyncio.create_task(one(driver, rng.choices(kinds, weights)[0], rng.randrange(args.users) + 1)))
+        arrival += rng.expovariate(args.rate)
+        await asyncio.sleep(max(0.0, started + arrival - time.perf_counter()))
+    sent_for = time.perf_counter() - started
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    return latencies, errors, len(tasks), sent_for, elapsed
+
+
+def report(drivers, latencies, errors, total: int, sent_for: float, elapsed: float, rss_before: float):
+    from botcore import metrics
+    done = sum(len(v) for v in latencies.values())
+    print(f"\nсообщений {total} за {sent_for:.1f} с ({total / sent_for:.1f}/с), обработано {done} "
+          f"за {elapsed:.1f} с: {done / elapsed:.1f}/с")
+    print(f"{'вид':<18}{'n':>6}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}{'max мс':>10}")
+    everything = []
+    for key in sorted(latencies):
+        values = sorted(latencies[key])
+        everything.extend(values)
+        print(f"{key:<18}{len(values):>6}" + "".join(f"{percentile(values, q) * 1000:>10.0f}"
+                                                    for q in (0.5, 0.95, 0.99, 1.0)))
+    everything.sort()
+    print(f"{'всего':<18}{len(everything):>6}" + "".join(f"{percentile(everything, q) * 1000:>10.0f}"
+                                                      for q in (0.5, 0.95, 0.99, 1.0)))
+    for driver in drivers:
+        name = driver.module.CONFIG.name
+        outcomes = {o: int(metrics.REQUESTS.value(name, o)) for o in
+                    ("ok", "prefiltered", "rejected", "quota", "overloaded", "model_error", "error")}
+        print(f"исходы {name}: " + ", ".join(f"{o} {n}" for o, n in outcomes.items() if n))
+    if errors:
+        print("исключения: " + ", ".join(f"{k} {v}" for k, v in sorted(errors.items())))
+    # ru_maxrss в Linux - КБ
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"RSS до нагрузки {rss_before:.0f} МБ, после {rss_mb():.0f} МБ, пик {peak:.0f} МБ")
+
+
+async def main_async(args):
+    base_url = f"http://127.0.0.1:{args.port}"
+    lmstudio_url = f"http://127.0.0.1:{args.port + 1}/v1/chat/completions"
+    os.environ.update(FAKE_ENV)
+    os.environ["OPENAI_BASE_URL"] = base_url + "/v1"
+    fakes = start_fakes(args)
+    drivers = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            if args.platform in ("telegram", "both"):
+                drivers.append(TelegramDriver(load_script(args.telegram_script, tmp, lmstudio_url), base_url))
+            if args.platform in ("discord", "both"):
+                drivers.append(DiscordDriver(load_script(args.discord_script, tmp, lmstudio_url), args))
+        for driver in drivers:
+            await driver.start()
+        rss_before = rss_mb()
+        latencies, errors, total, sent_for, elapsed = await run_load(drivers, args)
+        report(drivers, latencies, errors, total, sent_for, elapsed, rss_before)
+        for driver in drivers:
+            print(f"{driver.module.CONFIG.name}: " + ", ".join(
+                f"{k} {v}" for k, v in sorted(driver.module.pipeline.counters.items())
+                if k in ("model_calls", "prompt_tokens", "cached_tokens")))
+        if any(driver.platform == "telegram" for driver in drivers):
+            async with aiohttp.ClientSession() as session:
+                async with session.get(base_url + "/stats") as response:
+                    calls = await response.json()
+            print("вызовы Bot API: " + ", ".join(f"{k} {v}" for k, v in sorted(calls.items())))
+    finally:
+        for driver in drivers:
+            await driver.close()
+            if hasattr(driver.module, "lm_client"):
+                await driver.module.lm_client.stop_probes()
+        from botcore import capture, shared
+        await shared.close_shared()
+        capture.close()
+        fakes.terminate()
+        fakes.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--platform", choices=("telegram", "discord", "both"), default="both")
+    parser.add_argument("--telegram-script", default="main-telegram.py", help="Скрипт Telegram-бота")
+    parser.add_argument("--discord-script", default="main-discord.py", help="Скрипт Discord-бота")
+    parser.add_argument("--rate", type=float, default=50, help="Сообщений в секунду")
+    parser.add_argument("--duration", type=float, default=20, help="Длительность подачи нагрузки, с")
+    parser.add_argument("--users", type=int, default=200, help="Количество пользователей")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("text=60,long=5,photo=10,pdf=10,group=10,noise=5"),
+                        help="Доли видов сообщений: вид=вес через запятую")
+    parser.add_argument("--send-latency", type=float, default=0.05, help="Задержка отправки сообщения, с")
+    parser.add_argument("--download-latency", type=float, default=0.1, help="Задержка скачивания файла, с")
+    parser.add_argument("--photo-kb", type=int, default=300, help="Размер фото, КБ")
+    parser.add_argument("--pdf-pages", type=int, default=20, help="Страниц в PDF")
+    parser.add_argument("--port", type=int, default=18400, help="Порт заглушек")
+    parser.add_argument("--serve-fakes", action="store_true", help=argparse.SUPPRESS)
+    mock_openai.add_arguments(parser)
+    mock_lmstudio.add_arguments(parser)
+    args = parser.parse_args()
+    if args.serve_fakes:
+        asyncio.run(serve_fakes(args))
+        return
+    # Конвейер пишет в лог каждый запрос
+    logging.disable(logging.WARNING)
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
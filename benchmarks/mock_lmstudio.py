@@ -0,0 +1,264 @@
+"""Заглушка LM Studio для бенчмарков LMStudioClient.
+
+OpenAI-совместимый сервер (/v1/models, /v1/chat/completions с stream и без)
+с поведением локальной модели:
+- --slots параллельных генераций, остальные запросы ждут в очереди;
+- обработка промпта со скоростью --prefill-tps; префикс, совпавший с одним
+  из недавних промптов (KV-кэш слотов), не пересчитывается;
+- первый токен не раньше --ttft, дальше --tps токенов в секунду;
+- --think-tokens токенов размышлений в <think>...</think> перед ответом;
+- --error-rate ответов с кодом --error-status и --drop-rate обрывов
+  соединения посреди ответа.
+
+Настройки меняются на лету: POST /mock/settings с JSON полей MockSettings;
+счётчики - GET /mock/stats.
+
+Запуск отдельно:
+    python benchmarks/mock_lmstudio.py [--port 1234] [--tps 40] [--ttft 0.2] [--slots 1]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, fields
+from typing import Deque, Dict, List, Optional
+
+from aiohttp import web
+
+try:
+    from benchmarks.mock_openai import WORDS, common_prefix
+except ImportError:
+    # Запуск файлом: benchmarks/ уже в sys.path
+    from mock_openai import WORDS, common_prefix
+
+CHARS_PER_TOKEN = 4
+
+
+@dataclass
+class MockSettings:
+    model: str = "qwen/qwen3-4b"
+    slots: int = 1
+    ttft: float = 0.2
+    tps: float = 40.0
+    prefill_tps: float = 2000.0
+    answer_tokens: int = 120
+    think_tokens: int = 0
+    error_rate: float = 0.0
+    error_status: int = 500
+    drop_rate: float = 0.0
+    models_latency: float = 0.0
+    # Подпись в конце ответа: по ней бенчмарк видит, какой сервер ответил
+    tag: str = ""
+
+
+class MockLMStudio:
+    """Сервер-заглушка; stop()/start() имитируют падение и подъём LM Studio"""
+    def __init__(self, settings: MockSettings, seed: int = 0):
+        self.settings = settings
+        self.rng = random.Random(seed)
+        self.slots = asyncio.Semaphore(settings.slots)
+        # Промпты, чей KV-кэш ещё лежит в слотах
+        self.cache: Deque[str] = deque(maxlen=max(1, settings.slots))
+        self.stats: Dict[str, float] = dict.fromkeys(
+            ("requests", "streamed", "errors", "drops", "prefill_tokens", "cached_tokens",
+             "completion_tokens", "queued", "queued_peak", "active"), 0)
+        self.runner: Optional[web.AppRunner] = None
+
+    def update(self, **changes):
+        for name, value in changes.items():
+            setattr(self.settings, name, value)
+        if "slots" in changes:
+            self.slots = asyncio.Semaphore(self.settings.slots)
+            self.cache = deque(self.cache, maxlen=max(1, self.settings.slots))
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 2**20)
+        app.router.add_get("/v1/models", self.models)
+        app.router.add_post("/v1/chat/completions", self.chat)
+        app.router.add_post("/mock/settings", self.post_settings)
+        app.router.add_get("/mock/stats", self.get_stats)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 1234):
+        self.runner = web.AppRunner(self.app(), access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+
+    async def stop(self):
+        """Закрывает порт и все соединения, как упавший сервер"""
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    # --- модель ---
+
+    def _prefill(self, prompt: str) -> int:
+        """Токены промпта, которые нужно посчитать: без совпавшего с кэшем префикса"""
+        cached = max((common_prefix(old, prompt) for old in self.cache), default=0)
+        self.cache.append(prompt)
+        total = len(prompt) // CHARS_PER_TOKEN + 1
+        cached_tokens = min(total, cached // CHARS_PER_TOKEN)
+        self.stats["cached_tokens"] += cached_tokens
+        self.stats["prefill_tokens"] += total - cached_tokens
+        return total - cached_tokens
+
+    def _tokens(self) -> List[str]:
+        s = self.settings
+        tokens = []
+        if s.think_tokens:
+            tokens.append("<think>")
+            tokens.extend(self.rng.choice(WORDS) + " " for _ in range(s.think_tokens))
+            tokens.append("</think>\n")
+        tokens.extend(self.rng.choice(WORDS) + " " for _ in range(s.answer_tokens))
+        if s.tag:
+            tokens.append(s.tag)
+        return tokens
+
+    async def _acquire(self):
+        """Ожидание свободного слота"""
+        stats = self.stats
+        stats["queued"] += 1
+        stats["queued_peak"] = max(stats["queued_peak"], stats["queued"])
+        try:
+            await self.slots.acquire()
+        finally:
+            stats["queued"] -= 1
+        stats["active"] += 1
+
+    def _release(self):
+        self.stats["active"] -= 1
+        self.slots.release()
+
+    async def _pace(self, started: float, index: int):
+        if self.settings.tps > 0:
+            delay = started + index / self.settings.tps - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    # --- обработчики ---
+
+    async def models(self, request: web.Request) -> web.Response:
+        if self.settings.models_latency:
+            await asyncio.sleep(self.settings.models_latency)
+        return web.json_response({"object": "list", "data": [{"id": self.settings.model, "object": "model"}]})
+
+    async def chat(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        s = self.settings
+        self.stats["requests"] += 1
+        if self.rng.random() < s.error_rate:
+            self.stats["errors"] += 1
+            return web.json_response({"error": "mock error"}, status=s.error_status)
+        drop_at = None
+        if self.rng.random() < s.drop_rate:
+            drop_at = self.rng.random()
+        prompt = json.dumps(body.get("messages", []), ensure_ascii=False)
+        prompt_tokens = len(prompt) // CHARS_PER_TOKEN + 1
+        await self._acquire()
+        try:
+            prefill = self._prefill(prompt)
+            await asyncio.sleep(max(s.ttft, prefill / s.prefill_tps if s.prefill_tps else 0))
+            tokens, started = self._tokens(), time.monotonic()
+            if body.get("stream"):
+                return await self._stream(request, body, tokens, started, prompt_tokens, drop_at)
+            await self._pace(started, len(tokens))
+            if drop_at is not None:
+                return self._drop(request)
+        finally:
+            self._release()
+        self.stats["completion_tokens"] += len(tokens)
+        return web.json_response({
+            "id": f"chatcmpl-{int(self.stats['requests'])}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": s.model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                      "total_tokens": prompt_tokens + len(tokens)},
+        })
+
+    def _drop(self, request: web.Request) -> web.Response:
+        self.stats["drops"] += 1
+        request.transport.close()
+        return web.Response()
+
+    async def _stream(self, request: web.Request, body: Dict, tokens: List[str], started: float,
+                      prompt_tokens: int, drop_at: Optional[float]) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        self.stats["streamed"] += 1
+        created = int(time.time())
+
+        def chunk(delta: Dict, finish: Optional[str] = None, **extra) -> bytes:
+            data = {"id": f"chatcmpl-{int(self.stats['requests'])}", "object": "chat.completion.chunk",
+                    "created": created, "model": self.settings.model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish}], **extra}
+            return b"data: " + json.dumps(data, ensure_ascii=False).encode() + b"\n\n"
+
+        await response.write(chunk({"role": "assistant"}))
+        for index, token in enumerate(tokens):
+            if drop_at is not None and index >= drop_at * len(tokens):
+                return self._drop(request)
+            await self._pace(started, index)
+            await response.write(chunk({"content": token}))
+        self.stats["completion_tokens"] += len(tokens)
+        usage = None
+        if (body.get("stream_options") or {}).get("include_usage"):
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                     "total_tokens": prompt_tokens + len(tokens)}
+        await response.write(chunk({}, "stop", **({"usage": usage} if usage else {})))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def post_settings(self, request: web.Request) -> web.Response:
+        known = {f.name for f in fields(MockSettings)}
+        changes = {k: v for k, v in (await request.json()).items() if k in known}
+        self.update(**changes)
+        return web.json_response(asdict(self.settings))
+
+    async def get_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats)
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--slots", type=int, default=1, help="Параллельных генераций")
+    parser.add_argument("--ttft", type=float, default=0.2, help="Минимальное время до первого токена, с")
+    parser.add_argument("--tps", type=float, default=40.0, help="Токенов ответа в секунду")
+    parser.add_argument("--prefill-tps", type=float, default=2000.0, help="Токенов промпта в секунду")
+    parser.add_argument("--answer-tokens", type=int, default=120, help="Токенов в ответе")
+    parser.add_argument("--think-tokens", type=int, default=0, help="Токенов в <think> перед ответом")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов с ошибкой")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP-код ошибки")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Доля обрывов соединения")
+
+
+def settings_from(args) -> MockSettings:
+    return MockSettings(slots=args.slots, ttft=args.ttft, tps=args.tps, prefill_tps=args.prefill_tps,
+                        answer_tokens=args.answer_tokens, think_tokens=args.think_tokens,
+                        error_rate=args.error_rate, error_status=args.error_status, drop_rate=args.drop_rate)
+
+
+async def serve_forever(args):
+    await MockLMStudio(settings_from(args)).start(args.host, args.port)
+    print(f"Заглушка LM Studio: http://{args.host}:{args.port}/v1/chat/completions", flush=True)
+    await asyncio.Event().wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1234)
+    add_arguments(parser)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve_forever(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""OpenAI-совместимая заглушка для бенчмарков и нагрузочных тестов.
+
+Отвечает на /v1/models, /v1/chat/completions и /v1/completions (в том числе
+со списком prompt) с настраиваемой задержкой. Ответ - русский текст с
+markdown заданной длины. usage считается по длине промпта (~4 символа на
+токен); cached_tokens имитирует кэш префикса OpenAI: общий с прошлым
+запросом того же prompt_cache_key префикс от 1024 токенов, блоками по 128.
+
+Запуск отдельно:
+    python benchmarks/mock_openai.py [--port 18080] [--latency 0.5] [--answer-chars 400]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass
+from typing import Dict
+
+from aiohttp import web
+
+CHARS_PER_TOKEN = 4
+WORDS = ("ответ", "модель", "код", "**важно**", "`config.py`", "сервер", "данные", "пример", "- пункт",
+         "функция", "запрос", "_курсив_", "python", "ошибка", "решение", "(скобки)", "тест")
+
+
+@dataclass
+class MockSettings:
+    latency: float = 0.5
+    # Случайный разброс задержки: доля от latency
+    jitter: float = 0.2
+    answer_chars: int = 400
+    model: str = "mock"
+
+
+def answer_text(rng: random.Random, chars: int) -> str:
+    words = []
+    total = 0
+    while total < chars:
+        word = rng.choice(WORDS)
+        words.append(word)
+        total += len(word) + 1
+    return " ".join(words)
+
+
+def common_prefix(a: str, b: str) -> int:
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+class MockOpenAI:
+    """Состояние заглушки: настройки, кэш префиксов и счётчики"""
+    def __init__(self, settings: MockSettings):
+        self.settings = settings
+        self.rng = random.Random(0)
+        self.prefixes: Dict[str, str] = {}
+        self.requests = 0
+
+    async def delay(self):
+        s = self.settings
+        await asyncio.sleep(max(0.0, s.latency * (1 + s.jitter * (2 * self.rng.random() - 1))))
+
+    def usage(self, prompt: str, answer: str, cache_key: str) -> Dict:
+        prompt_tokens = len(prompt) // CHARS_PER_TOKEN + 1
+        cached = 0
+        if cache_key:
+            shared = common_prefix(self.prefixes.get(cache_key, ""), prompt) // CHARS_PER_TOKEN
+            if shared >= 1024:
+                cached = shared // 128 * 128
+            self.prefixes[cache_key] = prompt
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(answer) // CHARS_PER_TOKEN + 1,
+            "total_tokens": prompt_tokens + len(answer) // CHARS_PER_TOKEN + 1,
+            "prompt_tokens_details": {"cached_tokens": min(cached, prompt_tokens)},
+        }
+
+    async def models(self, request: web.Request) -> web.Response:
+        return web.json_response({"object": "list", "data": [{"id": self.settings.model, "object": "model"}]})
+
+    async def chat(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.requests += 1
+        await self.delay()
+        prompt = json.dumps(body.get("messages", []), ensure_ascii=False)
+        answer = answer_text(self.rng, self.settings.answer_chars)
+        return web.json_response({
+            "id": f"chatcmpl-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", self.settings.model),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+            "usage": self.usage(prompt, answer, body.get("prompt_cache_key") or ""),
+        })
+
+    async def completions(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.requests += 1
+        prompts = body.get("prompt", "")
+        prompts = prompts if isinstance(prompts, list) else [prompts]
+        await self.delay()
+        answers = [answer_text(self.rng, self.settings.answer_chars) for _ in prompts]
+        usage = self.usage("".join(prompts), "".join(answers), "")
+        return web.json_response({
+            "id": f"cmpl-{self.requests}",
+            "object": "text_completion",
+            "created": int(time.time()),
+            "model": body.get("model", self.settings.model),
+            "choices": [{"index": i, "text": " " + a, "finish_reason": "stop", "logprobs": None}
+                        for i, a in enumerate(answers)],
+            "usage": usage,
+        })
+
+    def add_routes(self, app: web.Application):
+        app.router.add_get("/v1/models", self.models)
+        app.router.add_post("/v1/chat/completions", self.chat)
+        app.router.add_post("/v1/completions", self.completions)
+
+
+async def start(settings: MockSettings, host: str = "127.0.0.1", port: int = 18080) -> web.AppRunner:
+    app = web.Application(client_max_size=64 * 2**20)
+    MockOpenAI(settings).add_routes(app)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", type=float, default=0.5, help="Задержка ответа модели, с")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Разброс задержки, доля")
+    parser.add_argument("--answer-chars", type=int, default=400, help="Длина ответа, символов")
+
+
+def settings_from(args) -> MockSettings:
+    return MockSettings(latency=args.latency, jitter=args.jitter, answer_chars=args.answer_chars)
+
+
+async def serve_forever(args):
+    await start(settings_from(args), args.host, args.port)
+    print(f"Заглушка OpenAI: http://{args.host}:{args.port}/v1", flush=True)
+    await asyncio.Event().wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    add_arguments(parser)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve_forever(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""Воспроизведение записанной формы запросов (botcore/capture.py) через конвейер.
+
+Для каждой записи собирается Request той же формы: текст нужной длины,
+вложения того же вида и размера (синтетические байты, PDF с текстом),
+тот же тип чата и признак адресованности. Запросы одного пользователя
+идут от одного id, поэтому память диалогов растёт как в записи. Время
+прихода сохраняется: --speed 2 - вдвое быстрее, 0 - без пауз.
+
+Модель (--backend):
+- stub - в процессе: --latency на ответ плюс --per-token на токен ответа,
+  длина ответа как в записи;
+- openai - OpenAIChatBackend на --url (benchmarks/mock_openai.py);
+- lmstudio - LMStudioClient на --url (benchmarks/mock_lmstudio.py).
+
+В отчёте - исходы и задержки воспроизведения рядом с записанными.
+
+Запуск из корня репозитория:
+    python benchmarks/replay.py traffic.jsonl [--speed 1] [--backend stub|openai|lmstudio] [--url URL]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.loadtest import make_pdf  # noqa: E402
+from botcore import shared  # noqa: E402
+from botcore.attachments import IMAGE, Attachment  # noqa: E402
+from botcore.config import BotConfig  # noqa: E402
+from botcore.llm import Completion, LLMBackend  # noqa: E402
+from botcore.markdown import chunk_text  # noqa: E402
+from botcore.pipeline import Pipeline, Request, Transport  # noqa: E402
+
+FILLER = "Пример текста пользователя с вопросом про код, сервер и данные. "
+# Примерно столько байт текста на страницу PDF из make_pdf
+PDF_PAGE_BYTES = 2600
+
+# Запись, которую сейчас воспроизводит задача: заглушка модели берёт из неё длину ответа
+current: ContextVar[Optional[Dict]] = ContextVar("replay_record", default=None)
+
+
+def filler(length: int) -> str:
+    return (FILLER * (length // len(FILLER) + 1))[:length]
+
+
+class StubBackend(LLMBackend):
+    """Модель в процессе: задержка и длина ответа по записи"""
+    def __init__(self, latency: float, per_token: float):
+        self.model = "replay"
+        self.latency = latency
+        self.per_token = per_token
+
+    async def generate(self, messages: List[Dict], session_key: Optional[str] = None) -> Completion:
+        record = current.get() or {}
+        tokens = record.get("completion_tokens") or 50
+        await asyncio.sleep(self.latency + tokens * self.per_token)
+        prompt_chars = sum(len(m["content"]) if isinstance(m["content"], str) else 0 for m in messages)
+        return Completion(filler(record.get("answer_len") or tokens * 4), self.model,
+                          prompt_tokens=prompt_chars // 4, completion_tokens=tokens)
+
+
+class ReplayTransport(Transport):
+    """Отправка с фиксированной задержкой на сообщение"""
+    def __init__(self, message_limit: int, send_latency: float):
+        self.message_limit = message_limit
+        self.send_latency = send_latency
+
+    @asynccontextmanager
+    async def typing(self, request: Request):
+        yield
+
+    def render(self, request: Request, answer: str) -> List[str]:
+        return chunk_text(answer, self.message_limit)
+
+    async def send(self, request: Request, chunks: List[str]):
+        for _ in chunks:
+            await asyncio.sleep(self.send_latency)
+
+    async def send_error(self, request: Request, text: str):
+        await asyncio.sleep(self.send_latency)
+
+
+class Payloads:
+    """Синтетическое содержимое вложений; PDF кэшируются по числу страниц"""
+    def __init__(self, download_latency: float):
+        self.download_latency = download_latency
+        self.rng = random.Random(5)
+        self.pdfs: Dict[int, bytes] = {}
+
+    def attachment(self, item: Dict) -> Attachment:
+        size, ext = item["size"], item.get("ext", "")
+
+        async def fetch() -> bytes:
+            await asyncio.sleep(self.download_latency)
+            if item["kind"] == IMAGE:
+                return self.rng.randbytes(size)
+            if ext == ".pdf":
+                pages = max(1, size // PDF_PAGE_BYTES)
+                if pages not in self.pdfs:
+                    self.pdfs[pages] = make_pdf(pages)
+                return self.pdfs[pages]
+            return filler(size).encode("utf-8")[:size]
+
+        return Attachment("file" + ext, size, item["kind"], fetch)
+
+
+def build_request(record: Dict, payloads: Payloads) -> Request:
+    user = int(record["user"], 16)
+    return Request(
+        platform=record["platform"],
+        user_id=user,
+        chat_id=int(record["chat"], 16),
+        user_name=f"user{user % 10000}",
+        chat_title="replay" if record["group"] else None,
+        is_group=record["group"],
+        addressed=record["addressed"],
+        text=filler(record["text_len"]),
+        attachments=[payloads.attachment(item) for item in record["attachments"]],
+    )
+
+
+def shape(record: Dict) -> str:
+    kinds = sorted({("pdf" if a.get("ext") == ".pdf" else a["kind"]) for a in record["attachments"]})
+    base = "+".join(kinds) if kinds else "text"
+    if record["group"]:
+        base = "group:" + base
+    return base
+
+
+def make_backend(args) -> LLMBackend:
+    if args.backend == "openai":
+        from botcore.openai_backend import OpenAIChatBackend
+        os.environ["OPENAI_BASE_URL"] = args.url
+        return OpenAIChatBackend(shared.openai_client("sk-replay"), "replay")
+    if args.backend == "lmstudio":
+        from botcore.lmstudio import LMStudioClient
+        return LMStudioClient(args.url, "replay")
+    return StubBackend(args.latency, args.per_token)
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+async def main_async(args):
+    with open(args.file, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if args.bot:
+        records = [r for r in records if r["bot"] == args.bot]
+    records.sort(key=lambda r: r["ts"])
+    if args.limit:
+        records = records[:args.limit]
+    if not records:
+        raise SystemExit("Нет записей для воспроизведения")
+
+    backend = make_backend(args)
+    payloads = Payloads(args.download_latency)
+    pipelines: Dict[str, Pipeline] = {}
+    transport = ReplayTransport(args.message_limit, args.send_latency)
+    replayed: Dict[str, List[float]] = defaultdict(list)
+    captured: Dict[str, List[float]] = defaultdict(list)
+    outcomes: Counter = Counter()
+
+    async def one(record: Dict):
+        pipeline = pipelines.get(record["bot"])
+        if pipeline is None:
+            pipeline = pipelines[record["bot"]] = Pipeline(
+                BotConfig(record["bot"], "replay", "Вы ассистент. Отвечайте кратко.", memory_size=args.memory,
+                          message_limit=args.message_limit), backend)
+        current.set(record)
+        request = build_request(record, payloads)
+        started = time.perf_counter()
+        await pipeline.handle(request, transport)
+        elapsed = time.perf_counter() - started
+        if record["outcome"] != "prefiltered":
+            replayed[shape(record)].append(elapsed)
+            captured[shape(record)].append(record["ms"] / 1000)
+        outcomes[record["outcome"]] += 1
+
+    first = records[0]["ts"]
+    span = records[-1]["ts"] - first
+    print(f"{len(records)} запросов за {span:.1f} с записи, скорость x{args.speed:g}, бэкенд {args.backend}")
+    tasks = []
+    started = time.perf_counter()
+    for record in records:
+        if args.speed > 0:
+            delay = started + (record["ts"] - first) / args.speed - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(record)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    print(f"воспроизведено за {elapsed:.1f} с: {len(records) / elapsed:.1f} запросов/с")
+    print(f"{'форма':<22}{'n':>6}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}{'запись p50':>12}{'запись p95':>12}")
+    for key in sorted(replayed):
+        values = replayed[key]
+        print(f"{key:<22}{len(values):>6}" + "".join(f"{percentile(values, q) * 1000:>10.0f}" for q in (0.5, 0.95, 0.99))
+              + "".join(f"{percentile(captured[key], q) * 1000:>12.0f}" for q in (0.5, 0.95)))
+    for name, pipeline in pipelines.items():
+        counters = pipeline.counters
+        print(f"{name}: получено {counters['received']}, отброшено префильтром {counters['prefiltered']}, "
+              f"вызовов модели {counters['model_calls']}")
+    print("исходы в записи: " + ", ".join(f"{k} {v}" for k, v in sorted(outcomes.items())))
+    await shared.close_shared()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("file", nargs="?", default="traffic.jsonl", help="Файл записи (CAPTURE_FILE)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Ускорение времени записи (0 - без пауз)")
+    parser.add_argument("--bot", default="", help="Только запросы этого бота")
+    parser.add_argument("--limit", type=int, default=0, help="Не больше N первых запросов")
+    parser.add_argument("--backend", choices=("stub", "openai", "lmstudio"), default="stub")
+    parser.add_argument("--url", default="http://127.0.0.1:18080/v1",
+                        help="Адрес заглушки: .../v1 для openai, .../v1/chat/completions для lmstudio")
+    parser.add_argument("--latency", type=float, default=0.5, help="Задержка ответа stub, с")
+    parser.add_argument("--per-token", type=float, default=0.002, help="Добавка stub на токен ответа, с")
+    parser.add_argument("--send-latency", type=float, default=0.05, help="Задержка отправки сообщения, с")
+    parser.add_argument("--download-latency", type=float, default=0.1, help="Задержка скачивания вложения, с")
+    parser.add_argument("--memory", type=int, default=10, help="memory_size")
+    parser.add_argument("--message-limit", type=int, default=4000, help="Лимит длины сообщения")
+    args = parser.parse_args()
+    # Конвейер пишет в лог каждый запрос
+    logging.disable(logging.WARNING)
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Общий код ботов Begemot AI и MorkvaAI."""
@@ -0,0 +1 @@
+"""Адаптеры платформ для общего конвейера."""
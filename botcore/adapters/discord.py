@@ -0,0 +1,132 @@
+"""Адаптер discord.py: сборка Request из Message, отправка ответа, кнопка «Продолжить»."""
+import logging
+import re
+from typing import List
+
+import discord
+from discord.ext import commands
+from discord.ui import Button, View
+
+from botcore import tracing
+from botcore.attachments import FILE, IMAGE, Attachment
+from botcore.markdown import chunk_text
+from botcore.pipeline import Pipeline, Request, Transport
+
+logger = logging.getLogger(__name__)
+
+CONTINUE_ID = "continue_response"
+CONTINUATION_NS = "continuation"
+
+
+def _continue_view() -> View:
+    view = View(timeout=None)
+    view.add_item(Button(label="Продолжить", style=discord.ButtonStyle.primary, custom_id=CONTINUE_ID))
+    return view
+
+
+class DiscordAdapter(Transport):
+    """Связывает commands.Bot с конвейером"""
+    def __init__(self, bot: commands.Bot, pipeline: Pipeline):
+        self.bot = bot
+        self.pipeline = pipeline
+        self.config = pipeline.config
+        # Оставшиеся части длинных ответов хранятся в общем хранилище сессий
+        self.store = pipeline.memory.store
+        self._mention_re = None
+
+    def _strip_mention(self, text: str) -> str:
+        if self._mention_re is None:
+            self._mention_re = re.compile(rf'<@!?{self.bot.user.id}>')
+        return self._mention_re.sub('', text).strip()
+
+    async def handle_message(self, message: discord.Message) -> bool:
+        """Обрабатывает обычное сообщение; False, если оно не для бота"""
+        if message.author == self.bot.user:
+            return False
+        prefix = self.bot.command_prefix
+        if isinstance(prefix, str) and message.content.startswith(prefix):
+            return False
+        request = self.build_request(message)
+        return await self.pipeline.handle(request, self)
+
+    def _is_addressed(self, message: discord.Message) -> bool:
+        """Упоминание бота или ответ на его сообщение - без запросов к API"""
+        if self.bot.user.mentioned_in(message):
+            return True
+        reference = message.reference
+        resolved = reference.resolved if reference else None
+        return isinstance(resolved, discord.Message) and resolved.author == self.bot.user
+
+    def build_request(self, message: discord.Message) -> Request:
+        is_group = message.guild is not None
+        items: List[Attachment] = []
+        for attachment in message.attachments:
+            is_image = bool(attachment.content_type and attachment.content_type.startswith('image/'))
+            items.append(Attachment(attachment.filename, attachment.size, IMAGE if is_image else FILE, attachment.read))
+        return Request(
+            platform="discord",
+            user_id=message.author.id,
+            chat_id=message.channel.id,
+            user_name=message.author.name,
+            chat_title=f"{message.guild.name} | {message.channel.name}" if is_group else None,
+            is_group=is_group,
+            addressed=not is_group or self._is_addressed(message),
+            text=self._strip_mention(message.content),
+            attachments=items,
+            guild_id=message.guild.id if is_group else None,
+            raw=message,
+        )
+
+    # --- Transport ---
+
+    def typing(self, request: Request):
+        return request.raw.channel.typing()
+
+    def render(self, request: Request, answer: str) -> List[str]:
+        return chunk_text(answer, self.config.message_limit)
+
+    def _continuation_key(self, message_id: int) -> str:
+        return f"{self.config.name}:{message_id}"
+
+    async def _send_chunks(self, channel, chunks: List[str]):
+        if not chunks:
+            return
+        if len(chunks) > 1 and self.config.continuation:
+            with tracing.span("send_chunk", index=0, chars=len(chunks[0]), continuation=len(chunks) - 1):
+                sent = await channel.send(chunks[0], view=_continue_view())
+            await self.store.set(CONTINUATION_NS, self._continuation_key(sent.id), chunks[1:])
+            return
+        for index, chunk in enumerate(chunks):
+            with tracing.span("send_chunk", index=index, chars=len(chunk)):
+                await channel.send(chunk)
+
+    async def send(self, request: Request, chunks: List[str]):
+        await self._send_chunks(request.raw.channel, chunks)
+
+    async def send_error(self, request: Request, text: str):
+        await request.raw.channel.send(text)
+
+    async def handle_interaction(self, interaction: discord.Interaction) -> bool:
+        """Обрабатывает нажатие «Продолжить»; False, если это чужое взаимодействие"""
+        if interaction.type != discord.InteractionType.component or interaction.data.get("custom_id") != CONTINUE_ID:
+            return False
+        remaining = await self.store.pop(CONTINUATION_NS, self._continuation_key(interaction.message.id))
+        if not remaining:
+            await interaction.response.edit_message(content=interaction.message.content, view=None)
+            return True
+
+        # Отключаем кнопку на старом сообщении
+        try:
+            await interaction.message.edit(view=None)
+        except Exception as e:
+            logger.warning(f"Не удалось обновить старое сообщение: {e}")
+
+        if len(remaining) > 1 and self.config.continuation:
+            await interaction.response.send_message(remaining[0], view=_continue_view())
+            new_message = await interaction.original_response()
+            await self.store.set(CONTINUATION_NS, self._continuation_key(new_message.id), remaining[1:])
+        else:
+            await interaction.response.send_message(remaining[0])
+            for chunk in remaining[1:]:
+                await interaction.channel.send(chunk)
+        return True
@@ -0,0 +1,230 @@
+"""Адаптер aiogram: сборка Request из Message, отправка ответа, кнопка «Продолжить»."""
+import asyncio
+import logging
+import re
+from contextlib import asynccontextmanager
+from io import BytesIO
+from typing import Any, Dict, List, Optional
+
+from aiogram import Bot, Dispatcher, F, types
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+from aiogram.types import InlineKeyboardButton, Message
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from botcore import logs, tracing
+from botcore.attachments import FILE, IMAGE, Attachment
+from botcore.markdown import chunk_text, escape_markdown_v2
+from botcore.pipeline import Pipeline, Request, Transport
+from botcore.storage import SessionStore
+
+logger = logging.getLogger(__name__)
+
+PARSE_MODE = "MarkdownV2"
+CONTINUE_CALLBACK = "continue_response"
+
+CONTINUATION_NS = "continuation"
+FSM_STATE_NS = "fsm_state"
+FSM_DATA_NS = "fsm_data"
+
+MAX_DOWNLOAD_RETRIES = 3
+DOWNLOAD_RETRY_DELAY = 1
+
+
+async def download_file_with_retry(bot: Bot, file_path: str, max_retries: int = MAX_DOWNLOAD_RETRIES,
+                                   delay: int = DOWNLOAD_RETRY_DELAY) -> BytesIO:
+    """Загружает файл с повторными попытками при тайм-ауте"""
+    for attempt in range(max_retries + 1):
+        try:
+            logger.info(f"Попытка загрузки файла {attempt + 1}/{max_retries + 1}", extra=logs.fields(sampled=True))
+            with tracing.span("download_file", attempt=attempt + 1):
+                return await bot.download_file(file_path)
+        except asyncio.TimeoutError:
+            if attempt < max_retries:
+                logger.warning(f"Тайм-аут при загрузке файла (попытка {attempt + 1}/{max_retries + 1}). Повтор через {delay} сек...")
+                await asyncio.sleep(delay)
+            else:
+                logger.error(f"Не удалось загрузить файл после {max_retries + 1} попыток.")
+                raise
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке файла: {e}")
+            raise
+    raise RuntimeError("Неизвестная ошибка загрузки файла")
+
+
+class SessionFSMStorage(BaseStorage):
+    """FSM-хранилище aiogram поверх SessionStore: состояние переживает рестарт и видно всем воркерам"""
+    def __init__(self, store: SessionStore, namespace: str):
+        self.store = store
+        self.namespace = namespace
+
+    def _key(self, key: StorageKey) -> str:
+        parts = [self.namespace, key.bot_id, key.chat_id, key.user_id,
+                 getattr(key, "thread_id", None), getattr(key, "destiny", "default")]
+        return ":".join(str(p) for p in parts)
+
+    async def set_state(self, key: StorageKey, state=None) -> None:
+        value = state.state if isinstance(state, State) else state
+        await self.store.set(FSM_STATE_NS, self._key(key), value)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return await self.store.get(FSM_STATE_NS, self._key(key))
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self.store.set(FSM_DATA_NS, self._key(key), dict(data) or None)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return dict(await self.store.get(FSM_DATA_NS, self._key(key)) or {})
+
+    async def close(self) -> None:
+        # Хранилище общее на процесс, его закрывает botcore.shared
+        pass
+
+
+class TelegramAdapter(Transport):
+    """Связывает aiogram Dispatcher с конвейером"""
+    def __init__(self, bot: Bot, pipeline: Pipeline):
+        self.bot = bot
+        self.pipeline = pipeline
+        self.config = pipeline.config
+        self.parse_mode: Optional[str] = PARSE_MODE if self.config.markdown else None
+        # Оставшиеся части длинных ответов хранятся в общем хранилище сессий
+        self.store = pipeline.memory.store
+        # Данные бота запрашиваются один раз, а не на каждое сообщение в группе
+        self.bot_id: Optional[int] = None
+        self._mention_re: Optional[re.Pattern] = None
+
+    def register(self, dp: Dispatcher, *filters):
+        """Регистрирует обработчик сообщений и кнопки «Продолжить»"""
+        dp.startup.register(self.load_identity)
+        dp.message(F.photo | F.text | F.document, *filters)(self.handle_message)
+        dp.callback_query(F.data == CONTINUE_CALLBACK)(self.handle_continue)
+
+    async def load_identity(self):
+        """Запоминает id и username бота; вызывается при старте диспетчера"""
+        if self._mention_re is not None:
+            return
+        bot_info = await self.bot.get_me()
+        self.bot_id = bot_info.id
+        # Username в Telegram регистронезависим
+        self._mention_re = re.compile(rf"@{re.escape(bot_info.username or '')}\b", re.IGNORECASE)
+
+    async def handle_message(self, message: Message):
+        # Игнорируем команды
+        if message.text and message.text.startswith('/'):
+            return
+        request = await self.build_request(message)
+        await self.pipeline.handle(request, self)
+
+    def _fetcher(self, file_id: str):
+        async def fetch() -> bytes:
+            file = await self.bot.get_file(file_id)
+            file_data = await download_file_with_retry(self.bot, file.file_path)
+            return file_data.read()
+        return fetch
+
+    async def build_request(self, message: Message) -> Request:
+        text = message.caption or message.text or ""
+        is_group = message.chat.type in ('group', 'supergroup')
+        addressed = not is_group
+        if is_group:
+            if self._mention_re is None:
+                await self.load_identity()
+            stripped, mentions = self._mention_re.subn("", text)
+            if mentions:
+                addressed = True
+                text = stripped.strip()
+            reply = message.reply_to_message
+            if reply and reply.from_user and reply.from_user.id == self.bot_id:
+                addressed = True
+
+        items: List[Attachment] = []
+        if message.photo:
+            # Берем самое качественное изображение
+            photo = message.photo[-1]
+            items.append(Attachment("photo.jpg", photo.file_size or 0, IMAGE, self._fetcher(photo.file_id)))
+        if message.document:
+            document = message.document
+            items.append(Attachment(document.file_name or "document", document.file_size or 0, FILE,
+                                    self._fetcher(document.file_id)))
+
+        return Request(
+            platform="telegram",
+            user_id=message.from_user.id,
+            chat_id=message.chat.id,
+            user_name=message.from_user.full_name,
+            chat_title=message.chat.title if message.chat.type != 'private' else None,
+            is_group=is_group,
+            addressed=addressed,
+            text=text,
+            attachments=items,
+            raw=message,
+        )
+
+    # --- Transport ---
+
+    @asynccontextmanager
+    async def typing(self, request: Request):
+        try:
+            await self.bot.send_chat_action(chat_id=request.chat_id, action="typing")
+        except Exception:
+            pass
+        yield
+
+    def render(self, request: Request, answer: str) -> List[str]:
+        if self.parse_mode:
+            answer = escape_markdown_v2(answer)
+        return chunk_text(answer, self.config.message_limit)
+
+    def _continuation_key(self, chat_id: int, message_id: int) -> str:
+        return f"{self.config.name}:{chat_id}:{message_id}"
+
+    def _continue_markup(self):
+        builder = InlineKeyboardBuilder()
+        builder.add(InlineKeyboardButton(text="Продолжить", callback_data=CONTINUE_CALLBACK))
+        return builder.as_markup()
+
+    async def _reply_chunks(self, message: Message, chunks: List[str]):
+        """Отправляет первую часть с кнопкой или все части подряд"""
+        if not chunks:
+            return
+        if len(chunks) > 1 and self.config.continuation:
+            with tracing.span("send_chunk", index=0, chars=len(chunks[0]), continuation=len(chunks) - 1):
+                sent = await message.reply(chunks[0], parse_mode=self.parse_mode,
+                                           reply_markup=self._continue_markup(), disable_web_page_preview=True)
+            await self.store.set(CONTINUATION_NS, self._continuation_key(sent.chat.id, sent.message_id), chunks[1:])
+            return
+        for index, chunk in enumerate(chunks):
+            with tracing.span("send_chunk", index=index, chars=len(chunk)):
+                await message.reply(chunk, parse_mode=self.parse_mode, disable_web_page_preview=True)
+
+    async def send(self, request: Request, chunks: List[str]):
+        await self._reply_chunks(request.raw, chunks)
+
+    async def send_error(self, request: Request, text: str):
+        if self.parse_mode:
+            text = escape_markdown_v2(text)
+        await request.raw.reply(text, parse_mode=self.parse_mode, disable_web_page_preview=True)
+
+    async def handle_continue(self, callback_query: types.CallbackQuery):
+        message = callback_query.message
+        remaining = await self.store.pop(CONTINUATION_NS, self._continuation_key(message.chat.id, message.message_id))
+
+        # Убираем кнопку
+        try:
+            await self.bot.edit_message_reply_markup(
+                chat_id=message.chat.id,
+                message_id=message.message_id,
+                reply_markup=None
+            )
+        except Exception:
+            pass
+
+        try:
+            if remaining:
+                await self._reply_chunks(message, remaining)
+                await callback_query.answer()
+            else:
+                await callback_query.answer(text="Больше текста нет.", show_alert=True)
+        except Exception as e:
+            logger.error(f"Ошибка продолжения ответа: {e}")
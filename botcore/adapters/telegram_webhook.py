@@ -0,0 +1,216 @@
+"""Режим webhook для Telegram-ботов на aiohttp - альтернатива long polling.
+
+Telegram получает 200 сразу после постановки обновления в ограниченную очередь,
+а обработку выполняют фоновые воркеры. Если очередь переполнена, сервер отвечает
+503 и Telegram повторит доставку позже - это и есть обратное давление.
+
+Несколько ботов одного процесса (см. botcore.runner) делят один сервер на адрес:
+каждый бот слушает путь /telegram/<id бота>.
+
+Переменные окружения:
+- TELEGRAM_WEBHOOK_URL - публичный адрес (https://example.com); без него - polling;
+- TELEGRAM_WEBHOOK_LISTEN - адрес сервера, по умолчанию 0.0.0.0:8080;
+- TELEGRAM_WEBHOOK_SECRET - секрет для заголовка X-Telegram-Bot-Api-Secret-Token;
+  без него при каждом запуске генерируется случайный. Запросы без верного
+  секрета отклоняются всегда: иначе любой, кто видит порт, мог бы подделать
+  обновление от имени любого пользователя;
+- TELEGRAM_WEBHOOK_QUEUE - размер очереди обновлений, по умолчанию 1000;
+- TELEGRAM_WEBHOOK_WORKERS - число воркеров, по умолчанию 32.
+"""
+import asyncio
+import hmac
+import json
+import logging
+import os
+import secrets
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+PATH_PREFIX = "/telegram"
+DEFAULT_LISTEN = "0.0.0.0:8080"
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_WORKERS = 32
+# Сколько ждать обработки уже принятых обновлений при остановке
+DRAIN_TIMEOUT = 10
+
+
+def parse_listen(listen: str) -> Tuple[str, int]:
+    """Разбирает адрес вида host:port"""
+    host, _, port = listen.rpartition(":")
+    return host or "0.0.0.0", int(port)
+
+
+class WebhookReceiver:
+    """Приём обновлений одного бота: проверка секрета, очередь и воркеры"""
+    def __init__(self, dispatcher, bot, secret: str,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, workers: int = DEFAULT_WORKERS):
+        if not secret:
+            raise ValueError("Webhook без секрета принимал бы поддельные обновления")
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.secret = secret
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.workers_count = workers
+        self._workers: List[asyncio.Task] = []
+        self.received = 0
+        self.rejected = 0
+        self._overflow = False
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret):
+            return web.Response(status=401)
+        try:
+            update = await request.json(loads=json.loads)
+        except ValueError:
+            return web.Response(status=400)
+        try:
+            # Разбор Update и вся обработка - в воркере, ответ Telegram не ждёт
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            if not self._overflow:
+                self._overflow = True
+                logger.warning(f"Очередь обновлений бота {self.bot.id} переполнена, Telegram повторит доставку")
+            return web.Response(status=503)
+        self._overflow = False
+        self.received += 1
+        return web.Response()
+
+    async def _worker(self):
+        while True:
+            update = await self.queue.get()
+            try:
+                await self.dispatcher.feed_raw_update(self.bot, update)
+            except Exception:
+                logger.exception(f"Ошибка обработки обновления {update.get('update_id')}")
+            finally:
+                self.queue.task_done()
+
+    def start(self):
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers_count)]
+
+    async def stop(self, timeout: float = DRAIN_TIMEOUT):
+        """Дожидается обработки принятых обновлений (не дольше timeout) и останавливает воркеры"""
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Не обработано обновлений при остановке: {self.queue.qsize()}")
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+
+class WebhookServer:
+    """aiohttp-сервер на одном адресе; запросы раздаются ботам по id из пути"""
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.receivers: Dict[str, WebhookReceiver] = {}
+        self._runner: Optional[web.AppRunner] = None
+
+    async def _dispatch(self, request: web.Request) -> web.Response:
+        receiver = self.receivers.get(request.match_info["bot_id"])
+        if receiver is None:
+            return web.Response(status=404)
+        return await receiver.handle(request)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post(PATH_PREFIX + "/{bot_id}", self._dispatch)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Webhook-сервер слушает {self.host}:{self.port}")
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+_servers: Dict[Tuple[str, int], WebhookServer] = {}
+_servers_lock = asyncio.Lock()
+
+
+async def attach(receiver: WebhookReceiver, listen: str) -> str:
+    """Регистрирует бота на общем сервере адреса listen; возвращает путь webhook"""
+    host, port = parse_listen(listen)
+    async with _servers_lock:
+        server = _servers.get((host, port))
+        if server is None:
+            server = WebhookServer(host, port)
+            await server.start()
+            _servers[(host, port)] = server
+    bot_id = str(receiver.bot.id)
+    server.receivers[bot_id] = receiver
+    return f"{PATH_PREFIX}/{bot_id}"
+
+
+async def detach(receiver: WebhookReceiver, listen: str):
+    """Снимает бота с сервера; последний бот закрывает сервер"""
+    host, port = parse_listen(listen)
+    async with _servers_lock:
+        server = _servers.get((host, port))
+        if server is None:
+            return
+        server.receivers.pop(str(receiver.bot.id), None)
+        if not server.receivers:
+            await server.close()
+            del _servers[(host, port)]
+
+
+async def run_webhook(dispatcher, bot, url: str, listen: str = DEFAULT_LISTEN, secret: Optional[str] = None,
+                      queue_size: int = DEFAULT_QUEUE_SIZE, workers: int = DEFAULT_WORKERS,
+                      drop_pending_updates: bool = False, **kwargs: Any):
+    """Аналог dispatcher.start_polling для webhook; работает до отмены задачи.
+
+    Без secret генерируется случайный и передаётся Telegram в set_webhook.
+    """
+    if not secret:
+        secret = secrets.token_urlsafe(32)
+        logger.info(f"TELEGRAM_WEBHOOK_SECRET не задан, для бота {bot.id} создан случайный секрет")
+    receiver = WebhookReceiver(dispatcher, bot, secret, queue_size, workers)
+    workflow_data = {"dispatcher": dispatcher, "bots": [bot], "bot": bot, **dispatcher.workflow_data, **kwargs}
+    await dispatcher.emit_startup(**workflow_data)
+    receiver.start()
+    path = await attach(receiver, listen)
+    try:
+        await bot.set_webhook(
+            url.rstrip("/") + path,
+            secret_token=secret,
+            drop_pending_updates=drop_pending_updates,
+            allowed_updates=dispatcher.resolve_used_update_types(),
+            max_connections=min(max(workers, 1), 100),
+        )
+        logger.info(f"Webhook бота {bot.id} установлен: {url.rstrip('/')}{path}")
+        await asyncio.Event().wait()
+    finally:
+        # Webhook не удаляем: на время перезапуска Telegram копит обновления у себя
+        await detach(receiver, listen)
+        await receiver.stop()
+        await dispatcher.emit_shutdown(**workflow_data)
+        await bot.session.close()
+
+
+async def serve(dispatcher, bot, drop_pending_updates: bool = False, **kwargs: Any):
+    """Webhook, если задан TELEGRAM_WEBHOOK_URL, иначе long polling"""
+    url = os.getenv("TELEGRAM_WEBHOOK_URL")
+    if not url:
+        # Polling не работает, пока у бота установлен webhook
+        await bot.delete_webhook(drop_pending_updates=drop_pending_updates)
+        await dispatcher.start_polling(bot, handle_signals=False, **kwargs)
+        return
+    await run_webhook(
+        dispatcher, bot, url,
+        listen=os.getenv("TELEGRAM_WEBHOOK_LISTEN", DEFAULT_LISTEN),
+        secret=os.getenv("TELEGRAM_WEBHOOK_SECRET") or None,
+        queue_size=int(os.getenv("TELEGRAM_WEBHOOK_QUEUE", DEFAULT_QUEUE_SIZE)),
+        workers=int(os.getenv("TELEGRAM_WEBHOOK_WORKERS", DEFAULT_WORKERS)),
+        drop_pending_updates=drop_pending_updates,
+        **kwargs,
+    )
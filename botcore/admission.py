@@ -0,0 +1,180 @@
+"""Адаптивный контроль допуска запросов к модели (AIMD).
+
+Лимит одновременных запросов растёт на 1/limit после каждого быстрого
+ответа и умножается на backoff, когда ответ медленнее target_latency или
+ошибка говорит о перегрузке бэкенда (таймаут, 5xx, обрыв соединения, 429 -
+см. congested()). Ошибки, вернувшиеся сразу (разомкнутый предохранитель,
+4xx, неизвестная модель), лимит не трогают.
+
+Если начальный лимит ниже потолка, до первого снижения действует
+медленный старт: +1 за каждый быстрый ответ, то есть удвоение за
+«поколение» запросов. Если лимит упал до min_limit (обычно из-за короткого
+сбоя), медленный старт включается снова - до уровня, с которого начался
+спад; если перегрузка настоящая, лимит снова снизится за одно поколение. Запросы сверх
+лимита ждут в очереди не дольше queue_timeout; если очередь полна или срок
+вышел, пользователь сразу получает «занято».
+"""
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+from botcore.llm import LLMError
+
+logger = logging.getLogger(__name__)
+
+BUSY_TEXT = "⏳ Сейчас слишком много запросов, попробуйте ещё раз через минуту."
+
+
+class Overloaded(LLMError):
+    """Запрос не допущен к модели: лимит занят и очередь полна или ожидание истекло"""
+    def __init__(self, text: str = BUSY_TEXT):
+        super().__init__(text)
+
+
+def congested(error: BaseException) -> bool:
+    """Говорит ли ошибка о перегрузке бэкенда; флаг congested ставит сам бэкенд"""
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    return bool(getattr(error, "congested", False))
+
+
+class AdaptiveLimiter:
+    """Ограничитель параллельных запросов к бэкенду с лимитом по AIMD"""
+    def __init__(self, max_limit: int = 32, initial_limit: Optional[int] = None, min_limit: int = 1,
+                 target_latency: float = 30.0, max_queue: int = 100, queue_timeout: float = 15.0,
+                 backoff: float = 0.7, name: str = "model"):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        # По умолчанию старт с потолка: холодный всплеск не упирается в маленький лимит
+        if initial_limit is None:
+            initial_limit = max_limit
+        self.limit = float(min(max(initial_limit, min_limit), max_limit))
+        # Медленный старт, пока лимит ниже порога; первое снижение опускает порог до лимита
+        self._slow_start_until = float(max_limit)
+        # Уровень перед началом серии снижений: до него медленный старт возвращает с пола
+        self._decline_from: Optional[float] = None
+        self.target_latency = target_latency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.backoff = backoff
+        self.name = name
+        self.in_flight = 0
+        self.latency_ewma = 0.0
+        # served, failed, slow, shed, timed_out
+        self.counters: Counter = Counter()
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+        self._shedding = False
+
+    @asynccontextmanager
+    async def slot(self):
+        """Занимает место на время запроса к модели; бросает Overloaded"""
+        await self._acquire()
+        started = time.monotonic()
+        ok = False
+        overload = False
+        try:
+            yield
+            ok = True
+        except BaseException as e:
+            overload = congested(e)
+            raise
+        finally:
+            self._release(started, ok, overload)
+
+    def check(self):
+        """Быстрый отказ до подготовки запроса, если очередь уже полна"""
+        if not self._has_capacity() and len(self._waiters) >= self.max_queue:
+            self._shed()
+
+    def _shed(self):
+        self.counters["shed"] += 1
+        if not self._shedding:
+            # Пишем в лог начало перегрузки, а не каждый отказ
+            self._shedding = True
+            logger.warning(f"[{self.name}] Перегрузка: занято {self.in_flight}/{int(self.limit)}, "
+                           f"в очереди {len(self._waiters)}, новые запросы отклоняются")
+        raise Overloaded()
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    async def _acquire(self):
+        if self._has_capacity() and not self._waiters:
+            self.in_flight += 1
+            self._shedding = False
+            return
+        if len(self._waiters) >= self.max_queue:
+            self._shed()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # Место уже передано, но ждать его некому - отдаём следующему
+                self.in_flight -= 1
+                self._wake()
+            else:
+                waiter.cancel()
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+            if isinstance(e, asyncio.TimeoutError):
+                self.counters["timed_out"] += 1
+                raise Overloaded() from e
+            raise
+
+    def _wake(self):
+        # Место передаётся ожидающему сразу, новые запросы не обгоняют очередь
+        while self._waiters and self._has_capacity():
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def _release(self, started: float, ok: bool, overload: bool = False):
+        self.in_flight -= 1
+        now = time.monotonic()
+        latency = now - started
+        slow = latency > self.target_latency
+        if ok:
+            self.counters["served"] += 1
+            self.latency_ewma = latency if not self.latency_ewma else 0.9 * self.latency_ewma + 0.1 * latency
+        else:
+            self.counters["failed"] += 1
+        if ok and not slow:
+            # Медленный старт: +1 за ответ; дальше аддитивный рост, +1 за каждые limit ответов
+            step = 1 if self.limit < self._slow_start_until else 1 / self.limit
+            self.limit = min(self.max_limit, self.limit + step)
+            self._decline_from = None
+        elif (slow or overload) and started >= self._last_decrease:
+            # Уменьшаем не чаще одного раза на «поколение» запросов,
+            # начатых до прошлого уменьшения
+            if ok:
+                self.counters["slow"] += 1
+            if self._decline_from is None:
+                self._decline_from = self.limit
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+            self._last_decrease = now
+            if self.limit <= self.min_limit:
+                # С пола аддитивный рост занял бы сотни ответов - снова удваиваем до прежнего уровня
+                self._slow_start_until = self._decline_from
+            else:
+                self._slow_start_until = self.limit
+            logger.info(f"[{self.name}] Лимит параллельных запросов снижен до {int(self.limit)} "
+                        f"(задержка {latency:.1f} с, {'медленно' if ok else 'ошибка'})")
+        self._wake()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "latency_ewma": round(self.latency_ewma, 3),
+            **self.counters,
+        }
@@ -0,0 +1,67 @@
+"""Приём вложений: проверка типа, загрузка, декодирование текста и PDF."""
+import asyncio
+import base64
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Awaitable, Callable, Iterable
+
+# Типы вложений, которые различает конвейер
+IMAGE = "image"
+FILE = "file"
+
+
+@dataclass
+class Attachment:
+    """Вложение входящего сообщения; содержимое скачивается лениво через fetch()"""
+    filename: str
+    size: int
+    kind: str
+    fetch: Callable[[], Awaitable[bytes]]
+
+
+def truncate_text(text: str, max_length: int) -> str:
+    """Обрезает текст до max_length символов с пометкой для модели"""
+    if len(text) > max_length:
+        return text[:max_length] + f"... [текст обрезан, максимум {max_length} символов]"
+    return text
+
+
+def decode_text(data: bytes, encodings: Iterable[str] = ('utf-8',)) -> str:
+    """Декодирует текстовый файл, перебирая кодировки по порядку"""
+    for encoding in encodings:
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode('utf-8', errors='ignore')
+
+
+def extract_text_from_pdf(data: bytes, max_length: int) -> str:
+    """Извлекает текст из PDF, останавливаясь после max_length символов"""
+    # PyPDF2 загружается при первом PDF, а не при старте бота
+    from PyPDF2 import PdfReader
+    reader = PdfReader(BytesIO(data))
+    parts = []
+    total = 0
+    for page in reader.pages:
+        page_text = page.extract_text()
+        if page_text:
+            parts.append(page_text)
+            total += len(page_text) + 1
+            if total > max_length:
+                break
+    return "\n".join(parts)
+
+
+def encode_image(data: bytes) -> str:
+    return base64.b64encode(data).decode('utf-8')
+
+
+async def parse_document(filename: str, data: bytes, max_length: int,
+                         encodings: Iterable[str] = ('utf-8',)) -> str:
+    """Текст скачанного документа; PDF разбирается вне event loop"""
+    if filename.lower().endswith('.pdf'):
+        text = await asyncio.to_thread(extract_text_from_pdf, data, max_length)
+    else:
+        text = decode_text(data, encodings)
+    return truncate_text(text, max_length)
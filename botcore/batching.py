@@ -0,0 +1,72 @@
+"""Микро-пакеты: одиночные запросы, пришедшие почти одновременно, уходят одним вызовом.
+
+Первый запрос открывает окно в window секунд; всё, что пришло за это время
+(но не больше max_size), передаётся в run_batch одним списком, и каждый
+вызывающий получает свой элемент результата по индексу. Элемент-исключение
+достаётся только своему вызывающему; исключение из run_batch - всей пачке.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Generic, List, Optional, Set, Tuple, TypeVar, Union
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    """Собирает запросы в пачки по времени window и размеру max_size"""
+    def __init__(self, run_batch: Callable[[List[T]], Awaitable[List[Union[R, Exception]]]],
+                 window: float = 0.01, max_size: int = 16, name: str = "batch"):
+        self.run_batch = run_batch
+        self.window = window
+        self.max_size = max_size
+        self.name = name
+        self._pending: List[Tuple[T, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item: T) -> R:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[T, asyncio.Future]]):
+        # Отменённые до отправки запросы в пачку не попадают
+        batch = [(item, future) for item, future in batch if not future.done()]
+        if not batch:
+            return
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await self.run_batch([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+        logger.debug(f"[{self.name}] Пакет из {len(batch)} запросов")
@@ -0,0 +1,111 @@
+"""Запись обезличенной формы входящих запросов для воспроизведения нагрузки.
+
+Пишется только форма запроса: платформа, тип чата, адресовано ли
+сообщение боту, длина текста, вложения (вид, расширение, размер), время
+прихода, исход, длительность и расход токенов. Текст, имена и содержимое
+файлов не пишутся. id пользователя и чата заменяются HMAC с солью,
+случайной на процесс: внутри одной записи запросы пользователя связаны,
+между перезапусками - нет.
+
+Переменные окружения:
+- CAPTURE_FILE - файл JSON lines; без неё запись выключена;
+- CAPTURE_SAMPLE_RATE - доля пользователей, чьи запросы пишутся (1 по
+  умолчанию); выборка по пользователю, чтобы диалоги сохранялись целиком;
+- CAPTURE_MAX_BYTES, CAPTURE_BACKUPS - ротация файла (50 МБ, 5 копий).
+
+Воспроизведение записи: benchmarks/replay.py.
+"""
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import time
+from typing import Any, Dict, Optional
+
+from botcore.tracing import JsonlExporter
+
+logger = logging.getLogger(__name__)
+
+
+class Recorder:
+    """Обезличивание, выборка и выгрузка записей о запросах"""
+    def __init__(self, exporter: Optional[JsonlExporter] = None, sample_rate: float = 1.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.enabled = exporter is not None and sample_rate > 0
+        self.recorded = 0
+        self._salt = secrets.token_bytes(16)
+
+    @classmethod
+    def from_env(cls) -> "Recorder":
+        path = os.getenv("CAPTURE_FILE")
+        if not path:
+            return cls()
+        sample_rate = float(os.getenv("CAPTURE_SAMPLE_RATE", "1") or 1)
+        exporter = JsonlExporter(path, int(os.getenv("CAPTURE_MAX_BYTES", str(50 * 2**20))),
+                                 int(os.getenv("CAPTURE_BACKUPS", "5")))
+        logger.info(f"Запись формы запросов включена: выборка {sample_rate} -> {path}")
+        return cls(exporter, sample_rate)
+
+    def anonymize(self, platform: str, value: Any) -> str:
+        digest = hmac.new(self._salt, f"{platform}:{value}".encode(), hashlib.blake2b)
+        return digest.hexdigest()[:16]
+
+    def record(self, bot: str, request: Any, outcome: str, seconds: float):
+        """Запись об обработанном запросе; request - botcore.pipeline.Request"""
+        user = self.anonymize(request.platform, request.user_id)
+        # Выборка по пользователю: первые 8 hex-цифр хеша как число в [0, 1)
+        if self.sample_rate < 1 and int(user[:8], 16) / 2**32 >= self.sample_rate:
+            return
+        completion = request.completion
+        record: Dict[str, Any] = {
+            "ts": round(time.time() - seconds, 3),
+            "bot": bot,
+            "platform": request.platform,
+            "user": user,
+            "chat": self.anonymize(request.platform, request.chat_id),
+            "group": request.is_group,
+            "addressed": request.addressed,
+            "text_len": len(request.text),
+            "attachments": [{"kind": a.kind, "ext": os.path.splitext(a.filename)[1].lower()[:10], "size": a.size}
+                            for a in request.attachments],
+            "outcome": outcome,
+            "ms": round(seconds * 1000, 1),
+        }
+        if completion is not None:
+            record["prompt_tokens"] = completion.prompt_tokens
+            record["completion_tokens"] = completion.completion_tokens
+            record["answer_len"] = len(completion.text)
+        self.recorded += 1
+        try:
+            self.exporter.write([record])
+        except Exception as e:
+            logger.error(f"Ошибка записи формы запроса: {e}")
+
+    def close(self):
+        if self.exporter is not None:
+            self.exporter.close()
+
+
+_recorder: Optional[Recorder] = None
+
+
+def recorder() -> Recorder:
+    """Запись процесса; настройки читаются из окружения при первом обращении"""
+    global _recorder
+    if _recorder is None:
+        _recorder = Recorder.from_env()
+    return _recorder
+
+
+def record(bot: str, request: Any, outcome: str, seconds: float = 0.0):
+    """Записывает форму запроса, если запись включена"""
+    r = recorder()
+    if r.enabled:
+        r.record(bot, request, outcome, seconds)
+
+
+def close():
+    if _recorder is not None:
+        _recorder.close()
@@ -0,0 +1,84 @@
+"""Конфигурация бота для общего конвейера."""
+import os
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
+
+SUPPORTED_TEXT_EXTENSIONS: Tuple[str, ...] = (
+    '.txt', '.md', '.py', '.csv', '.json', '.xml', '.yaml', '.yml',
+    '.toml', '.log', '.tsv', '.sql', '.html', '.js', '.css', '.env', '.ts', '.svelte'
+)
+
+
+def _from_env(name: str, default: str, kind=int):
+    """Значение по умолчанию из переменной окружения; читается при создании BotConfig"""
+    return field(default_factory=lambda: kind(os.getenv(name) or default))
+
+
+@dataclass
+class BotConfig:
+    """Настройки одного бота: модель, лимиты и поведение конвейера"""
+    name: str
+    model: str
+    system_prompt: str
+    # Количество сообщений, которые бот помнит для каждого пользователя (0 - без памяти)
+    memory_size: int = 10
+    # История обрезается блоками: растёт до memory_size + шаг, затем сжимается до
+    # memory_size, сохраняя префикс для кэша промптов. None - половина memory_size, 0 - по одной
+    history_trim_step: Optional[int] = None
+    max_file_size_mb: int = 25
+    max_text_length: int = 75_000
+    text_extensions: Tuple[str, ...] = SUPPORTED_TEXT_EXTENSIONS
+    accept_pdf: bool = True
+    accept_images: bool = True
+    # Кодировки текстовых файлов по порядку; в конце всегда utf-8 с errors='ignore'
+    text_encodings: Tuple[str, ...] = ('utf-8',)
+    # Лимит длины одного сообщения платформы
+    message_limit: int = 4000
+    # Telegram MarkdownV2 (только для Telegram)
+    markdown: bool = False
+    # Длинный ответ отправляется по частям через кнопку «Продолжить»
+    continuation: bool = True
+    # В группах и на серверах отвечать только на упоминание или ответ боту
+    require_mention: bool = True
+    # Что записать в память, если пользователь прислал только медиа
+    media_placeholder: str = "[Пользователь отправил медиа-контент]"
+    # Контроль допуска к модели (botcore.admission): потолок параллельных запросов,
+    # задержка, выше которой лимит снижается, и очередь ожидания
+    max_concurrency: int = 32
+    # Начальный лимит; None - сразу max_concurrency, меньше - медленный старт до первого медленного ответа
+    initial_concurrency: Optional[int] = None
+    target_latency: float = 30.0
+    max_queue: int = 100
+    queue_timeout: float = 15.0
+    # Таймаут одного запроса к модели, с (LMStudioClient); зависший сервер считается упавшим
+    model_timeout: float = 120.0
+    # Квоты токенов модели за скользящее окно quota_window секунд (botcore.quota):
+    # на пользователя, на групповой чат и на сервер Discord; 0 - без квоты.
+    # По умолчанию берутся из QUOTA_USER_TOKENS, QUOTA_CHAT_TOKENS, QUOTA_GUILD_TOKENS и QUOTA_WINDOW
+    quota_user_tokens: int = _from_env("QUOTA_USER_TOKENS", "0")
+    quota_chat_tokens: int = _from_env("QUOTA_CHAT_TOKENS", "0")
+    quota_guild_tokens: int = _from_env("QUOTA_GUILD_TOKENS", "0")
+    quota_window: float = _from_env("QUOTA_WINDOW", "3600", float)
+
+    def __post_init__(self):
+        quotas = (self.quota_user_tokens, self.quota_chat_tokens, self.quota_guild_tokens)
+        if any(limit > 0 for limit in quotas) and self.quota_window <= 0:
+            raise ValueError(f"[{self.name}] quota_window должно быть больше нуля, задано {self.quota_window:g} "
+                             f"(QUOTA_WINDOW)")
+
+    @property
+    def trim_step(self) -> int:
+        if self.history_trim_step is None:
+            return self.memory_size // 2
+        return self.history_trim_step
+
+    @property
+    def memory_limit(self) -> int:
+        """Сколько сообщений история может занять перед сжатием до memory_size"""
+        if self.memory_size <= 0:
+            return 0
+        return self.memory_size + self.trim_step
+
+    @property
+    def max_file_size_bytes(self) -> int:
+        return self.max_file_size_mb * 1024 * 1024
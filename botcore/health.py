@@ -0,0 +1,170 @@
+"""Проверка доступности бэкенда и предохранитель (circuit breaker).
+
+HealthProber в фоне раз в interval секунд делает дешёвый GET (для LM Studio -
+/v1/models) и хранит последнее состояние; команды /status читают его без
+генерации. CircuitBreaker после нескольких ошибок подряд «размыкается» и
+сразу отказывает запросам, а через reset_timeout пропускает один пробный.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Deque, List, Optional
+
+import aiohttp
+
+from botcore import shared
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+STATE_NAMES = {
+    CLOSED: "замкнут (запросы идут)",
+    OPEN: "разомкнут (запросы отклоняются)",
+    HALF_OPEN: "полуоткрыт (пробный запрос)",
+}
+
+
+class CircuitBreaker:
+    """Предохранитель: failure_threshold ошибок подряд - отказ на reset_timeout секунд"""
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 15.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+
+    def available(self) -> bool:
+        """Как allow(), но без занятия пробного запроса: для выбора сервера"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            return time.monotonic() - self.opened_at >= self.reset_timeout
+        return not self._trial_in_flight
+
+    def allow(self) -> bool:
+        """Можно ли отправить запрос сейчас"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = HALF_OPEN
+            self._trial_in_flight = False
+        # Полуоткрыт: пропускаем один пробный запрос
+        if self._trial_in_flight:
+            return False
+        self._trial_in_flight = True
+        return True
+
+    def record_success(self):
+        if self.state != CLOSED:
+            logger.info("Бэкенд снова отвечает, предохранитель замкнут")
+        self.state = CLOSED
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                logger.warning(f"Предохранитель разомкнут на {self.reset_timeout} с после {self.failures} ошибок")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """Пробный запрос прерван без результата: следующий может попробовать снова"""
+        self._trial_in_flight = False
+
+    def probe_succeeded(self):
+        """Проверка здоровья прошла: не ждём конца reset_timeout, пускаем пробный запрос"""
+        if self.state == OPEN:
+            self.state = HALF_OPEN
+            self._trial_in_flight = False
+
+    def probe_failed(self):
+        """Проверка здоровья не прошла: считается как ошибка запроса, с тем же порогом.
+
+        Сразу размыкает только полуоткрытый предохранитель; разомкнутый
+        остаётся разомкнутым ещё reset_timeout секунд.
+        """
+        self.failures += 1
+        if self.state == OPEN:
+            self.opened_at = time.monotonic()
+        elif self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            logger.warning(f"Проверка здоровья не прошла, предохранитель разомкнут на {self.reset_timeout} с "
+                           f"после {self.failures} ошибок")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+
+class HealthProber:
+    """Фоновая проверка GET url с кэшированием результата и статистикой задержек"""
+    def __init__(self, url: str, breaker: Optional[CircuitBreaker] = None,
+                 interval: float = 30.0, timeout: float = 5.0, window: int = 20):
+        self.url = url
+        self.breaker = breaker
+        self.interval = interval
+        self.timeout = timeout
+        self.healthy: Optional[bool] = None
+        self.last_error: Optional[str] = None
+        self.checked_at: Optional[float] = None
+        self.models: List[str] = []
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Запускает фоновую проверку; безопасно вызывать повторно"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            await self.probe()
+            await asyncio.sleep(self.interval)
+
+    async def probe(self) -> bool:
+        """Одна проверка; результат сохраняется и передаётся предохранителю"""
+        started = time.monotonic()
+        try:
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+            async with shared.http_session().get(self.url, timeout=timeout) as response:
+                if response.status != 200:
+                    raise RuntimeError(f"HTTP {response.status}")
+                data = await response.json(content_type=None)
+            self.models = [m.get("id", "") for m in (data or {}).get("data", [])]
+            self.latencies.append(time.monotonic() - started)
+            if self.healthy is False:
+                logger.info(f"{self.url} снова доступен")
+            self.healthy = True
+            self.last_error = None
+            if self.breaker:
+                self.breaker.probe_succeeded()
+        except Exception as e:
+            if self.healthy is not False:
+                logger.warning(f"{self.url} недоступен: {e}")
+            self.healthy = False
+            self.models = []
+            self.last_error = str(e) or type(e).__name__
+            if self.breaker:
+                self.breaker.probe_failed()
+        self.checked_at = time.time()
+        return self.healthy
+
+    def latency_stats(self):
+        """(последняя, средняя, максимальная) задержка проверки в секундах"""
+        if not self.latencies:
+            return None
+        values = list(self.latencies)
+        return values[-1], sum(values) / len(values), max(values)
@@ -0,0 +1,71 @@
+"""Общие типы бэкендов моделей."""
+import re
+from typing import Any, Dict, List, NamedTuple, Optional
+
+# Блоки рассуждений reasoning-моделей (qwen3 и др.)
+THINK_RE = re.compile(r'<think>.*?</think>', flags=re.DOTALL)
+
+
+class LLMError(Exception):
+    """Ошибка обращения к модели; текст сообщения можно показать пользователю"""
+    # Ошибка говорит о перегрузке бэкенда, ограничитель допуска снижает лимит (botcore.admission)
+    congested = False
+
+
+class ModelNotFoundError(LLMError):
+    def __init__(self, model: str):
+        super().__init__(f"Ошибка: Модель '{model}' не найдена. Проверьте название модели.")
+        self.model = model
+
+
+def strip_think(text: str) -> str:
+    """Удаляет <think>...</think> блоки из текста"""
+    if '<think>' not in text:
+        return text.strip()
+    return THINK_RE.sub('', text).strip()
+
+
+class Completion(NamedTuple):
+    """Ответ модели и расход токенов (0, если бэкенд их не сообщил)"""
+    text: str
+    model: str = ""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    # Часть prompt_tokens, взятая из кэша префикса у провайдера
+    cached_tokens: int = 0
+
+
+def usage_counts(usage: Any) -> Dict[str, int]:
+    """prompt/completion/cached токены из usage ответа (объект SDK или dict из JSON)"""
+    def field(obj: Any, name: str) -> Any:
+        return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+    if usage is None:
+        return {}
+    return {
+        "prompt_tokens": field(usage, "prompt_tokens") or 0,
+        "completion_tokens": field(usage, "completion_tokens") or 0,
+        "cached_tokens": field(field(usage, "prompt_tokens_details"), "cached_tokens") or 0,
+    }
+
+
+class LLMBackend:
+    """Бэкенд модели: принимает сообщения в формате chat completions, возвращает ответ"""
+    model: str
+
+    async def generate(self, messages: List[Dict], session_key: Optional[str] = None) -> Completion:
+        """session_key - ключ диалога (пользователя), бэкенд может по нему выбирать сервер"""
+        raise NotImplementedError
+
+    async def complete(self, messages: List[Dict], session_key: Optional[str] = None) -> str:
+        """Только текст ответа"""
+        return (await self.generate(messages, session_key=session_key)).text
+
+    def select(self, request: Any) -> "LLMBackend":
+        """Бэкенд для конкретного запроса; маршрутизатор моделей переопределяет"""
+        return self
+
+    @property
+    def admission_key(self) -> str:
+        """Ключ ограничителя запросов: боты с одним ключом делят лимит (botcore.shared.limiter)"""
+        return f"{type(self).__name__}:{id(self):x}"
@@ -0,0 +1,242 @@
+"""Клиент локальной модели LM Studio (OpenAI-совместимый API).
+
+Клиент может работать с пулом серверов: у каждого свой предохранитель,
+фоновая проверка и средняя задержка. Запрос уходит на сервер с наименьшей
+оценкой (запросы в работе + 1) * задержка; при sticky=True запросы одного
+пользователя по возможности идут на один сервер, чтобы тот переиспользовал
+KV-кэш префикса диалога.
+"""
+import asyncio
+import logging
+import time
+import zlib
+from typing import Dict, List, Optional, Sequence, Union
+
+import aiohttp
+
+from botcore import shared
+from botcore.health import STATE_NAMES, CircuitBreaker, HealthProber
+from botcore.llm import Completion, LLMBackend, LLMError, strip_think, usage_counts
+
+logger = logging.getLogger(__name__)
+
+UNAVAILABLE_TEXT = "Не удалось подключиться к ИИ модели. Проверьте, что LM Studio запущен."
+API_ERROR_TEXT = "Извините, произошла ошибка при обращении к ИИ модели."
+TIMEOUT_TEXT = "ИИ модель не ответила вовремя. Попробуйте ещё раз."
+
+# Таймаут одного запроса генерации, с; зависший сервер не держит место в ограничителе дольше
+DEFAULT_TIMEOUT = 120.0
+CONNECT_TIMEOUT = 10.0
+
+# Насколько «свой» сервер пользователя может быть загружен сильнее самого
+# свободного, прежде чем запрос уйдёт на другой
+STICKY_SLACK = 2
+
+
+def models_url(base_url: str) -> str:
+    """Адрес /v1/models по адресу chat/completions"""
+    root = base_url.rstrip('/')
+    if root.endswith("/chat/completions"):
+        root = root[:-len("/chat/completions")]
+    return root + "/models"
+
+
+class EndpointDown(LLMError):
+    """Сервер недоступен, не ответил за таймаут или ответил 5xx; запрос можно повторить на другом"""
+    congested = True
+
+
+class Endpoint:
+    """Один сервер пула: адрес, предохранитель, проверка здоровья и нагрузка"""
+    def __init__(self, url: str, probe_interval: float = 30.0):
+        self.url = url
+        # Пока сервер лежит, запросы к нему отклоняются сразу, а не ждут таймаута
+        self.breaker = CircuitBreaker()
+        self.health = HealthProber(models_url(url), self.breaker, interval=probe_interval)
+        self.in_flight = 0
+        self.latency_ewma = 0.0
+        self.served = 0
+        self.failed = 0
+
+    def score(self) -> float:
+        # Пока задержка неизвестна, считаем её секундой
+        return (self.in_flight + 1) * (self.latency_ewma or 1.0)
+
+    def observe(self, latency: float):
+        self.served += 1
+        ewma = self.latency_ewma
+        self.latency_ewma = latency if not ewma else 0.9 * ewma + 0.1 * latency
+
+
+class LMStudioClient(LLMBackend):
+    """Клиент для работы с LM Studio API (один сервер или пул)"""
+    def __init__(self, base_url: Union[str, Sequence[str]], model_name: str,
+                 max_tokens: int = 1000, temperature: float = 0.7,
+                 probe_interval: float = 30.0, sticky: bool = False, timeout: float = DEFAULT_TIMEOUT):
+        urls = [base_url] if isinstance(base_url, str) else list(base_url)
+        if not urls:
+            raise ValueError("Нужен хотя бы один адрес LM Studio")
+        self.endpoints = [Endpoint(url, probe_interval) for url in urls]
+        self.base_url = urls[0]
+        self.model_name = model_name
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.sticky = sticky
+        self.timeout = aiohttp.ClientTimeout(total=timeout, sock_connect=min(CONNECT_TIMEOUT, timeout))
+
+    @property
+    def model(self) -> str:
+        return self.model_name
+
+    @property
+    def admission_key(self) -> str:
+        # Боты на тех же серверах LM Studio делят один лимит
+        return "lmstudio:" + ",".join(sorted(e.url for e in self.endpoints))
+
+    def start_probes(self):
+        """Запускает фоновую проверку всех серверов; безопасно вызывать повторно"""
+        for endpoint in self.endpoints:
+            endpoint.health.start()
+
+    async def stop_probes(self):
+        await asyncio.gather(*(endpoint.health.stop() for endpoint in self.endpoints))
+
+    def _pick(self, session_key: Optional[str], exclude: List[Endpoint]) -> Optional[Endpoint]:
+        """Выбор сервера: «свой» для session_key, если он не перегружен, иначе самый свободный"""
+        candidates = [e for e in self.endpoints if e not in exclude and e.breaker.available()]
+        if not candidates:
+            return None
+        best = min(candidates, key=Endpoint.score)
+        if self.sticky and session_key is not None and len(candidates) > 1:
+            # Rendezvous-хеширование: при выпадении сервера переезжают только его пользователи
+            key = session_key.encode()
+            own = max(candidates, key=lambda e: zlib.crc32(key + e.url.encode()))
+            if own.in_flight <= best.in_flight + STICKY_SLACK:
+                best = own
+        return best
+
+    async def complete(self, messages: List[Dict], session_key: Optional[str] = None, *,
+                       max_tokens: Optional[int] = None, temperature: Optional[float] = None) -> str:
+        """Генерация ответа; при ошибке бросает LLMError с текстом для пользователя"""
+        return (await self.generate(messages, session_key, max_tokens=max_tokens, temperature=temperature)).text
+
+    async def generate(self, messages: List[Dict], session_key: Optional[str] = None, *,
+                       max_tokens: Optional[int] = None, temperature: Optional[float] = None) -> Completion:
+        """Ответ с расходом токенов, если LM Studio его сообщил"""
+        # <think> блоки из истории модели не нужны
+        processed_messages = [
+            {"role": msg["role"], "content": strip_think(msg["content"]) if isinstance(msg["content"], str) else msg["content"]}
+            for msg in messages
+        ]
+        payload = {
+            "model": self.model_name,
+            "messages": processed_messages,
+            "max_tokens": max_tokens or self.max_tokens,
+            "temperature": self.temperature if temperature is None else temperature,
+            "stream": False
+        }
+        self.start_probes()
+        tried: List[Endpoint] = []
+        last_error: Optional[EndpointDown] = None
+        # Упавший сервер не ошибка для пользователя, пока в пуле есть живые
+        while True:
+            endpoint = self._pick(session_key, tried)
+            if endpoint is None:
+                # Все серверы отказали сразу (предохранители) - это не признак перегрузки
+                raise last_error or LLMError(UNAVAILABLE_TEXT)
+            tried.append(endpoint)
+            if not endpoint.breaker.allow():
+                # Пробный запрос к этому серверу уже идёт - берём следующий из пула
+                continue
+            try:
+                return await self._post(endpoint, payload)
+            except EndpointDown as e:
+                last_error = e
+
+    async def _post(self, endpoint: Endpoint, payload: Dict) -> Completion:
+        """Один запрос к серверу; ошибки сервера учитываются его предохранителем"""
+        started = time.monotonic()
+        endpoint.in_flight += 1
+        try:
+            # Общая на процесс сессия: соединения с сервером переиспользуются
+            async with shared.http_session().post(endpoint.url, json=payload, timeout=self.timeout) as response:
+                if response.status != 200:
+                    logger.error(f"LM Studio API error: {response.status} ({endpoint.url})")
+                    if response.status < 500:
+                        # Сервер жив, запрос отклонён - повтор на другом не поможет
+                        endpoint.breaker.record_success()
+                        raise LLMError(API_ERROR_TEXT)
+                    endpoint.failed += 1
+                    endpoint.breaker.record_failure()
+                    raise EndpointDown(API_ERROR_TEXT)
+                data = await response.json()
+        except aiohttp.ClientError as e:
+            logger.error(f"Ошибка соединения с LM Studio ({endpoint.url}): {e}")
+            endpoint.failed += 1
+            endpoint.breaker.record_failure()
+            raise EndpointDown(UNAVAILABLE_TEXT) from e
+        except asyncio.TimeoutError as e:
+            # Зависший сервер - такой же отказ, как упавший: считается предохранителем
+            logger.error(f"LM Studio не ответил за {self.timeout.total:g} с ({endpoint.url})")
+            endpoint.failed += 1
+            endpoint.breaker.record_failure()
+            raise EndpointDown(TIMEOUT_TEXT) from e
+        except LLMError:
+            raise
+        except BaseException:
+            # Отмена или неожиданная ошибка: пробный запрос не должен «зависнуть»
+            endpoint.breaker.release()
+            raise
+        finally:
+            endpoint.in_flight -= 1
+        endpoint.breaker.record_success()
+        endpoint.observe(time.monotonic() - started)
+        return Completion(strip_think(data["choices"][0]["message"]["content"]), self.model_name,
+                          **usage_counts(data.get("usage")))
+
+    async def status(self) -> List[Dict]:
+        """Кэшированное состояние серверов без генерации; первая проверка - сразу"""
+        self.start_probes()
+        unchecked = [e.health.probe() for e in self.endpoints if e.health.checked_at is None]
+        if unchecked:
+            await asyncio.gather(*unchecked)
+        result = []
+        for endpoint in self.endpoints:
+            health = endpoint.health
+            probe = health.latency_stats()
+            result.append({
+                "url": endpoint.url,
+                "healthy": bool(health.healthy),
+                "error": health.last_error,
+                "checked_ago": time.time() - health.checked_at,
+                "model_loaded": self.model_name in health.models,
+                "breaker": STATE_NAMES[endpoint.breaker.state],
+                "probe_ms": tuple(round(v * 1000) for v in probe) if probe else None,
+                "request_s": round(endpoint.latency_ewma, 2),
+                "in_flight": endpoint.in_flight,
+                "served": endpoint.served,
+                "failed": endpoint.failed,
+            })
+        return result
+
+
+def status_lines(statuses: List[Dict]) -> List[str]:
+    """Строки для команды /status по результату LMStudioClient.status()"""
+    lines = []
+    for status in statuses:
+        prefix = f"{status['url']}: " if len(statuses) > 1 else ""
+        if status["healthy"]:
+            lines.append(f"✅ {prefix}LM Studio доступен")
+        else:
+            lines.append(f"❌ {prefix}LM Studio недоступен: {status['error']}")
+        lines.append(f"Модель загружена: {'да' if status['model_loaded'] else 'нет'}")
+        lines.append(f"Проверка: {status['checked_ago']:.0f} с назад")
+        if status["probe_ms"]:
+            last, avg, worst = status["probe_ms"]
+            lines.append(f"Отклик /v1/models: {last} мс (среднее {avg}, макс. {worst})")
+        if status["request_s"]:
+            lines.append(f"Средняя генерация: {status['request_s']} с")
+        if len(statuses) > 1:
+            lines.append(f"В работе: {status['in_flight']}, ответов: {status['served']}, ошибок: {status['failed']}")
+        lines.append(f"Предохранитель: {status['breaker']}")
+    return lines
@@ -0,0 +1,185 @@
+"""Неблокирующее логирование для всех ботов процесса.
+
+setup() вешает на корневой логгер QueueHandler: вызывающий код только
+кладёт запись в очередь, а форматирование и запись в stderr делает
+QueueListener в своём потоке. При переполнении очереди записи
+отбрасываются, а не задерживают event loop.
+
+До постановки в очередь сообщение обрезается до LOG_MAX_CHARS, строковые
+поля - тоже: в лог не попадает целиком промпт с текстом файла на 75к
+символов. Поля передаются через extra=fields(...): в текстовом формате
+они дописываются как key=value, в JSON - отдельными ключами.
+
+Массовые события (каждый запрос, каждый ответ) помечаются
+fields(sampled=True, ...) и проходят выборку по уровню из LOG_SAMPLE,
+например «INFO=0.1,DEBUG=0.01». Остальные записи пишутся всегда.
+
+Переменные окружения:
+- LOG_LEVEL - уровень корневого логгера (INFO);
+- LOG_FORMAT - text или json (text);
+- LOG_MAX_CHARS - предел длины сообщения и строкового поля (2000);
+- LOG_SAMPLE - доли для помеченных записей по уровням;
+- LOG_QUEUE_SIZE - размер очереди (10000).
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from typing import Any, Dict, Optional
+
+from botcore import metrics
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s (%(filename)s:%(lineno)d)"
+DEFAULT_MAX_CHARS = 2000
+DEFAULT_QUEUE_SIZE = 10000
+
+
+def fields(sampled: bool = False, **values: Any) -> Dict[str, Any]:
+    """extra для записи лога: структурные поля и признак массового события"""
+    return {"fields": values, "sampled": sampled}
+
+
+def truncate(value: str, limit: int) -> str:
+    if len(value) <= limit:
+        return value
+    return f"{value[:limit]}... [+{len(value) - limit} символов]"
+
+
+def parse_sample(text: str) -> Dict[int, float]:
+    """«INFO=0.1,DEBUG=0.01» -> {уровень: доля}"""
+    rates = {}
+    for item in text.split(","):
+        name, _, rate = item.partition("=")
+        level = logging.getLevelName(name.strip().upper())
+        if isinstance(level, int) and rate.strip():
+            rates[level] = float(rate)
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Выборка помеченных записей по уровню; счётчик отброшенных"""
+    def __init__(self, rates: Dict[int, float]):
+        super().__init__()
+        self.rates = rates
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "sampled", False):
+            return True
+        rate = self.rates.get(record.levelno, 1.0)
+        if rate >= 1 or random.random() < rate:
+            return True
+        self.dropped += 1
+        return False
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler с обрезкой больших сообщений и без ожидания при полной очереди"""
+    def __init__(self, log_queue: queue.Queue, max_chars: int):
+        super().__init__(log_queue)
+        self.max_chars = max_chars
+        self.dropped = 0
+        self._exc_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Сообщение собирается здесь: аргументы могут измениться, пока запись в очереди
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = truncate(record.getMessage(), self.max_chars)
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        values = getattr(record, "fields", None)
+        if values:
+            record.fields = {k: truncate(v, self.max_chars) if isinstance(v, str) else v
+                             for k, v in values.items()}
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class TextFormatter(logging.Formatter):
+    """Привычный формат скриптов плюс поля key=value"""
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        values = getattr(record, "fields", None)
+        if values:
+            text += " | " + " ".join(f"{k}={v}" for k, v in values.items())
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON"""
+    def format(self, record: logging.LogRecord) -> str:
+        data: Dict[str, Any] = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "src": f"{record.filename}:{record.lineno}",
+        }
+        values = getattr(record, "fields", None)
+        if values:
+            data.update(values)
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional[BoundedQueueHandler] = None
+_sampling: Optional[SamplingFilter] = None
+
+
+def setup(level: Optional[str] = None):
+    """Настраивает корневой логгер; повторные вызовы ничего не делают"""
+    global _listener, _handler, _sampling
+    if _listener is not None:
+        return
+    max_chars = int(os.getenv("LOG_MAX_CHARS", str(DEFAULT_MAX_CHARS)))
+    log_queue: queue.Queue = queue.Queue(int(os.getenv("LOG_QUEUE_SIZE", str(DEFAULT_QUEUE_SIZE))))
+    _handler = BoundedQueueHandler(log_queue, max_chars)
+    _sampling = SamplingFilter(parse_sample(os.getenv("LOG_SAMPLE", "")))
+    _handler.addFilter(_sampling)
+
+    output = logging.StreamHandler(sys.stderr)
+    if os.getenv("LOG_FORMAT", "text").lower() == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(TextFormatter(TEXT_FORMAT))
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+    atexit.register(close)
+    metrics.REGISTRY.add_collector(_collect_metrics)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_handler)
+    root.setLevel((level or os.getenv("LOG_LEVEL", "INFO")).upper())
+
+
+def _collect_metrics():
+    metrics.LOG_DROPPED.set("sampled", value=_sampling.dropped if _sampling else 0)
+    metrics.LOG_DROPPED.set("overflow", value=_handler.dropped if _handler else 0)
+
+
+def close():
+    """Дописывает очередь; дальше корневой логгер пишет в stderr напрямую"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    root = logging.getLogger()
+    root.removeHandler(_handler)
+    for output in _listener.handlers:
+        root.addHandler(output)
+    _listener = None
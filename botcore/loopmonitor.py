@@ -0,0 +1,144 @@
+"""Контроль задержки event loop и поиск блокирующих вызовов.
+
+Пульс - задача, которая каждые ``interval`` секунд засыпает и смотрит,
+насколько позже срока проснулась: это задержка loop (lag). Значения идут
+в гистограмму bot_loop_lag_seconds и в скользящее окно, по которому
+collector выставляет p50/p95/p99/max в bot_loop_lag_window_seconds.
+
+Сторожевой поток следит за пульсом: если loop не проснулся дольше порога,
+он снимает стек потока loop прямо во время блокировки. Когда loop оживает,
+в лог уходит предупреждение с длительностью и этим стеком - видно, какой
+синхронный вызов (PDF, SDK без await, тяжёлый цикл) держал loop.
+
+Переменные окружения:
+- LOOP_LAG_INTERVAL - период пульса, с (0.5 по умолчанию, 0 - выключить);
+- LOOP_SLOW_SECONDS - порог блокировки для стека и счётчика (0.1);
+- LOOP_DEBUG=1 - ещё и режим отладки asyncio со slow_callback_duration,
+  равным порогу (дорого, только для разбора).
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import List, Optional
+
+from botcore import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 0.5
+DEFAULT_THRESHOLD = 0.1
+# 10 минут пульса при интервале 0.5 с
+WINDOW = 1200
+STACK_LIMIT = 20
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+class LoopMonitor:
+    """Пульс на event loop и сторожевой поток со снятием стека"""
+    def __init__(self, interval: float = DEFAULT_INTERVAL, threshold: float = DEFAULT_THRESHOLD,
+                 debug: bool = False):
+        self.interval = interval
+        self.threshold = threshold
+        self.debug = debug
+        self.lags: deque = deque(maxlen=WINDOW)
+        self.stalls = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread = 0
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        # Когда пульс должен проснуться (time.monotonic) и стек, снятый сторожем для этого срока
+        self._due = 0.0
+        self._stack: Optional[List[str]] = None
+        metrics.REGISTRY.add_collector(self._collect_metrics)
+
+    @classmethod
+    def from_env(cls) -> Optional["LoopMonitor"]:
+        interval = float(os.getenv("LOOP_LAG_INTERVAL", str(DEFAULT_INTERVAL)) or 0)
+        if interval <= 0:
+            return None
+        return cls(interval, float(os.getenv("LOOP_SLOW_SECONDS", str(DEFAULT_THRESHOLD)) or DEFAULT_THRESHOLD),
+                   os.getenv("LOOP_DEBUG") == "1")
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        if self.debug:
+            # asyncio сам пишет в лог «Executing <Handle ...> took N seconds»
+            self._loop.set_debug(True)
+            self._loop.slow_callback_duration = self.threshold
+            logging.getLogger("asyncio").setLevel(logging.WARNING)
+        self._due = time.monotonic() + self.interval
+        self._task = asyncio.create_task(self._heartbeat(), name="loop-monitor")
+        self._thread = threading.Thread(target=self._watch, name="botcore-loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"Контроль задержки loop: пульс {self.interval:g} с, порог блокировки {self.threshold:g} с")
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._thread is not None:
+            self._thread.join()
+
+    async def _heartbeat(self):
+        while True:
+            self._stack = None
+            self._due = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - self._due)
+            self.lags.append(lag)
+            metrics.LOOP_LAG.observe(value=lag)
+            if lag >= self.threshold:
+                self.stalls += 1
+                metrics.LOOP_STALLS.inc()
+                stack = self._stack
+                if stack:
+                    logger.warning(f"Event loop заблокирован на {lag * 1000:.0f} мс, стек во время блокировки:\n"
+                                   + "".join(stack))
+                else:
+                    logger.warning(f"Event loop заблокирован на {lag * 1000:.0f} мс")
+
+    def _watch(self):
+        # Проверка в несколько раз чаще порога, чтобы застать блокировку
+        while not self._stop.wait(self.threshold / 4):
+            due = self._due
+            if self._stack is None and time.monotonic() - due >= self.threshold:
+                frame = sys._current_frames().get(self._loop_thread)
+                if frame is not None and self._due == due:
+                    self._stack = traceback.format_stack(frame, limit=STACK_LIMIT)
+
+    def _collect_metrics(self):
+        lags = list(self.lags)
+        for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99), ("max", 1.0)):
+            metrics.LOOP_LAG_WINDOW.set(name, value=percentile(lags, q))
+
+
+_monitor: Optional[LoopMonitor] = None
+
+
+async def start() -> Optional[LoopMonitor]:
+    """Запускает контроль на текущем loop, если он не выключен в окружении"""
+    global _monitor
+    if _monitor is None:
+        _monitor = LoopMonitor.from_env()
+        if _monitor is not None:
+            _monitor.start()
+    return _monitor
+
+
+async def stop():
+    global _monitor
+    if _monitor is not None:
+        await _monitor.stop()
+        _monitor = None
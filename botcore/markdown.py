@@ -0,0 +1,63 @@
+"""Экранирование текста для Telegram MarkdownV2.
+
+Замены заранее собраны в кортежи пар и применяются цепочкой ``str.replace``:
+на ответах с кириллицей это быстрее, чем ``re.sub`` с колбэком или
+``str.translate`` (у последнего нет быстрого пути для не-ASCII строк).
+Сравнение - в ``benchmarks/bench_markdown.py``.
+"""
+from typing import List, Optional, Tuple
+
+# Символы, которые нужно экранировать в обычном тексте MarkdownV2
+MDV2_SPECIAL_CHARS = '_*[]()~`>#+-=|{}.!'
+
+_TEXT_REPLACEMENTS: Tuple[Tuple[str, str], ...] = tuple((ch, '\\' + ch) for ch in MDV2_SPECIAL_CHARS)
+# Внутри (...) ссылки экранируются только '\' и ')'; '\' обязательно первым
+_URL_REPLACEMENTS: Tuple[Tuple[str, str], ...] = (('\\', '\\\\'), (')', '\\)'))
+# Внутри `code` и ```pre``` экранируются только '\' и '`'
+_CODE_REPLACEMENTS: Tuple[Tuple[str, str], ...] = (('\\', '\\\\'), ('`', '\\`'))
+
+
+def _apply(text: Optional[str], replacements: Tuple[Tuple[str, str], ...]) -> str:
+    text = text or ""
+    for old, new in replacements:
+        text = text.replace(old, new)
+    return text
+
+
+def escape_markdown_v2(text: Optional[str]) -> str:
+    """Экранирует обычный текст для MarkdownV2"""
+    return _apply(text, _TEXT_REPLACEMENTS)
+
+
+def escape_markdown_v2_url(url: Optional[str]) -> str:
+    """Экранирует URL для части (...) инлайн-ссылки"""
+    return _apply(url, _URL_REPLACEMENTS)
+
+
+def escape_markdown_v2_code(text: Optional[str]) -> str:
+    """Экранирует содержимое `code` и ```pre``` блоков"""
+    return _apply(text, _CODE_REPLACEMENTS)
+
+
+def markdown_v2_link(title: str, url: str) -> str:
+    """Собирает инлайн-ссылку [title](url) с правильным экранированием частей"""
+    return f"[{escape_markdown_v2(title)}]({escape_markdown_v2_url(url)})"
+
+
+def chunk_text(text: str, limit: int) -> List[str]:
+    """Режет текст на части не длиннее limit, не разрывая экранирующий '\\' и его символ"""
+    chunks = []
+    i = 0
+    n = len(text)
+    while i < n:
+        end = min(i + limit, n)
+        if end < n:
+            # Нечётное число '\\' в конце части - последний экранирует следующий символ
+            j = end
+            while j > i and text[j - 1] == '\\':
+                j -= 1
+            if (end - j) % 2 == 1 and end - 1 > i:
+                end -= 1
+        chunks.append(text[i:end])
+        i = end
+    return chunks
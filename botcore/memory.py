@@ -0,0 +1,88 @@
+"""Память диалогов и пользовательские системные промпты."""
+import sys
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+from botcore.storage import MemoryStore, SessionStore
+
+HISTORY_NS = "history"
+SYSTEM_PROMPT_NS = "system_prompt"
+
+
+class Turn(NamedTuple):
+    """Реплика истории: кортеж без словаря на каждое сообщение, в JSON - пара [role, content]"""
+    role: str
+    content: Any
+
+
+def _turn(item) -> Turn:
+    """Реплика из хранилища: Turn, пара из JSON или словарь старого формата"""
+    if isinstance(item, Turn):
+        return item
+    if isinstance(item, dict):
+        return Turn(sys.intern(item["role"]), item["content"])
+    role, content = item
+    return Turn(sys.intern(role), content)
+
+
+def _as_messages(history) -> List[dict]:
+    return [{"role": role, "content": content} for role, content in history or ()]
+
+
+class ConversationMemory:
+    """История сообщений пользователей с ограничением длины поверх SessionStore.
+
+    С trim_step > 0 история растёт до size + trim_step реплик и только потом
+    обрезается до size: между обрезками начало истории не меняется, и
+    провайдер (или KV-кэш LM Studio) переиспользует закэшированный префикс.
+    """
+    def __init__(self, size: int, default_system_prompt: str,
+                 store: Optional[SessionStore] = None, namespace: str = "bot",
+                 trim_step: int = 0):
+        self.size = size
+        self.trim_step = trim_step
+        self.default_system_prompt = default_system_prompt
+        self.store = store if store is not None else MemoryStore()
+        # Боты в одном хранилище не видят данных друг друга
+        self.namespace = namespace
+
+    def _key(self, user_id: int) -> str:
+        return f"{self.namespace}:{user_id}"
+
+    async def load(self, user_id: int) -> Tuple[str, List[dict]]:
+        """Системный промпт и история пользователя одним обращением к хранилищу"""
+        key = self._key(user_id)
+        prompt, history = await self.store.get_many([(SYSTEM_PROMPT_NS, key), (HISTORY_NS, key)])
+        return prompt or self.default_system_prompt, _as_messages(history)
+
+    async def history(self, user_id: int) -> List[dict]:
+        """Копия истории пользователя (без системного промпта)"""
+        return _as_messages(await self.store.get(HISTORY_NS, self._key(user_id)))
+
+    async def append(self, user_id: int, *messages: dict):
+        """Добавляет реплики одной атомарной записью, отбрасывая самые старые"""
+        if self.size <= 0 or not messages:
+            return
+        size = self.size
+        limit = size + self.trim_step
+        turns = [Turn(sys.intern(m["role"]), m["content"]) for m in messages]
+
+        def add(history):
+            history = [_turn(item) for item in history or ()] + turns
+            # Обрезаем блоком, а не по одной реплике, чтобы префикс оставался стабильным
+            return history[-size:] if len(history) > limit else history
+        await self.store.update(HISTORY_NS, self._key(user_id), add)
+
+    async def clear(self, user_id: int):
+        await self.store.delete(HISTORY_NS, self._key(user_id))
+
+    async def length(self, user_id: int) -> int:
+        return len(await self.store.get(HISTORY_NS, self._key(user_id)) or ())
+
+    async def system_prompt(self, user_id: int) -> str:
+        return await self.store.get(SYSTEM_PROMPT_NS, self._key(user_id)) or self.default_system_prompt
+
+    async def set_system_prompt(self, user_id: int, prompt: str):
+        """Устанавливает системный промпт пользователя и очищает историю"""
+        key = self._key(user_id)
+        value = None if prompt == self.default_system_prompt else prompt
+        await self.store.set_many({(SYSTEM_PROMPT_NS, key): value, (HISTORY_NS, key): None})
@@ -0,0 +1,192 @@
+"""Метрики процесса в текстовом формате Prometheus.
+
+Счётчики и гистограммы живут в памяти процесса и общие для всех ботов
+(различаются меткой bot). Если задана переменная METRICS_LISTEN
+(например 127.0.0.1:9100), runner поднимает HTTP-сервер с /metrics.
+Стадии запроса в метке stage: download, parse, context, queue, model,
+first_token, send, total.
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Секунды: от быстрых стадий (context, send) до долгих ответов модели
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+Labels = Tuple[str, ...]
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _label_str(self, values: Labels, extra: str = "") -> str:
+        pairs = [f'{n}="{_escape(v)}"' for n, v in zip(self.label_names, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Монотонный счётчик с метками"""
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{self._label_str(k)} {v:g}" for k, v in sorted(self._values.items())]
+
+
+class Gauge(Metric):
+    """Текущее значение; обновляется кодом или сборщиком перед выдачей /metrics"""
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[Labels, float] = {}
+
+    def set(self, *labels: str, value: float):
+        self._values[labels] = value
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{self._label_str(k)} {v:g}" for k, v in sorted(self._values.items())]
+
+
+class Histogram(Metric):
+    """Гистограмма с фиксированными корзинами (накопительно, как в Prometheus)"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        # метки -> [счётчики корзин..., +Inf], сумма
+        self._values: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, *labels: str, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    @contextmanager
+    def time(self, *labels: str):
+        """Замер длительности блока; учитывается и при исключении"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(*labels, value=time.perf_counter() - started)
+
+    def count(self, *labels: str) -> int:
+        entry = self._values.get(labels)
+        return sum(entry[0]) if entry else 0
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{self._label_str(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_str(key)} {total[0]:g}")
+            lines.append(f"{self.name}_count{self._label_str(key)} {cumulative}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Registry:
+    """Все метрики процесса и сборщики, обновляющие gauge перед выдачей"""
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        self.collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: Metric):
+        self.metrics.append(metric)
+
+    def add_collector(self, collector: Callable[[], None]):
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.error(f"Ошибка сборщика метрик: {e}")
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = Histogram("bot_stage_seconds", "Длительность стадий обработки запроса", ("bot", "stage"))
+REQUESTS = Counter("bot_requests_total", "Обработанные сообщения по исходу", ("bot", "outcome"))
+TOKENS = Counter("bot_tokens_total", "Токены модели: prompt, completion, cached", ("bot", "kind"))
+PREFIX_CACHE = Counter("bot_prefix_cache_total", "Запросы с usage: hit - часть промпта из кэша", ("bot", "result"))
+ATTACHMENT_BYTES = Counter("bot_attachment_bytes_total", "Скачано байт вложений", ("bot", "kind"))
+LIMITER = Gauge("bot_model_limiter", "Ограничитель запросов к модели: limit, in_flight, queued", ("bot", "value"))
+# Event loop общий для всех ботов процесса, поэтому без метки bot
+LOOP_LAG = Histogram("bot_loop_lag_seconds", "Задержка пробуждения пульса event loop",
+                     buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+LOOP_LAG_WINDOW = Gauge("bot_loop_lag_window_seconds", "Задержка event loop за последние замеры: p50, p95, p99, max",
+                        ("quantile",))
+LOOP_STALLS = Counter("bot_loop_stalls_total", "Блокировки event loop дольше LOOP_SLOW_SECONDS")
+QUOTA_REJECTED = Counter("bot_quota_rejected_total", "Запросы, отклонённые квотой токенов", ("bot", "scope"))
+LOG_DROPPED = Gauge("bot_log_dropped", "Записи лога, не попавшие в вывод: sampled, overflow", ("reason",))
+
+
+async def start_server(listen: str):
+    """HTTP-сервер с /metrics; возвращает AppRunner для остановки"""
+    from aiohttp import web
+
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(text=REGISTRY.render(), content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    host, _, port = listen.rpartition(":")
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host or "0.0.0.0", int(port)).start()
+    logger.info(f"Метрики доступны на http://{listen}/metrics")
+    return runner
+
+
+def listen_address() -> Optional[str]:
+    return os.getenv("METRICS_LISTEN") or None
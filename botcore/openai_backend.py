@@ -0,0 +1,154 @@
+"""Бэкенды OpenAI: chat completions и legacy completions.
+
+Пакет openai импортируется при первом запросе, а не при загрузке скрипта.
+"""
+import asyncio
+from typing import Any, Dict, List, Optional, Union
+
+from botcore.batching import MicroBatcher
+from botcore.llm import Completion, LLMBackend, LLMError, ModelNotFoundError, usage_counts
+
+
+def is_congestion(error: Exception) -> bool:
+    """Ошибка SDK OpenAI из-за перегрузки: обрыв или таймаут соединения, 429 и 5xx"""
+    import openai
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    return isinstance(error, openai.APIStatusError) and (error.status_code == 429 or error.status_code >= 500)
+
+
+def client_key(client: Any) -> str:
+    """Ключ ограничителя для клиента OpenAI: один ключ API - один общий лимит"""
+    return getattr(client, "admission_key", None) or f"openai:{id(client):x}"
+
+
+class OpenAIChatBackend(LLMBackend):
+    """Chat Completions API через асинхронный клиент"""
+    def __init__(self, client: "openai.AsyncOpenAI", model: str):
+        self.client = client
+        self.model = model
+
+    @property
+    def admission_key(self) -> str:
+        return client_key(self.client)
+
+    async def generate(self, messages: List[Dict], session_key: Optional[str] = None) -> Completion:
+        import openai
+        # prompt_cache_key направляет запросы одного диалога на сервер с его префиксом
+        extra_body = {"prompt_cache_key": session_key} if session_key else None
+        try:
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                extra_body=extra_body
+            )
+        except openai.NotFoundError as e:
+            raise ModelNotFoundError(self.model) from e
+        except openai.OpenAIError as e:
+            # Ошибка SDK уходит дальше как есть, ограничителю допуска - признак перегрузки
+            e.congested = is_congestion(e)
+            raise
+        return Completion((response.choices[0].message.content or "").strip(), self.model,
+                          **usage_counts(response.usage))
+
+
+class OpenAICompletionBackend(LLMBackend):
+    """Legacy Completions API (gpt-3.5-turbo-instruct): диалог сворачивается в один промпт.
+
+    При batch_window > 0 промпты, пришедшие в пределах окна, отправляются
+    одним запросом со списком prompt (не больше max_batch в пачке). Если API
+    отклонил пачку с 400 (например, один промпт с max_tokens не влез в
+    контекст), пачка делится пополам до одиночных промптов, и ошибку
+    получает только виновный запрос.
+    """
+    def __init__(self, client: "openai.AsyncOpenAI", model: str,
+                 max_tokens: int = 3500, temperature: float = 0.7,
+                 batch_window: float = 0.0, max_batch: int = 16):
+        self.client = client
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.batcher: Optional[MicroBatcher[str, Completion]] = None
+        if batch_window > 0:
+            self.batcher = MicroBatcher(self.complete_batch, batch_window, max_batch, name=model)
+
+    @property
+    def admission_key(self) -> str:
+        return client_key(self.client)
+
+    @staticmethod
+    def render_prompt(messages: List[Dict]) -> str:
+        """Собирает промпт вида «система, Пользователь: ..., Ассистент:»"""
+        parts = []
+        for msg in messages:
+            content = msg["content"]
+            if not isinstance(content, str):
+                content = "\n".join(p["text"] for p in content if p.get("type") == "text")
+            if msg["role"] == "system":
+                parts.append(f"{content}\n")
+            elif msg["role"] == "user":
+                parts.append(f"Пользователь: {content}")
+            else:
+                parts.append(f"Ассистент: {content}")
+        parts.append("Ассистент:")
+        return "\n".join(parts)
+
+    async def generate(self, messages: List[Dict], session_key: Optional[str] = None) -> Completion:
+        prompt = self.render_prompt(messages)
+        if self.batcher is not None:
+            return await self.batcher.submit(prompt)
+        return (await self.complete_batch([prompt]))[0]
+
+    async def complete_batch(self, prompts: List[str]) -> List[Union[Completion, Exception]]:
+        """Один запрос на несколько промптов; ответы сопоставляются по choice.index.
+
+        Ошибка отдельного промпта пачки возвращается на его месте в списке.
+        """
+        import openai
+        try:
+            response = await self.client.completions.create(
+                model=self.model,
+                prompt=prompts if len(prompts) > 1 else prompts[0],
+                max_tokens=self.max_tokens,
+                temperature=self.temperature
+            )
+        except openai.BadRequestError as e:
+            if len(prompts) == 1:
+                raise LLMError(f"🚫 Error: {e}") from e
+            return await self._bisect(prompts)
+        except openai.NotFoundError as e:
+            raise ModelNotFoundError(self.model) from e
+        except openai.OpenAIError as e:
+            error = LLMError(f"🚫 Error: {e}")
+            error.congested = is_congestion(e)
+            raise error from e
+        texts = [""] * len(prompts)
+        for choice in response.choices:
+            texts[choice.index] = choice.text.strip()
+        # usage приходит на всю пачку - делим пропорционально длине промптов и ответов
+        usage = usage_counts(response.usage)
+        prompt_chars = sum(len(p) for p in prompts) or 1
+        answer_chars = sum(len(t) for t in texts) or 1
+        return [
+            Completion(
+                text, self.model,
+                prompt_tokens=round(usage.get("prompt_tokens", 0) * len(prompt) / prompt_chars),
+                completion_tokens=round(usage.get("completion_tokens", 0) * len(text) / answer_chars),
+            )
+            for prompt, text in zip(prompts, texts)
+        ]
+
+    async def _bisect(self, prompts: List[str]) -> List[Union[Completion, Exception]]:
+        # Половины отправляются параллельно; ошибка всего вызова половины достаётся её промптам
+        middle = len(prompts) // 2
+        parts = (prompts[:middle], prompts[middle:])
+        outcomes = await asyncio.gather(*(self.complete_batch(part) for part in parts), return_exceptions=True)
+        results: List[Union[Completion, Exception]] = []
+        for part, outcome in zip(parts, outcomes):
+            if isinstance(outcome, Exception):
+                results.extend([outcome] * len(part))
+            elif isinstance(outcome, BaseException):
+                raise outcome
+            else:
+                results.extend(outcome)
+        return results
@@ -0,0 +1,372 @@
+"""Платформонезависимый конвейер обработки запроса.
+
+Стадии: prefilter -> ingest -> build_context -> call_model -> render -> send.
+Платформенная часть (сборка Request, отправка, кнопка «Продолжить»)
+живёт в адаптерах botcore.adapters и реализует интерфейс Transport.
+"""
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncContextManager, Dict, List, Optional
+
+from botcore import attachments, capture, logs, metrics, shared, tracing
+from botcore.admission import AdaptiveLimiter, Overloaded
+from botcore.attachments import Attachment
+from botcore.config import BotConfig
+from botcore.llm import Completion, LLMBackend, LLMError
+from botcore.memory import ConversationMemory
+from botcore.quota import ANSWER_TOKENS, CHARS_PER_TOKEN, QuotaExceeded, QuotaLimiter
+
+logger = logging.getLogger(__name__)
+
+EMPTY_REQUEST_TEXT = "Пожалуйста, задайте вопрос или отправьте изображение/файл."
+UNSUPPORTED_FILE_TEXT = "❌ Неподдерживаемый тип или размер файла превышает лимит."
+GENERIC_ERROR_TEXT = "Извините, произошла ошибка при обработке вашего запроса."
+
+# Раз в столько отброшенных сообщений в лог пишется сводка префильтра
+PREFILTER_LOG_EVERY = 1000
+
+
+class RequestRejected(Exception):
+    """Обработка остановлена; текст исключения отправляется пользователю"""
+
+
+@dataclass
+class Request:
+    """Входящее сообщение в платформонезависимом виде"""
+    platform: str
+    user_id: int
+    chat_id: int
+    user_name: str
+    # None для личных сообщений
+    chat_title: Optional[str]
+    is_group: bool
+    # Личное сообщение, упоминание бота или ответ на его сообщение
+    addressed: bool
+    text: str
+    attachments: List[Attachment] = field(default_factory=list)
+    # Сервер Discord, для квоты на сервер; None на других платформах и в личных сообщениях
+    guild_id: Optional[int] = None
+    # Исходное сообщение платформы, нужно адаптеру для ответа
+    raw: Any = None
+    # --- Заполняется стадиями ---
+    prompt: str = ""
+    images: List[str] = field(default_factory=list)
+    file_texts: List[str] = field(default_factory=list)
+    messages: List[Dict] = field(default_factory=list)
+    completion: Optional[Completion] = None
+    answer: str = ""
+    chunks: List[str] = field(default_factory=list)
+    # Резерв квоты токенов до ответа модели (botcore.quota)
+    quota_reserved: int = 0
+
+
+class Transport:
+    """Платформенная часть конвейера, реализуется адаптером"""
+
+    def typing(self, request: Request) -> AsyncContextManager:
+        """Индикатор «печатает...» на время вызова модели"""
+        raise NotImplementedError
+
+    def render(self, request: Request, answer: str) -> List[str]:
+        """Форматирует ответ и режет его на сообщения"""
+        raise NotImplementedError
+
+    async def send(self, request: Request, chunks: List[str]):
+        raise NotImplementedError
+
+    async def send_error(self, request: Request, text: str):
+        raise NotImplementedError
+
+
+class Pipeline:
+    """Общий путь запроса от входящего сообщения до отправленного ответа"""
+    def __init__(self, config: BotConfig, backend: LLMBackend,
+                 memory: Optional[ConversationMemory] = None):
+        self.config = config
+        self.backend = backend
+        self.memory = memory or ConversationMemory(config.memory_size, config.system_prompt,
+                                                   shared.session_store(), config.name,
+                                                   trim_step=config.trim_step)
+        self._text_extensions = tuple(ext.lower() for ext in config.text_extensions)
+        self._document_extensions = self._text_extensions + (('.pdf',) if config.accept_pdf else ())
+        # received, prefiltered, prefiltered_attachments, prefiltered_bytes;
+        # model_calls, usage_calls, prompt_tokens, completion_tokens, cached_tokens,
+        # cache_hits, latency_ms_hit, latency_ms_miss
+        self.counters: Counter = Counter()
+        self.quota = QuotaLimiter({"user": config.quota_user_tokens, "chat": config.quota_chat_tokens,
+                                   "guild": config.quota_guild_tokens}, config.quota_window, config.name)
+        metrics.REGISTRY.add_collector(self._collect_metrics)
+
+    @property
+    def limiter(self) -> AdaptiveLimiter:
+        """Ограничитель запросов к модели, общий для всех ботов процесса с тем же бэкендом"""
+        config = self.config
+        return shared.limiter(self.backend.admission_key, max_limit=config.max_concurrency,
+                              initial_limit=config.initial_concurrency, target_latency=config.target_latency,
+                              max_queue=config.max_queue, queue_timeout=config.queue_timeout)
+
+    async def handle(self, request: Request, transport: Transport) -> bool:
+        """Прогоняет запрос через все стадии; False, если запрос отброшен префильтром"""
+        bot = self.config.name
+        if not self.prefilter(request):
+            metrics.REQUESTS.inc(bot, "prefiltered")
+            capture.record(bot, request, "prefiltered")
+            return False
+        started = time.perf_counter()
+        with tracing.start_trace("message", bot=bot, platform=request.platform, group=request.is_group,
+                                 attachments=len(request.attachments)) as root:
+            outcome = await self.process(request, transport)
+            root.set(outcome=outcome)
+        elapsed = time.perf_counter() - started
+        metrics.REQUESTS.inc(bot, outcome)
+        metrics.STAGE_SECONDS.observe(bot, "total", value=elapsed)
+        capture.record(bot, request, outcome, elapsed)
+        return True
+
+    async def process(self, request: Request, transport: Transport) -> str:
+        """Стадии после префильтра; ошибки отправляются пользователю, возвращается исход"""
+        try:
+            # Очередь к модели уже полна - отказываем до загрузки вложений
+            self.limiter.check()
+            # Квота исчерпана - тоже до загрузки вложений и вызова модели
+            if self.quota.enabled:
+                request.quota_reserved = self.quota.check(request, self.quota_estimate(request))
+            await self.ingest(request)
+            with self.stage("context"):
+                await self.build_context(request)
+            async with transport.typing(request):
+                await self.call_model(request)
+            await self.remember(request)
+            with self.stage("send") as span:
+                request.chunks = transport.render(request, request.answer)
+                span.set(chunks=len(request.chunks))
+                await transport.send(request, request.chunks)
+        except QuotaExceeded as e:
+            await transport.send_error(request, str(e))
+            return "quota"
+        except RequestRejected as e:
+            await transport.send_error(request, str(e))
+            return "rejected"
+        except LLMError as e:
+            logger.error(f"Ошибка модели для пользователя {request.user_id}: {e}")
+            await transport.send_error(request, str(e))
+            return "overloaded" if isinstance(e, Overloaded) else "model_error"
+        except Exception as e:
+            logger.error(f"Произошла ошибка при обработке запроса от пользователя {request.user_id}: {e}", exc_info=True)
+            await transport.send_error(request, GENERIC_ERROR_TEXT)
+            return "error"
+        finally:
+            if request.quota_reserved:
+                # Запрос не дошёл до ответа модели - резерв квоты возвращается
+                self.quota.release(request, request.quota_reserved)
+                request.quota_reserved = 0
+        return "ok"
+
+    @contextmanager
+    def stage(self, name: str, **attrs):
+        """Замер стадии: гистограмма bot_stage_seconds и спан текущей трассы"""
+        with metrics.STAGE_SECONDS.time(self.config.name, name), tracing.span(name, **attrs) as span:
+            yield span
+
+    # --- Стадии ---
+
+    def prefilter(self, request: Request) -> bool:
+        """Дешёвая проверка до любых загрузок: адресовано ли сообщение боту"""
+        counters = self.counters
+        counters["received"] += 1
+        if request.is_group and self.config.require_mention and not request.addressed:
+            # Учитываем работу, которую не пришлось делать: загрузки вложений
+            counters["prefiltered"] += 1
+            if request.attachments:
+                counters["prefiltered_attachments"] += len(request.attachments)
+                counters["prefiltered_bytes"] += sum(a.size for a in request.attachments)
+            if counters["prefiltered"] % PREFILTER_LOG_EVERY == 0:
+                logger.info(f"[{self.config.name}] Префильтр: отброшено {counters['prefiltered']} из "
+                            f"{counters['received']} сообщений, не скачано вложений "
+                            f"{counters['prefiltered_attachments']} ({counters['prefiltered_bytes'] / 2**20:.1f} МБ)")
+            return False
+        return True
+
+    def is_supported_document(self, filename: str) -> bool:
+        return filename.lower().endswith(self._document_extensions)
+
+    async def ingest(self, request: Request):
+        """Загрузка вложений: изображения в base64, документы в текст"""
+        config = self.config
+        for attachment in request.attachments:
+            if attachment.kind == attachments.IMAGE:
+                if not config.accept_images:
+                    continue
+                try:
+                    data = await self.download(attachment)
+                    with self.stage("parse", kind=attachment.kind):
+                        request.images.append(attachments.encode_image(data))
+                except Exception as e:
+                    logger.error(f"Ошибка загрузки изображения от пользователя {request.user_id}: {e}")
+                    raise RequestRejected(f"❌ Ошибка загрузки изображения: {e}") from e
+                continue
+            if not self.is_supported_document(attachment.filename) or attachment.size >= config.max_file_size_bytes:
+                raise RequestRejected(UNSUPPORTED_FILE_TEXT)
+            try:
+                data = await self.download(attachment)
+                with self.stage("parse", kind=attachment.kind, filename=attachment.filename) as span:
+                    text = await attachments.parse_document(attachment.filename, data,
+                                                            config.max_text_length, config.text_encodings)
+                    span.set(chars=len(text))
+            except Exception as e:
+                logger.error(f"Ошибка обработки файла от пользователя {request.user_id}: {e}")
+                raise RequestRejected(f"❌ Ошибка обработки файла: {attachment.filename} - {e}") from e
+            request.file_texts.append(f"Содержимое файла {attachment.filename}:\n{text}")
+
+        prompt = request.text.strip()
+        if request.file_texts:
+            joined = "\n".join(request.file_texts)
+            prompt = f"{prompt}\n{joined}" if prompt else joined
+        request.prompt = prompt
+        if not request.prompt and not request.images:
+            raise RequestRejected(EMPTY_REQUEST_TEXT)
+
+    async def download(self, attachment: Attachment) -> bytes:
+        with self.stage("download", kind=attachment.kind) as span:
+            data = await attachment.fetch()
+            span.set(bytes=len(data))
+        metrics.ATTACHMENT_BYTES.inc(self.config.name, attachment.kind, amount=len(data))
+        return data
+
+    async def build_context(self, request: Request):
+        """Системный промпт + история пользователя + текущее сообщение.
+
+        Всё переменное (текст, файлы, изображения) идёт только в последнее
+        сообщение; системный промпт и история побайтно повторяют прошлый
+        запрос и попадают в кэш префикса у провайдера.
+        """
+        system_prompt, history = await self.memory.load(request.user_id)
+        messages = [{"role": "system", "content": system_prompt}]
+        messages.extend(history)
+        if request.images:
+            content = []
+            if request.prompt:
+                content.append({"type": "text", "text": request.prompt})
+            for img in request.images:
+                content.append({
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:image/jpeg;base64,{img}",
+                        "detail": "high"
+                    }
+                })
+            messages.append({"role": "user", "content": content})
+        else:
+            messages.append({"role": "user", "content": request.prompt})
+        request.messages = messages
+
+        chat_info = f"Группа: '{request.chat_title}'" if request.chat_title else "Личные сообщения"
+        logger.info(
+            f"[{self.config.name}] Новый запрос от '{request.user_name}' ({chat_info}). "
+            f"Запрос: \"{request.prompt[:200]}\". Изображений: {len(request.images)}. "
+            f"Файлов: {len(request.file_texts)}. Размер памяти: {len(messages) - 2}",
+            extra=logs.fields(sampled=True, bot=self.config.name, platform=request.platform,
+                              prompt_chars=len(request.prompt),
+                              file_chars=sum(len(text) for text in request.file_texts))
+        )
+
+    async def call_model(self, request: Request):
+        # Маршрутизатор моделей выбирает бэкенд по форме запроса
+        backend = self.backend.select(request)
+        stage = metrics.STAGE_SECONDS
+        with tracing.span("model", model=backend.model) as span:
+            queued = time.monotonic()
+            async with self.limiter.slot():
+                started = time.monotonic()
+                stage.observe(self.config.name, "queue", value=started - queued)
+                completion = await backend.generate(request.messages,
+                                                    session_key=f"{request.platform}:{request.user_id}")
+                latency = time.monotonic() - started
+                latency_ms = int(latency * 1000)
+            span.set(queue_ms=round((started - queued) * 1000, 1), prompt_tokens=completion.prompt_tokens,
+                     completion_tokens=completion.completion_tokens, cached_tokens=completion.cached_tokens)
+        stage.observe(self.config.name, "model", value=latency)
+        # Бэкенды отвечают целиком: первый токен пользователь видит вместе с ответом
+        stage.observe(self.config.name, "first_token", value=latency)
+        request.completion = completion
+        request.answer = completion.text
+        self.count_usage(completion, latency_ms)
+        if self.quota.enabled:
+            reserved, request.quota_reserved = request.quota_reserved, 0
+            try:
+                self.quota.charge(request, self.used_tokens(request, completion), reserved)
+            except Exception as e:
+                # Учёт расхода не должен терять готовый ответ
+                logger.error(f"[{self.config.name}] Не удалось списать квоту: {e}", exc_info=True)
+        usage = ""
+        if completion.prompt_tokens:
+            usage = (f" Токены: {completion.prompt_tokens} (из кэша {completion.cached_tokens})"
+                     f" + {completion.completion_tokens}, {latency_ms} мс.")
+        logger.info(f"[{self.config.name}] Ответ ИИ: \"{request.answer[:200]}...\"{usage}",
+                    extra=logs.fields(sampled=True, bot=self.config.name, model=completion.model or backend.model,
+                                      answer_chars=len(request.answer), latency_ms=latency_ms))
+
+    def count_usage(self, completion: Completion, latency_ms: int):
+        """Учёт токенов и попаданий в кэш префикса"""
+        counters = self.counters
+        counters["model_calls"] += 1
+        if not completion.prompt_tokens:
+            # Бэкенд не сообщил расход токенов
+            return
+        counters["usage_calls"] += 1
+        counters["prompt_tokens"] += completion.prompt_tokens
+        counters["completion_tokens"] += completion.completion_tokens
+        counters["cached_tokens"] += completion.cached_tokens
+        bot = self.config.name
+        metrics.TOKENS.inc(bot, "prompt", amount=completion.prompt_tokens)
+        metrics.TOKENS.inc(bot, "completion", amount=completion.completion_tokens)
+        metrics.TOKENS.inc(bot, "cached", amount=completion.cached_tokens)
+        metrics.PREFIX_CACHE.inc(bot, "hit" if completion.cached_tokens else "miss")
+        if completion.cached_tokens:
+            counters["cache_hits"] += 1
+            counters["latency_ms_hit"] += latency_ms
+        else:
+            counters["latency_ms_miss"] += latency_ms
+
+    @staticmethod
+    def used_tokens(request: Request, completion: Completion) -> int:
+        """Расход запроса по usage; без usage - оценка по длине текста (4 символа на токен)"""
+        if completion.prompt_tokens:
+            return completion.prompt_tokens + completion.completion_tokens
+        chars = sum(len(m["content"]) for m in request.messages if isinstance(m["content"], str))
+        return (chars + len(completion.text)) // CHARS_PER_TOKEN
+
+    def quota_estimate(self, request: Request) -> int:
+        """Резерв квоты до вызова модели: текст и файлы по CHARS_PER_TOKEN плюс потолок ответа"""
+        files = sum(min(a.size, self.config.max_text_length)
+                    for a in request.attachments if a.kind == attachments.FILE)
+        answer = getattr(self.backend, "max_tokens", None) or ANSWER_TOKENS
+        return (len(request.text) + files) // CHARS_PER_TOKEN + answer
+
+    def prefix_cache_stats(self) -> Dict[str, float]:
+        """Доля запросов и токенов из кэша префикса и средняя задержка с кэшем и без"""
+        c = self.counters
+        with_usage = c["usage_calls"]
+        misses = with_usage - c["cache_hits"]
+        return {
+            "hit_rate": round(c["cache_hits"] / with_usage, 3) if with_usage else 0.0,
+            "cached_token_share": round(c["cached_tokens"] / c["prompt_tokens"], 3) if c["prompt_tokens"] else 0.0,
+            "latency_ms_hit": round(c["latency_ms_hit"] / c["cache_hits"]) if c["cache_hits"] else 0,
+            "latency_ms_miss": round(c["latency_ms_miss"] / misses) if misses else 0,
+        }
+
+    def _collect_metrics(self):
+        stats = self.limiter.stats()
+        for name in ("limit", "in_flight", "queued"):
+            metrics.LIMITER.set(self.config.name, name, value=stats[name])
+
+    async def remember(self, request: Request):
+        """Сохраняет реплики в память только после успешного ответа модели"""
+        await self.memory.append(
+            request.user_id,
+            {"role": "user", "content": request.prompt or self.config.media_placeholder},
+            {"role": "assistant", "content": request.answer},
+        )
@@ -0,0 +1,172 @@
+"""Сэмплирующий профилировщик по команде администратора.
+
+Пока профиль не снимается, ничего не работает. Команда запускает фоновый
+поток, который каждые ``interval`` секунд читает стек потока event loop
+(sys._current_frames) и задачу asyncio, выполняемую на loop в этот момент.
+Результат - collapsed stacks («задача;кадр;кадр N»), которые понимают
+flamegraph.pl, speedscope и inferno. Корень каждого стека - корутина
+текущей задачи или «(loop)», если loop выполняет колбэк или ждёт событий.
+
+Администраторы: ADMIN_IDS (id через запятую, любая платформа) и
+ADMIN_CHAT_ID из .env (личный чат администратора в Telegram).
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import List, Optional, Set, Tuple
+
+DEFAULT_SECONDS = 30
+MAX_SECONDS = 300
+DEFAULT_INTERVAL = 0.01
+MAX_DEPTH = 128
+
+# Кадры ожидания в селекторе (EpollSelector.select, IocpProactor._poll): loop простаивает
+_IDLE_FUNCTIONS = {"select", "_poll"}
+
+
+class ProfilerBusy(RuntimeError):
+    """Профиль уже снимается; текст можно показать пользователю"""
+    def __init__(self):
+        super().__init__("Профилирование уже идёт, дождитесь результата.")
+
+
+def admin_ids() -> Set[int]:
+    ids = set()
+    for value in (os.getenv("ADMIN_IDS", "") + "," + os.getenv("ADMIN_CHAT_ID", "")).split(","):
+        value = value.strip()
+        if value.lstrip("-").isdigit():
+            ids.add(int(value))
+    return ids
+
+
+def is_admin(user_id: int) -> bool:
+    return user_id in admin_ids()
+
+
+def parse_seconds(text: Optional[str]) -> int:
+    """Длительность из аргумента команды; ValueError с текстом для пользователя"""
+    if not text or not text.strip():
+        return DEFAULT_SECONDS
+    try:
+        seconds = int(text.strip().split()[0])
+    except ValueError:
+        raise ValueError(f"Укажите длительность в секундах: 1..{MAX_SECONDS}") from None
+    if not 1 <= seconds <= MAX_SECONDS:
+        raise ValueError(f"Укажите длительность в секундах: 1..{MAX_SECONDS}")
+    return seconds
+
+
+def _frame_name(code) -> str:
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+@dataclass
+class Profile:
+    """Снятый профиль: collapsed stacks и сводка"""
+    stacks: Counter
+    samples: int
+    seconds: float
+    interval: float
+
+    def collapsed(self) -> str:
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def busy_share(self) -> float:
+        idle = sum(count for stack, count in self.stacks.items()
+                   if stack[0] == "(loop)" and stack[-1].split(" (")[0].rsplit(".", 1)[-1] in _IDLE_FUNCTIONS)
+        return 1 - idle / self.samples if self.samples else 0.0
+
+    def top(self, by_task: bool = False, limit: int = 5) -> List[Tuple[str, int]]:
+        counts: Counter = Counter()
+        for stack, count in self.stacks.items():
+            counts[stack[0] if by_task else stack[-1]] += count
+        return counts.most_common(limit)
+
+    def summary(self) -> str:
+        lines = [f"Профиль {self.seconds:.0f} с: {self.samples} сэмплов по {self.interval * 1000:.0f} мс, "
+                 f"loop занят {self.busy_share():.0%}"]
+        lines.append("Задачи:")
+        lines.extend(f"  {count / self.samples:5.1%} {name}" for name, count in self.top(by_task=True))
+        lines.append("Функции (собственное время):")
+        lines.extend(f"  {count / self.samples:5.1%} {name}" for name, count in self.top())
+        return "\n".join(lines)
+
+
+class SamplingProfiler:
+    """Фоновый поток, сэмплирующий стек потока event loop"""
+    def __init__(self, loop: asyncio.AbstractEventLoop, interval: float = DEFAULT_INTERVAL):
+        self.loop = loop
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.samples = 0
+        # (корутина задачи, код кадров от корня к листу) -> сэмплы
+        self._raw: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+        self._elapsed = 0.0
+        self._switch_interval = 0.005
+
+    def start(self):
+        self._started = time.monotonic()
+        # Поток сэмплера получает GIL не чаще switch interval (5 мс): без уменьшения
+        # короткие CPU-участки корутин не попадают в сэмплы, видны только блокировки
+        self._switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self._switch_interval, self.interval / 10))
+        self._thread = threading.Thread(target=self._run, name="botcore-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Profile:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            sys.setswitchinterval(self._switch_interval)
+        self._elapsed = time.monotonic() - self._started
+        stacks: Counter = Counter()
+        for (task, codes), count in self._raw.items():
+            stacks[(task,) + tuple(_frame_name(code) for code in codes)] += count
+        return Profile(stacks, self.samples, self._elapsed, self.interval)
+
+    def _run(self):
+        current_tasks = getattr(asyncio.tasks, "_current_tasks", {})
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            task = current_tasks.get(self.loop)
+            coro = task.get_coro() if task is not None else None
+            label = getattr(coro, "__qualname__", "(loop)") if task is not None else "(loop)"
+            codes = []
+            while frame is not None and len(codes) < MAX_DEPTH:
+                codes.append(frame.f_code)
+                frame = frame.f_back
+            codes.reverse()
+            self._raw[(label, tuple(codes))] += 1
+            self.samples += 1
+
+
+_active: Optional[SamplingProfiler] = None
+
+
+async def profile(seconds: float, interval: float = DEFAULT_INTERVAL) -> Profile:
+    """Снимает профиль текущего event loop за seconds секунд; один профиль за раз"""
+    global _active
+    if _active is not None:
+        raise ProfilerBusy()
+    _active = SamplingProfiler(asyncio.get_running_loop(), interval)
+    _active.start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        result = _active.stop()
+        _active = None
+    return result
+
+
+def filename(bot: str) -> str:
+    return f"profile-{bot}-{time.strftime('%Y%m%d-%H%M%S')}.folded"
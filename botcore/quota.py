@@ -0,0 +1,137 @@
+"""Квоты токенов модели на пользователя, чат и сервер.
+
+Каждый ключ (пользователь, групповой чат, сервер Discord) - ведро со
+скользящим окном: израсходованные токены (prompt + completion из usage
+ответа) добавляются в ведро и равномерно вытекают за ``window`` секунд.
+Пока в ведре больше лимита, новые запросы по этому ключу отклоняются.
+Проверка - O(1) на ключ и выполняется до скачивания вложений и вызова
+модели. Прошедший проверку запрос сразу резервирует оценку расхода, чтобы
+параллельные запросы одного пользователя не проскочили лимит вместе;
+после ответа резерв заменяется фактическим расходом, а при ошибке
+возвращается.
+
+Лимиты задаются в BotConfig (quota_*_tokens, 0 - без квоты; по умолчанию
+из QUOTA_*_TOKENS и QUOTA_WINDOW в окружении) и живут в памяти процесса.
+"""
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+from botcore import metrics
+
+# Оценка расхода до ответа: символов на токен и ответ, если у бэкенда нет max_tokens
+CHARS_PER_TOKEN = 4
+ANSWER_TOKENS = 1000
+
+# Название ограничения в ответе пользователю
+SCOPE_TEXT = {
+    "user": "ваш лимит",
+    "chat": "лимит этого чата",
+    "guild": "лимит этого сервера",
+}
+
+
+class QuotaExceeded(Exception):
+    """Ведро переполнено; текст можно показать пользователю"""
+    def __init__(self, scope: str, retry_after: float):
+        self.scope = scope
+        self.retry_after = retry_after
+        minutes = max(1, math.ceil(retry_after / 60))
+        super().__init__(f"⏳ Исчерпан {SCOPE_TEXT[scope]} токенов, попробуйте через {minutes} мин.")
+
+
+class TokenBucket:
+    """Ведро с утечкой: level токенов, вытекает limit / window в секунду"""
+    __slots__ = ("level", "updated")
+
+    def __init__(self, now: float):
+        self.level = 0.0
+        self.updated = now
+
+    def drain(self, rate: float, now: float) -> float:
+        self.level = max(0.0, self.level - (now - self.updated) * rate)
+        self.updated = now
+        return self.level
+
+
+class QuotaLimiter:
+    """Вёдра по ключам (scope, id) с отдельным лимитом на каждый scope"""
+    def __init__(self, limits: Dict[str, int], window: float = 3600.0, name: str = "quota"):
+        # scope -> лимит токенов за окно; нулевые лимиты не проверяются
+        self.limits = {scope: limit for scope, limit in limits.items() if limit > 0}
+        if self.limits and window <= 0:
+            raise ValueError(f"Окно квоты должно быть больше нуля, задано {window:g} с (QUOTA_WINDOW)")
+        self.window = window
+        self.name = name
+        self.enabled = bool(self.limits)
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._last_sweep = time.monotonic()
+
+    def keys(self, request) -> List[Tuple[str, str]]:
+        """Ключи запроса по включённым scope; request - botcore.pipeline.Request"""
+        keys = []
+        if "user" in self.limits:
+            keys.append(("user", f"{request.platform}:{request.user_id}"))
+        if "chat" in self.limits and request.is_group:
+            keys.append(("chat", f"{request.platform}:{request.chat_id}"))
+        if "guild" in self.limits and request.guild_id is not None:
+            keys.append(("guild", f"{request.platform}:{request.guild_id}"))
+        return keys
+
+    def check(self, request, estimate: int = 0) -> int:
+        """Бросает QuotaExceeded, если хотя бы одно ведро запроса переполнено.
+
+        Иначе резервирует estimate токенов во всех вёдрах запроса и
+        возвращает размер резерва для charge() или release().
+        """
+        now = time.monotonic()
+        keys = self.keys(request)
+        for scope, key in keys:
+            bucket = self._buckets.get((scope, key))
+            if bucket is None:
+                continue
+            limit = self.limits[scope]
+            rate = limit / self.window
+            level = bucket.drain(rate, now)
+            if level >= limit:
+                metrics.QUOTA_REJECTED.inc(self.name, scope)
+                raise QuotaExceeded(scope, (level - limit) / rate + 1)
+        estimate = max(0, estimate)
+        self._add(keys, estimate, now)
+        return estimate
+
+    def charge(self, request, tokens: int, reserved: int = 0):
+        """Списывает фактический расход запроса со всех его вёдер вместо резерва"""
+        self._add(self.keys(request), max(0, tokens) - reserved, time.monotonic())
+
+    def release(self, request, reserved: int):
+        """Возвращает резерв запроса, не получившего ответа модели"""
+        self._add(self.keys(request), -reserved, time.monotonic())
+
+    def _add(self, keys: List[Tuple[str, str]], tokens: int, now: float):
+        if not tokens:
+            return
+        for scope, key in keys:
+            bucket = self._buckets.get((scope, key))
+            if bucket is None:
+                if tokens < 0:
+                    continue
+                bucket = self._buckets[(scope, key)] = TokenBucket(now)
+            bucket.drain(self.limits[scope] / self.window, now)
+            bucket.level = max(0.0, bucket.level + tokens)
+        if now - self._last_sweep > self.window:
+            self._sweep(now)
+
+    def _sweep(self, now: float):
+        # Раз в окно удаляем опустевшие вёдра, чтобы память не росла с числом пользователей
+        self._last_sweep = now
+        empty = [k for k, b in self._buckets.items() if b.drain(self.limits[k[0]] / self.window, now) == 0]
+        for k in empty:
+            del self._buckets[k]
+
+    def usage(self, scope: str, key: str) -> Optional[float]:
+        """Текущий уровень ведра в токенах или None, если ведра нет"""
+        bucket = self._buckets.get((scope, key))
+        if bucket is None or scope not in self.limits:
+            return None
+        return bucket.drain(self.limits[scope] / self.window, time.monotonic())
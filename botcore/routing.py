@@ -0,0 +1,142 @@
+"""Выбор модели по форме запроса.
+
+Маршрутизатор смотрит только на дешёвые признаки уже собранного запроса:
+длину всего контекста (системный промпт, история, текст файлов и новая
+реплика), наличие изображений и документов, тип чата. Короткая реплика
+после длинного документа в истории - это длинный запрос. Правила
+проверяются по порядку, первое подошедшее выбирает бэкенд; если не подошло
+ни одно, используется маршрут по умолчанию. По каждому маршруту считаются
+запросы, ошибки, задержка и токены.
+"""
+import logging
+import os
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from botcore import logs
+from botcore.llm import Completion, LLMBackend
+
+logger = logging.getLogger(__name__)
+
+
+def context_chars(request: Any) -> int:
+    """Длина контекста, который уйдёт в модель; до build_context - длина промпта"""
+    if not request.messages:
+        return len(request.prompt)
+    total = 0
+    for message in request.messages:
+        content = message["content"]
+        if isinstance(content, str):
+            total += len(content)
+        else:
+            total += sum(len(part.get("text", "")) for part in content)
+    return total
+
+
+class Route(LLMBackend):
+    """Правило маршрута и его бэкенд; None в условии - признак не важен"""
+    def __init__(self, name: str, backend: LLMBackend, min_chars: int = 0,
+                 max_chars: Optional[int] = None, images: Optional[bool] = None,
+                 documents: Optional[bool] = None, group: Optional[bool] = None):
+        self.name = name
+        self.backend = backend
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.images = images
+        self.documents = documents
+        self.group = group
+        # requests, errors, latency_ms, prompt_tokens, completion_tokens, cached_tokens
+        self.counters: Counter = Counter()
+
+    @property
+    def model(self) -> str:
+        return self.backend.model
+
+    @property
+    def admission_key(self) -> str:
+        return self.backend.admission_key
+
+    def matches(self, request: Any) -> bool:
+        chars = context_chars(request)
+        return (chars >= self.min_chars
+                and (self.max_chars is None or chars <= self.max_chars)
+                and (self.images is None or bool(request.images) == self.images)
+                and (self.documents is None or bool(request.file_texts) == self.documents)
+                and (self.group is None or request.is_group == self.group))
+
+    async def generate(self, messages: List[Dict], session_key: Optional[str] = None) -> Completion:
+        counters = self.counters
+        counters["requests"] += 1
+        started = time.monotonic()
+        try:
+            completion = await self.backend.generate(messages, session_key=session_key)
+        except Exception:
+            counters["errors"] += 1
+            raise
+        latency = time.monotonic() - started
+        counters["latency_ms"] += int(latency * 1000)
+        counters["prompt_tokens"] += completion.prompt_tokens
+        counters["completion_tokens"] += completion.completion_tokens
+        counters["cached_tokens"] += completion.cached_tokens
+        logger.info(f"Маршрут {self.name} ({completion.model or self.model}): {latency:.1f} с, "
+                    f"токены {completion.prompt_tokens}+{completion.completion_tokens} "
+                    f"(из кэша {completion.cached_tokens})", extra=logs.fields(sampled=True, route=self.name))
+        return completion
+
+
+class ModelRouter(LLMBackend):
+    """Бэкенд из нескольких маршрутов; Pipeline выбирает маршрут через select()"""
+    def __init__(self, routes: List[Route], default: Route):
+        self.routes = routes
+        self.default = default
+
+    @property
+    def model(self) -> str:
+        return self.default.model
+
+    @property
+    def admission_key(self) -> str:
+        # Маршруты tiered_router работают через один клиент - и лимит у них один
+        return self.default.admission_key
+
+    def select(self, request: Any) -> Route:
+        for route in self.routes:
+            if route.matches(request):
+                return route
+        return self.default
+
+    async def generate(self, messages: List[Dict], session_key: Optional[str] = None) -> Completion:
+        # Без запроса признаков нет - маршрут по умолчанию
+        return await self.default.generate(messages, session_key=session_key)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {route.name: dict(route.counters) for route in self.routes + [self.default]}
+
+    def describe(self) -> str:
+        return ", ".join(f"{route.name}={route.model}" for route in self.routes + [self.default])
+
+
+def tiered_router(client: "openai.AsyncOpenAI", default_model: str) -> ModelRouter:
+    """Маршруты OpenAI из окружения: быстрая модель для коротких реплик,
+    vision-модель для изображений и модель с длинным контекстом для документов.
+
+    OPENAI_FAST_MODEL, OPENAI_VISION_MODEL, OPENAI_LONG_MODEL - модели маршрутов
+    (по умолчанию default_model), ROUTE_FAST_MAX_CHARS и ROUTE_LONG_MIN_CHARS -
+    границы длины всего контекста запроса вместе с историей.
+    """
+    from botcore.openai_backend import OpenAIChatBackend
+
+    def backend(env: str) -> OpenAIChatBackend:
+        return OpenAIChatBackend(client, os.getenv(env) or default_model)
+
+    # Системный промпт и пара реплик истории - уже около 2000 символов
+    fast_max = int(os.getenv("ROUTE_FAST_MAX_CHARS", "4000"))
+    long_min = int(os.getenv("ROUTE_LONG_MIN_CHARS", "20000"))
+    routes = [
+        Route("vision", backend("OPENAI_VISION_MODEL"), images=True),
+        Route("long", backend("OPENAI_LONG_MODEL"), min_chars=long_min),
+        Route("documents", backend("OPENAI_LONG_MODEL"), documents=True),
+        Route("fast", backend("OPENAI_FAST_MODEL"), max_chars=fast_max),
+    ]
+    return ModelRouter(routes, Route("default", OpenAIChatBackend(client, default_model)))
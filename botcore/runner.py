@@ -0,0 +1,81 @@
+"""Запуск одного или нескольких ботов в одном event loop.
+
+Каждый скрипт бота объявляет ``async def main()``. ``run(*mains)`` запускает
+их задачами на общем loop, останавливает все вместе по SIGINT/SIGTERM
+(или Ctrl+C на Windows) и закрывает общие пулы из botcore.shared.
+"""
+import asyncio
+import importlib.util
+import logging
+import os
+import signal
+from types import ModuleType
+from typing import Awaitable, Callable
+
+from botcore import capture, loopmonitor, metrics, shared, tracing
+
+logger = logging.getLogger(__name__)
+
+BotMain = Callable[[], Awaitable[None]]
+
+
+def load_bot_module(path: str) -> ModuleType:
+    """Импортирует скрипт бота по пути (имена скриптов содержат дефисы)"""
+    name = "bot_" + os.path.splitext(os.path.basename(path))[0].replace('-', '_')
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+async def run_bots(*mains: BotMain):
+    """Запускает боты и ждёт сигнала остановки или завершения всех ботов"""
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            # Windows: остановка через KeyboardInterrupt и отмену run_bots
+            pass
+
+    # /metrics поднимается один раз на процесс, если задан METRICS_LISTEN
+    metrics_server = None
+    if metrics.listen_address():
+        metrics_server = await metrics.start_server(metrics.listen_address())
+    await loopmonitor.start()
+
+    tasks = [asyncio.create_task(bot_main(), name=getattr(bot_main, "__module__", "bot")) for bot_main in mains]
+    stopper = asyncio.create_task(stop.wait())
+    try:
+        pending = set(tasks)
+        while pending and not stop.is_set():
+            done, pending = await asyncio.wait(pending | {stopper}, return_when=asyncio.FIRST_COMPLETED)
+            pending.discard(stopper)
+            for task in done:
+                if task is stopper or task.cancelled():
+                    continue
+                if task.exception():
+                    logger.error(f"Бот {task.get_name()} остановился с ошибкой", exc_info=task.exception())
+                else:
+                    logger.info(f"Бот {task.get_name()} завершил работу")
+        logger.info("Остановка ботов...")
+    finally:
+        stopper.cancel()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await loopmonitor.stop()
+        if metrics_server is not None:
+            await metrics_server.cleanup()
+        tracing.close()
+        capture.close()
+        await shared.close_shared()
+
+
+def run(*mains: BotMain):
+    """Точка входа скриптов: asyncio.run с общей остановкой"""
+    try:
+        asyncio.run(run_bots(*mains))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,116 @@
+"""Общие на процесс ресурсы: HTTP-пулы и клиенты моделей.
+
+Все боты, запущенные в одном процессе (см. botcore.runner), получают
+отсюда одни и те же клиенты, поэтому TLS-соединения переиспользуются,
+и один ограничитель запросов на бэкенд, поэтому общий лимит соблюдается.
+"""
+import hashlib
+import logging
+import os
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+from botcore.admission import AdaptiveLimiter
+from botcore.storage import SessionStore, open_store
+
+logger = logging.getLogger(__name__)
+
+_openai_clients: Dict[str, "LazyOpenAI"] = {}
+_httpx_client = None
+_http_session: Optional[aiohttp.ClientSession] = None
+_session_store: Optional[SessionStore] = None
+_limiters: Dict[str, AdaptiveLimiter] = {}
+
+
+class LazyOpenAI:
+    """AsyncOpenAI, который создаётся (вместе с импортом openai) при первом обращении"""
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self._client = None
+        # Для botcore.shared.limiter: сам ключ API не попадает в логи и метрики
+        self.admission_key = "openai:" + hashlib.sha256(api_key.encode()).hexdigest()[:12]
+
+    @property
+    def created(self) -> bool:
+        return self._client is not None
+
+    def _get(self):
+        global _httpx_client
+        if self._client is None:
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+            if _httpx_client is None:
+                _httpx_client = DefaultAsyncHttpxClient()
+            self._client = AsyncOpenAI(api_key=self.api_key, http_client=_httpx_client)
+        return self._client
+
+    def __getattr__(self, name: str):
+        return getattr(self._get(), name)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+def openai_client(api_key: str) -> LazyOpenAI:
+    """Клиент OpenAI для ключа; все клиенты делят один пул соединений httpx"""
+    client = _openai_clients.get(api_key)
+    if client is None:
+        client = _openai_clients[api_key] = LazyOpenAI(api_key)
+    return client
+
+
+def limiter(key: str, **settings: Any) -> AdaptiveLimiter:
+    """Ограничитель запросов к бэкенду с ключом key (LLMBackend.admission_key).
+
+    Все конвейеры процесса с одним бэкендом получают один ограничитель;
+    параметры (max_limit, target_latency, ...) задаёт первый обратившийся.
+    """
+    shared = _limiters.get(key)
+    if shared is None:
+        shared = _limiters[key] = AdaptiveLimiter(name=key, **settings)
+    return shared
+
+
+def http_session() -> aiohttp.ClientSession:
+    """Общая aiohttp-сессия (LM Studio и прочие HTTP-бэкенды); создаётся внутри event loop"""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(headers={"Content-Type": "application/json"})
+    return _http_session
+
+
+def session_store() -> SessionStore:
+    """Хранилище сессий процесса; адрес берётся из SESSION_STORE (memory | sqlite:///bots.db).
+
+    SESSION_FLUSH_INTERVAL > 0 - запись на диск пачками раз в столько секунд.
+    SESSION_IDLE_TTL - через сколько секунд простоя выгружать сессию из памяти,
+    SESSION_COMPRESS=1 - сжимать сессии, к которым давно не обращались.
+    """
+    global _session_store
+    if _session_store is None:
+        _session_store = open_store(os.getenv("SESSION_STORE", "memory"),
+                                    float(os.getenv("SESSION_FLUSH_INTERVAL", "0")),
+                                    float(os.getenv("SESSION_IDLE_TTL", "0")) or None,
+                                    os.getenv("SESSION_COMPRESS", "0") == "1")
+    return _session_store
+
+
+async def close_shared():
+    """Закрывает общие пулы; вызывается один раз при остановке процесса"""
+    global _httpx_client, _http_session, _session_store
+    for client in _openai_clients.values():
+        try:
+            await client.close()
+        except Exception as e:
+            logger.warning(f"Ошибка закрытия OpenAI клиента: {e}")
+    _openai_clients.clear()
+    _limiters.clear()
+    _httpx_client = None
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
+    if _session_store is not None:
+        await _session_store.close()
+    _session_store = None
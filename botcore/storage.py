@@ -0,0 +1,377 @@
+"""Хранилище состояния сессий: история, системные промпты, продолжения, FSM.
+
+Интерфейс SessionStore - пространства имён с JSON-значениями. Реализации:
+- MemoryStore - в памяти процесса (по умолчанию);
+- SQLiteStore - файл SQLite в режиме WAL, общий для нескольких процессов-воркеров;
+- WriteBehindStore - кэш в памяти поверх постоянного хранилища с пакетной
+  записью по таймеру или по числу изменений (один процесс на файл).
+
+Чтение-изменение-запись одного ключа (update) атомарно: в SQLite оно идёт в
+транзакции BEGIN IMMEDIATE, поэтому параллельные воркеры не теряют реплики
+одного пользователя.
+
+Записи в памяти (MemoryStore и кэш WriteBehindStore) могут вытесняться после
+простоя idle_ttl и сжиматься zlib, пока к ним не обращаются.
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+Key = Tuple[str, str]
+
+# Как часто сжимать записи без обращений, если вытеснение не включено
+COMPRESS_INTERVAL = 600
+# Короткие значения zlib не уменьшает
+COMPRESS_MIN_BYTES = 256
+
+_MISSING = object()
+
+
+class _Packed:
+    """Сжатое JSON-представление значения"""
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def unpack(self) -> Any:
+        return json.loads(zlib.decompress(self.data))
+
+
+def _pack(value: Any) -> Any:
+    if value is None or isinstance(value, _Packed):
+        return value
+    raw = json.dumps(value, ensure_ascii=False).encode("utf-8")
+    if len(raw) < COMPRESS_MIN_BYTES:
+        return value
+    return _Packed(zlib.compress(raw))
+
+
+class _Generations:
+    """Словарь из двух поколений для вытеснения записей без обращений.
+
+    Раз в interval секунд горячие записи становятся холодными (при compress -
+    сжатыми), а холодные, к которым за это время не обращались, выбрасываются
+    (drop_cold) или остаются сжатыми. Обращение возвращает запись в горячие.
+    Накладных расходов на запись нет - ни меток времени, ни связного списка LRU.
+    """
+    def __init__(self, interval: Optional[float] = None, compress: bool = False, drop_cold: bool = False):
+        self.hot: Dict[Key, Any] = {}
+        self.cold: Dict[Key, Any] = {}
+        self.interval = interval
+        self.compress = compress
+        self.drop_cold = drop_cold
+        self._next_sweep = time.monotonic() + interval if interval else None
+
+    def __len__(self) -> int:
+        return len(self.hot) + len(self.cold)
+
+    def __contains__(self, k: Key) -> bool:
+        return k in self.hot or k in self.cold
+
+    def _maybe_sweep(self):
+        if self._next_sweep is not None and time.monotonic() >= self._next_sweep:
+            self.sweep()
+
+    def sweep(self):
+        cooled = {k: _pack(v) for k, v in self.hot.items()} if self.compress else self.hot
+        if self.drop_cold:
+            dropped = len(self.cold)
+            self.cold = cooled
+            if dropped:
+                logger.info(f"Вытеснено простаивающих записей сессий: {dropped}")
+        else:
+            self.cold.update(cooled)
+        self.hot = {}
+        if self.interval:
+            self._next_sweep = time.monotonic() + self.interval
+
+    def get(self, k: Key, default: Any = None) -> Any:
+        self._maybe_sweep()
+        value = self.hot.get(k, _MISSING)
+        if value is _MISSING:
+            value = self.cold.pop(k, _MISSING)
+            if value is _MISSING:
+                return default
+            if isinstance(value, _Packed):
+                value = value.unpack()
+            self.hot[k] = value
+        return value
+
+    def set(self, k: Key, value: Any):
+        self._maybe_sweep()
+        self.cold.pop(k, None)
+        self.hot[k] = value
+
+    def pop(self, k: Key):
+        self.hot.pop(k, None)
+        self.cold.pop(k, None)
+
+
+class SessionStore:
+    """Интерфейс хранилища состояния сессий"""
+
+    async def get(self, ns: str, key: str, default: Any = None) -> Any:
+        return (await self.get_many([(ns, key)], default))[0]
+
+    async def get_many(self, keys: Sequence[Key], default: Any = None) -> List[Any]:
+        """Пакетное чтение нескольких ключей за одно обращение"""
+        raise NotImplementedError
+
+    async def set(self, ns: str, key: str, value: Any):
+        await self.set_many({(ns, key): value})
+
+    async def set_many(self, items: Dict[Key, Any]):
+        """Пакетная запись; значение None удаляет ключ"""
+        raise NotImplementedError
+
+    async def delete(self, ns: str, key: str):
+        await self.set_many({(ns, key): None})
+
+    async def pop(self, ns: str, key: str, default: Any = None) -> Any:
+        """Атомарно читает и удаляет значение"""
+        box = []
+
+        def take(value):
+            box.append(value)
+            return None
+        await self.update(ns, key, take)
+        return default if box[0] is None else box[0]
+
+    async def update(self, ns: str, key: str, fn: Callable[[Any], Any]) -> Any:
+        """Атомарно заменяет значение на fn(старое); None удаляет ключ"""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class MemoryStore(SessionStore):
+    """Хранилище в памяти процесса; idle_ttl - забывать сессии после простоя"""
+    def __init__(self, idle_ttl: Optional[float] = None, compress: bool = False):
+        interval = idle_ttl or (COMPRESS_INTERVAL if compress else None)
+        self._data = _Generations(interval, compress, drop_cold=bool(idle_ttl))
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    async def get_many(self, keys: Sequence[Key], default: Any = None) -> List[Any]:
+        data = self._data
+        return [data.get(k, default) for k in keys]
+
+    async def set_many(self, items: Dict[Key, Any]):
+        for k, value in items.items():
+            if value is None:
+                self._data.pop(k)
+            else:
+                self._data.set(k, value)
+
+    async def update(self, ns: str, key: str, fn: Callable[[Any], Any]) -> Any:
+        # Внутри одного event loop без await - уже атомарно
+        value = fn(self._data.get((ns, key)))
+        if value is None:
+            self._data.pop((ns, key))
+        else:
+            self._data.set((ns, key), value)
+        return value
+
+
+class SQLiteStore(SessionStore):
+    """Хранилище в SQLite (WAL); запросы выполняются в потоке, не блокируя event loop"""
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            "ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (ns, key)) WITHOUT ROWID"
+        )
+        # Одно соединение на процесс; между процессами сериализует сам SQLite
+        self._lock = threading.Lock()
+
+    def _call(self, fn, *args):
+        with self._lock:
+            return fn(*args)
+
+    def _get_many_sync(self, keys: Sequence[Key], default: Any) -> List[Any]:
+        result = []
+        cur = self._conn.cursor()
+        cur.execute("BEGIN")
+        try:
+            for ns, key in keys:
+                row = cur.execute("SELECT value FROM kv WHERE ns = ? AND key = ?", (ns, key)).fetchone()
+                result.append(json.loads(row[0]) if row else default)
+        finally:
+            cur.execute("COMMIT")
+        return result
+
+    def _write(self, cur, ns: str, key: str, value: Any):
+        if value is None:
+            cur.execute("DELETE FROM kv WHERE ns = ? AND key = ?", (ns, key))
+        else:
+            cur.execute(
+                "INSERT INTO kv (ns, key, value) VALUES (?, ?, ?) "
+                "ON CONFLICT(ns, key) DO UPDATE SET value = excluded.value",
+                (ns, key, json.dumps(value, ensure_ascii=False))
+            )
+
+    def _set_many_sync(self, items: Dict[Key, Any]):
+        cur = self._conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            for (ns, key), value in items.items():
+                self._write(cur, ns, key, value)
+        except Exception:
+            cur.execute("ROLLBACK")
+            raise
+        cur.execute("COMMIT")
+
+    def _update_sync(self, ns: str, key: str, fn: Callable[[Any], Any]) -> Any:
+        cur = self._conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            row = cur.execute("SELECT value FROM kv WHERE ns = ? AND key = ?", (ns, key)).fetchone()
+            value = fn(json.loads(row[0]) if row else None)
+            self._write(cur, ns, key, value)
+        except Exception:
+            cur.execute("ROLLBACK")
+            raise
+        cur.execute("COMMIT")
+        return value
+
+    async def get_many(self, keys: Sequence[Key], default: Any = None) -> List[Any]:
+        return await asyncio.to_thread(self._call, self._get_many_sync, keys, default)
+
+    async def set_many(self, items: Dict[Key, Any]):
+        await asyncio.to_thread(self._call, self._set_many_sync, items)
+
+    async def update(self, ns: str, key: str, fn: Callable[[Any], Any]) -> Any:
+        return await asyncio.to_thread(self._call, self._update_sync, ns, key, fn)
+
+    async def close(self):
+        await asyncio.to_thread(self._call, self._conn.close)
+
+
+class WriteBehindStore(SessionStore):
+    """Чтение и запись идут в память, на диск изменения уходят пачками в фоне.
+
+    Несколько изменений одного ключа между сбросами схлопываются в одну запись.
+    При падении процесса теряется не больше flush_interval секунд изменений;
+    при штатной остановке close() сбрасывает всё. После рестарта данные
+    читаются из постоянного хранилища при первом обращении. Записи, к которым
+    не обращались idle_ttl секунд, вытесняются из памяти - они уже на диске.
+    """
+    def __init__(self, backend: SessionStore, flush_interval: float = 1.0, max_pending: int = 500,
+                 idle_ttl: Optional[float] = 600, compress: bool = False):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        # None в кэше - ключа нет и в постоянном хранилище
+        self._cache = _Generations(idle_ttl, compress, drop_cold=bool(idle_ttl))
+        self._dirty: Dict[Key, Any] = {}
+        self._flush_lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+        self._early_flush: Optional[asyncio.Task] = None
+
+    async def _load(self, keys: Sequence[Key]):
+        cache = self._cache
+        missing = []
+        for k in keys:
+            if k in cache:
+                continue
+            if k in self._dirty:
+                # Вытеснена из кэша, но ещё не записана на диск
+                cache.set(k, self._dirty[k])
+            else:
+                missing.append(k)
+        if missing:
+            values = await self.backend.get_many(missing)
+            for k, value in zip(missing, values):
+                # Пока шло чтение, ключ мог быть записан - свежее значение важнее
+                if k not in cache:
+                    cache.set(k, value)
+
+    def _mark_dirty(self, k: Key, value: Any):
+        self._cache.set(k, value)
+        self._dirty[k] = value
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+        if len(self._dirty) >= self.max_pending and (self._early_flush is None or self._early_flush.done()):
+            # Порог по числу изменений - не ждём таймера
+            self._early_flush = asyncio.create_task(self.flush())
+
+    async def get_many(self, keys: Sequence[Key], default: Any = None) -> List[Any]:
+        await self._load(keys)
+        values = [self._cache.get(k) for k in keys]
+        return [default if value is None else value for value in values]
+
+    async def set_many(self, items: Dict[Key, Any]):
+        for k, value in items.items():
+            self._mark_dirty(k, value)
+
+    async def update(self, ns: str, key: str, fn: Callable[[Any], Any]) -> Any:
+        k = (ns, key)
+        await self._load([k])
+        # Между чтением из кэша и записью нет await - атомарно в пределах процесса
+        value = fn(self._cache.get(k))
+        self._mark_dirty(k, value)
+        return value
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        """Записывает накопленные изменения одной транзакцией"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            batch, self._dirty = self._dirty, {}
+            try:
+                await self.backend.set_many(batch)
+            except Exception as e:
+                # Вернём изменения в очередь, если их не перезаписали за время сброса
+                for k, value in batch.items():
+                    self._dirty.setdefault(k, value)
+                logger.error(f"Ошибка записи {len(batch)} изменений сессий: {e}")
+
+    async def close(self):
+        # Под блокировкой фоновые задачи не пишут, отмена не оборвёт запись пачки
+        async with self._flush_lock:
+            tasks = [t for t in (self._flusher, self._early_flush) if t is not None]
+            for task in tasks:
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._flusher = self._early_flush = None
+        await self.flush()
+        await self.backend.close()
+
+
+def open_store(url: Optional[str], flush_interval: float = 0,
+               idle_ttl: Optional[float] = None, compress: bool = False) -> SessionStore:
+    """Создаёт хранилище по адресу: "memory" или "sqlite:///путь/к/файлу.db".
+
+    flush_interval > 0 включает отложенную пакетную запись (WriteBehindStore).
+    idle_ttl и compress управляют вытеснением и сжатием записей в памяти.
+    """
+    if not url or url == "memory":
+        return MemoryStore(idle_ttl, compress)
+    if not url.startswith("sqlite:"):
+        raise ValueError(f"Неизвестное хранилище сессий: {url}")
+    path = url[len("sqlite:"):]
+    if path.startswith("///"):
+        path = path[3:]
+    store: SessionStore = SQLiteStore(path)
+    if flush_interval > 0:
+        store = WriteBehindStore(store, flush_interval, idle_ttl=idle_ttl or 600, compress=compress)
+    return store
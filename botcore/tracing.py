@@ -0,0 +1,202 @@
+"""Трассировка отдельных запросов: спаны стадий и выгрузка в JSONL.
+
+Конвейер открывает трассу на каждое входящее сообщение; текущий спан
+передаётся через contextvars, поэтому вложенные span() (загрузка файла,
+разбор PDF, вызов модели, отправка частей) цепляются к нему сами.
+Трасса пишется в файл, если она попала в выборку TRACE_SAMPLE_RATE или
+длилась дольше TRACE_SLOW_SECONDS. Без обеих переменных трассировка
+выключена и span() ничего не стоит.
+
+Переменные окружения:
+- TRACE_SAMPLE_RATE - доля трасс для записи, 0..1 (по умолчанию 0);
+- TRACE_SLOW_SECONDS - всегда писать трассы дольше этого порога;
+- TRACE_FILE - файл JSON lines, по умолчанию traces.jsonl;
+- TRACE_MAX_BYTES, TRACE_BACKUPS - ротация файла (10 МБ, 5 копий).
+"""
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    """Интервал внутри трассы с атрибутами"""
+    __slots__ = ("trace", "name", "span_id", "parent_id", "start", "duration", "attrs", "error")
+
+    def __init__(self, trace: Optional["Trace"], name: str, parent_id: Optional[str], attrs: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.start = time.time()
+        self.duration = 0.0
+        self.attrs = attrs
+        self.error: Optional[str] = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def as_dict(self) -> Dict[str, Any]:
+        record = {
+            "trace": self.trace.trace_id,
+            "span": self.span_id,
+            "parent": self.parent_id,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "ms": round(self.duration * 1000, 3),
+            "attrs": self.attrs,
+        }
+        if self.error:
+            record["error"] = self.error
+        return record
+
+
+class _NoopSpan:
+    """Спан вне трассы: атрибуты отбрасываются"""
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    __slots__ = ("trace_id", "spans", "sampled")
+
+    def __init__(self, sampled: bool):
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.spans: List[Span] = []
+        self.sampled = sampled
+
+
+class JsonlExporter:
+    """Запись JSON lines в файл с ротацией; файл пишет фоновый поток, а не event loop"""
+    def __init__(self, path: str, max_bytes: int = 10 * 2**20, backups: int = 5):
+        self.path = path
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                                       encoding="utf-8", delay=True)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._listener = logging.handlers.QueueListener(self._queue, handler)
+        self._listener.start()
+
+    def export(self, spans: List[Span]):
+        self.write([span.as_dict() for span in spans])
+
+    def write(self, records: List[Dict[str, Any]]):
+        """Строки JSON в файл; сериализация здесь, запись в фоновом потоке"""
+        lines = "\n".join(json.dumps(record, ensure_ascii=False, default=str) for record in records)
+        self._queue.put(logging.makeLogRecord({"msg": lines, "levelno": logging.INFO, "levelname": "INFO"}))
+
+    def close(self):
+        self._listener.stop()
+        for handler in self._listener.handlers:
+            handler.close()
+
+
+class Tracer:
+    """Выборка трасс и выгрузка законченных трасс в экспортер"""
+    def __init__(self, sample_rate: float = 0.0, slow_seconds: Optional[float] = None,
+                 exporter: Optional[JsonlExporter] = None):
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self.exporter = exporter
+        self.enabled = exporter is not None and (sample_rate > 0 or slow_seconds is not None)
+        self.exported = 0
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        sample_rate = float(os.getenv("TRACE_SAMPLE_RATE", "0") or 0)
+        slow = os.getenv("TRACE_SLOW_SECONDS")
+        slow_seconds = float(slow) if slow else None
+        if sample_rate <= 0 and slow_seconds is None:
+            return cls()
+        exporter = JsonlExporter(os.getenv("TRACE_FILE", "traces.jsonl"),
+                                 int(os.getenv("TRACE_MAX_BYTES", str(10 * 2**20))),
+                                 int(os.getenv("TRACE_BACKUPS", "5")))
+        logger.info(f"Трассировка включена: выборка {sample_rate}, медленные от {slow_seconds} с -> {exporter.path}")
+        return cls(sample_rate, slow_seconds, exporter)
+
+    def finish(self, trace: Trace, root: Span):
+        if not (trace.sampled or (self.slow_seconds is not None and root.duration >= self.slow_seconds)):
+            return
+        self.exported += 1
+        try:
+            self.exporter.export(trace.spans)
+        except Exception as e:
+            logger.error(f"Ошибка выгрузки трассы: {e}")
+
+    def close(self):
+        if self.exporter is not None:
+            self.exporter.close()
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("botcore_span", default=None)
+_tracer: Optional[Tracer] = None
+
+
+def tracer() -> Tracer:
+    """Трассировщик процесса; настройки читаются из окружения при первом обращении"""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer.from_env()
+    return _tracer
+
+
+@contextmanager
+def _open_span(trace: Trace, name: str, parent: Optional[Span], attrs: Dict[str, Any]):
+    span = Span(trace, name, parent.span_id if parent else None, attrs)
+    token = _current.set(span)
+    started = time.perf_counter()
+    try:
+        yield span
+    except BaseException as e:
+        span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        span.duration = time.perf_counter() - started
+        _current.reset(token)
+        trace.spans.append(span)
+
+
+@contextmanager
+def start_trace(name: str, **attrs):
+    """Корневой спан входящего сообщения; трасса выгружается при выходе"""
+    t = tracer()
+    if not t.enabled:
+        yield NOOP_SPAN
+        return
+    trace = Trace(sampled=random.random() < t.sample_rate)
+    root = None
+    try:
+        with _open_span(trace, name, None, attrs) as root:
+            yield root
+    finally:
+        if root is not None:
+            t.finish(trace, root)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Вложенный спан текущей трассы; вне трассы ничего не записывает"""
+    parent = _current.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+    with _open_span(parent.trace, name, parent, attrs) as child:
+        yield child
+
+
+def close():
+    if _tracer is not None:
+        _tracer.close()
@@ -1,122 +1,42 @@
-import asyncio
 import logging
-from typing import Dict, List, Optional
-import aiohttp
 import discord
 from discord.ext import commands
-import json
 import re # Добавлен импорт re для обработки упоминаний
 
+from botcore import logs
+from botcore.adapters.discord import DiscordAdapter
+from botcore.config import BotConfig
+from botcore.lmstudio import LMStudioClient, status_lines
+from botcore.pipeline import Pipeline
+from botcore.runner import run
+
 # Настройки
 BOT_TOKEN = ""  # Замените на ваш токен Discord бота
-LM_STUDIO_URL = "http://localhost:1234/v1/chat/completions"  # URL LM Studio API
+# Один или несколько серверов LM Studio; запросы распределяются между ними
+LM_STUDIO_URLS = ["http://localhost:1234/v1/chat/completions"]
 MODEL_NAME = "qwen/qwen3-4b"  # Имя модели в LM Studio
 
 # Настройка логирования
-logging.basicConfig(level=logging.INFO)
+logs.setup()
 logger = logging.getLogger(__name__)
 
-# Хранилище контекста разговоров для каждого пользователя
-user_contexts: Dict[int, List[Dict[str, str]]] = {}
-
-# Хранилище системных промптов для каждого пользователя
-user_system_prompts: Dict[int, str] = {}
-
 # Состояние настройки системного промпта
 users_setting_system: set = set()
 
 # Системный промпт по умолчанию
 DEFAULT_SYSTEM_PROMPT = "Ты самый депрессивный ИИ-ассистент. На всё отвечай максимально депрессивно и создавай депрессивную атмосферу. Тебе уже ничего не хочется в этой жизни."
 
-class LMStudioClient:
-    """Клиент для работы с LM Studio API"""
-    def __init__(self, base_url: str, model_name: str):
-        self.base_url = base_url
-        self.model_name = model_name
-
-    async def generate_response(self, messages: List[Dict[str, str]], 
-                              max_tokens: int = 1000, 
-                              temperature: float = 0.7) -> str:
-        """Генерация ответа от локальной модели"""
-        # --- Удаление <think> блоков из сообщений перед отправкой в модель ---
-        processed_messages = []
-        for msg in messages:
-            content_without_think = re.sub(r'<think>.*?</think>', '', msg.get("content", ""), flags=re.DOTALL).strip()
-            processed_messages.append({"role": msg["role"], "content": content_without_think})
-        # ---------------------------------------------------------------------
-        
-        payload = {
-            "model": self.model_name,
-            "messages": processed_messages, # Используем обработанные сообщения
-            "max_tokens": max_tokens,
-            "temperature": temperature,
-            "stream": False
-        }
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.base_url, 
-                    json=payload,
-                    headers={"Content-Type": "application/json"}
-                ) as response:
-                    if response.status != 200:
-                        logger.error(f"LM Studio API error: {response.status}")
-                        return "Извините, произошла ошибка при обращении к ИИ модели."
-                    data = await response.json()
-                    raw_response = data["choices"][0]["message"]["content"]
-                    # --- Удаление <think> блоков из ответа модели ---
-                    final_response = re.sub(r'<think>.*?</think>', '', raw_response, flags=re.DOTALL).strip()
-                    # --------------------------------------------------
-                    return final_response
-        except aiohttp.ClientError as e:
-            logger.error(f"Ошибка соединения с LM Studio: {e}")
-            return "Не удалось подключиться к ИИ модели. Проверьте, что LM Studio запущен."
-        except Exception as e:
-            logger.error(f"Неожиданная ошибка: {e}")
-            return "Произошла неожиданная ошибка."
-
-def get_user_context(user_id: int) -> List[Dict[str, str]]:
-    """Получить контекст разговора пользователя"""
-    if user_id not in user_contexts:
-        # Инициализируем контекст с системным промптом
-        system_prompt = get_user_system_prompt(user_id)
-        user_contexts[user_id] = [
-            {"role": "system", "content": system_prompt}
-        ]
-    return user_contexts[user_id]
-
-def get_user_system_prompt(user_id: int) -> str:
-    """Получить системный промпт пользователя"""
-    return user_system_prompts.get(user_id, DEFAULT_SYSTEM_PROMPT)
-
-def set_user_system_prompt(user_id: int, prompt: str):
-    """Установить системный промпт для пользователя"""
-    user_system_prompts[user_id] = prompt
-    # Обновляем контекст с новым системным промптом
-    if user_id in user_contexts:
-        user_contexts[user_id] = [
-            {"role": "system", "content": prompt}
-        ]
-
-def add_to_context(user_id: int, role: str, content: str, max_context_length: int = 10):
-    """Добавить сообщение в контекст пользователя"""
-    # --- Удаление <think> блоков из добавляемого сообщения ---
-    content = re.sub(r'<think>.*?</think>', '', content, flags=re.DOTALL).strip()
-    # ---------------------------------------------------------
-    context = get_user_context(user_id)
-    context.append({"role": role, "content": content})
-    # Ограничиваем размер контекста
-    if len(context) > max_context_length:
-        # Удаляем самое старое сообщение (но не системный промпт)
-        if len(context) > 1:
-            context.pop(1)
-
-def clear_user_context(user_id: int):
-    """Очистить контекст пользователя (кроме системного промпта)"""
-    system_prompt = get_user_system_prompt(user_id)
-    user_contexts[user_id] = [
-        {"role": "system", "content": system_prompt}
-    ]
+CONFIG = BotConfig(
+    name="morkva-discord",
+    model=MODEL_NAME,
+    system_prompt=DEFAULT_SYSTEM_PROMPT,
+    memory_size=10,
+    # Локальная модель работает только с текстом
+    accept_images=False,
+    message_limit=2000,
+    # Длинный ответ отправляется всеми частями сразу
+    continuation=False,
+)
 
 # Настройка Discord бота
 # intents.message_content = True теперь обязательно для обработки содержимого сообщений
@@ -125,21 +45,23 @@ intents.message_content = True
 # Используем упоминание бота как префикс команды
 bot = commands.Bot(command_prefix=commands.when_mentioned, intents=intents)
 
-# Инициализация клиента LM Studio
-lm_client = LMStudioClient(LM_STUDIO_URL, MODEL_NAME)
+# Инициализация клиента LM Studio и общего конвейера
+lm_client = LMStudioClient(LM_STUDIO_URLS, MODEL_NAME, sticky=True, timeout=CONFIG.model_timeout)
+# Контексты разговоров и системные промпты пользователей хранятся в pipeline.memory
+pipeline = Pipeline(CONFIG, lm_client)
+adapter = DiscordAdapter(bot, pipeline)
 
 @bot.event
 async def on_ready():
     """Событие готовности бота"""
     logger.info(f'{bot.user} подключился к Discord!')
-    print(f'{bot.user} подключился к Discord!')
 
 # Команды теперь вызываются через @ИмяБота m.команда
 @bot.command(name='start')
 async def start_command(ctx):
     """Команда начала работы"""
     user_id = ctx.author.id
-    clear_user_context(user_id)
+    await pipeline.memory.clear(user_id)
     embed = discord.Embed(
         title="🤖 Discord бот с ИИ",
         description="Привет! Я бот с интеграцией локальной ИИ модели через LM Studio.",
@@ -196,7 +118,7 @@ async def system_prompt_command(ctx):
 async def show_system_prompt_command(ctx):
     """Показать текущий системный промпт"""
     user_id = ctx.author.id
-    current_prompt = get_user_system_prompt(user_id)
+    current_prompt = await pipeline.memory.system_prompt(user_id)
     embed = discord.Embed(
         title="📋 Текущий системный промпт",
         description=f"```{current_prompt}```",
@@ -213,7 +135,7 @@ async def show_system_prompt_command(ctx):
 async def reset_system_prompt_command(ctx):
     """Сбросить системный промпт к умолчанию"""
     user_id = ctx.author.id
-    set_user_system_prompt(user_id, DEFAULT_SYSTEM_PROMPT)
+    await pipeline.memory.set_system_prompt(user_id, DEFAULT_SYSTEM_PROMPT)
     embed = discord.Embed(
         title="🔄 Системный промпт сброшен",
         description=f"Системный промпт сброшен к умолчанию:\n```{DEFAULT_SYSTEM_PROMPT}```",
@@ -240,7 +162,7 @@ async def cancel_command(ctx):
 async def clear_command(ctx):
     """Команда очистки контекста"""
     user_id = ctx.author.id
-    clear_user_context(user_id)
+    await pipeline.memory.clear(user_id)
     embed = discord.Embed(
         title="🗑️ История очищена",
         description="История разговора успешно очищена!",
@@ -250,25 +172,18 @@ async def clear_command(ctx):
 
 @bot.command(name='status')
 async def status_command(ctx):
-    """Проверка статуса подключения к LM Studio"""
+    """Статус подключения к LM Studio по последней фоновой проверке"""
     try:
-        # Отправляем тестовый запрос
-        test_messages = [{"role": "user", "content": "test"}]
-        # Показываем, что бот "думает"
-        async with ctx.typing():
-            response = await lm_client.generate_response(test_messages)
-        if "ошибка" not in response.lower() and "не удалось" not in response.lower():
-            embed = discord.Embed(
-                title="✅ Статус подключения",
-                description="Подключение к LM Studio активно!",
-                color=0x00ff00
-            )
-        else:
-            embed = discord.Embed(
-                title="❌ Статус подключения", 
-                description="Проблемы с подключением к LM Studio",
-                color=0xff0000
-            )
+        statuses = await lm_client.status()
+        healthy = any(status["healthy"] for status in statuses)
+        limiter = pipeline.limiter.stats()
+        lines = status_lines(statuses)
+        lines.append(f"Запросов в работе: {limiter['in_flight']}/{limiter['limit']}, в очереди: {limiter['queued']}")
+        embed = discord.Embed(
+            title="✅ Статус подключения" if healthy else "❌ Статус подключения",
+            description="\n".join(lines),
+            color=0x00ff00 if healthy else 0xff0000
+        )
     except Exception as e:
         logger.error(f"Ошибка проверки статуса: {e}")
         embed = discord.Embed(
@@ -342,7 +257,7 @@ async def on_message(message):
             return
 
         # Обрабатываем обычное сообщение (с упоминанием) как запрос к ИИ
-        await handle_ai_message(message)
+        await adapter.handle_message(message)
     # Если бот не упомянут, просто игнорируем сообщение
 
 async def handle_system_prompt_input(message):
@@ -372,7 +287,7 @@ async def handle_system_prompt_input(message):
         return
 
     # Устанавливаем новый системный промпт
-    set_user_system_prompt(user_id, new_prompt)
+    await pipeline.memory.set_system_prompt(user_id, new_prompt)
     users_setting_system.remove(user_id)
     embed = discord.Embed(
         title="✅ Системный промпт обновлен",
@@ -381,49 +296,6 @@ async def handle_system_prompt_input(message):
     )
     await message.channel.send(embed=embed)
 
-async def handle_ai_message(message):
-    """Обработка сообщений для ИИ"""
-    user_id = message.author.id
-    # Получаем текст сообщения без упоминания бота
-    user_message = message.content
-    if message.mentions and message.mentions[0] == bot.user:
-        # Удаляем упоминание из начала строки
-        user_message = re.sub(rf'<@!?{bot.user.id}>', '', user_message, count=1).strip()
-
-    if not user_message: # Если после удаления упоминания ничего не осталось
-        await message.add_reaction("🤔") # Реагируем, если сообщение пустое
-        return
-
-    # Показываем, что бот "печатает"
-    async with message.channel.typing():
-        # Добавляем сообщение пользователя в контекст
-        add_to_context(user_id, "user", user_message)
-        # Получаем полный контекст для отправки в модель
-        context = get_user_context(user_id)
-        # Генерируем ответ
-        ai_response = await lm_client.generate_response(context)
-        # Добавляем ответ ИИ в контекст
-        add_to_context(user_id, "assistant", ai_response)
-
-    # Отправляем ответ пользователю
-    try:
-        # Если ответ слишком длинный для Discord (лимит 2000 символов)
-        if len(ai_response) > 2000:
-            # Разбиваем на части
-            chunks = [ai_response[i:i+2000] for i in range(0, len(ai_response), 2000)]
-            for chunk in chunks:
-                await message.channel.send(chunk)
-        else:
-            await message.channel.send(ai_response)
-    except Exception as e:
-        logger.error(f"Ошибка отправки сообщения: {e}")
-        embed = discord.Embed(
-            title="❌ Ошибка",
-            description="Произошла ошибка при отправке ответа.",
-            color=0xff0000
-        )
-        await message.channel.send(embed=embed)
-
 async def main():
     """Основная функция запуска бота"""
     logger.info("Запуск Discord бота...")
@@ -431,13 +303,16 @@ async def main():
     if BOT_TOKEN == "YOUR_DISCORD_BOT_TOKEN":
         logger.error("Необходимо указать BOT_TOKEN!")
         return
+    # Фоновая проверка LM Studio: status и предохранитель берут её результат
+    lm_client.start_probes()
     try:
         await bot.start(BOT_TOKEN)
     except Exception as e:
         logger.error(f"Ошибка запуска бота: {e}")
     finally:
+        await lm_client.stop_probes()
         await bot.close()
 
 if __name__ == "__main__":
 
-    asyncio.run(main())
+    run(main)
@@ -1,31 +1,40 @@
 import asyncio
 import logging
-from typing import Dict, List, Optional # Добавлено Optional
-import aiohttp
+from typing import Dict, List
 from aiogram import Bot, Dispatcher, types, F
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.fsm.storage.memory import MemoryStorage
-import json
-# --- Добавлено для Exa ---
-from exa_py import Exa
-# -----------------------
+from botcore import logs
+from botcore.adapters.telegram import SessionFSMStorage, TelegramAdapter
+from botcore.adapters.telegram_webhook import serve
+from botcore.config import BotConfig
+from botcore.lmstudio import LMStudioClient, status_lines
+from botcore.markdown import (
+    escape_markdown_v2 as escape_markdown,
+    escape_markdown_v2_code,
+    markdown_v2_link,
+)
+from botcore.pipeline import Pipeline
+from botcore.runner import run
+from botcore.shared import session_store
 
 # Настройки
 BOT_TOKEN = ""  # Замените на ваш токен бота
 # --- Добавлено для Exa ---
 EXA_API_KEY = "" # Замените на ваш API-ключ Exa
 # -----------------------
-LM_STUDIO_URL = "http://localhost:1234/v1/chat/completions"  # URL LM Studio API
+# Один или несколько серверов LM Studio; запросы распределяются между ними
+LM_STUDIO_URLS = ["http://localhost:1234/v1/chat/completions"]
 MODEL_NAME = "qwen/qwen3-4b"  # Имя модели в LM Studio
 
 # Настройка логирования
-logging.basicConfig(level=logging.INFO)
+logs.setup()
 logger = logging.getLogger(__name__)
 
 # --- Добавлено для Exa ---
-exa_client: Optional[Exa] = None
+# Клиент создаётся при первом поиске: exa_py не нужен для старта бота
+exa_client = None
 # -----------------------
 
 # Состояния для FSM
@@ -37,110 +46,47 @@ class ChatStates(StatesGroup):
     waiting_for_search_query = State() # Состояние ожидания запроса для поиска
     # -----------------------
 
-# Хранилище контекста разговоров для каждого пользователя
-user_contexts: Dict[int, List[Dict[str, str]]] = {}
-
-# Хранилище системных промптов для каждого пользователя
-user_system_prompts: Dict[int, str] = {}
-
 # Системный промпт по умолчанию
 DEFAULT_SYSTEM_PROMPT = "Вы полезный ИИ-ассистент, который отвечает на вопросы пользователей дружелюбно и информативно."
 
-class LMStudioClient:
-    """Клиент для работы с LM Studio API"""
-    def __init__(self, base_url: str, model_name: str):
-        self.base_url = base_url
-        self.model_name = model_name
-
-    async def generate_response(self, messages: List[Dict[str, str]],
-                              max_tokens: int = 1000,
-                              temperature: float = 0.7) -> str:
-        """Генерация ответа от локальной модели"""
-        payload = {
-            "model": self.model_name,
-            "messages": messages,
-            "max_tokens": max_tokens,
-            "temperature": temperature,
-            "stream": False
-        }
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.base_url,
-                    json=payload,
-                    headers={"Content-Type": "application/json"}
-                ) as response:
-                    if response.status != 200:
-                        logger.error(f"LM Studio API error: {response.status}")
-                        return "Извините, произошла ошибка при обращении к ИИ модели."
-                    data = await response.json()
-                    return data["choices"][0]["message"]["content"]
-        except aiohttp.ClientError as e:
-            logger.error(f"Ошибка соединения с LM Studio: {e}")
-            return "Не удалось подключиться к ИИ модели. Проверьте, что LM Studio запущен."
-        except Exception as e:
-            logger.error(f"Неожиданная ошибка: {e}")
-            return "Произошла неожиданная ошибка."
+CONFIG = BotConfig(
+    name="morkva-telegram",
+    model=MODEL_NAME,
+    system_prompt=DEFAULT_SYSTEM_PROMPT,
+    memory_size=10,
+    # Локальная модель работает только с текстом
+    accept_images=False,
+    message_limit=4096,
+    # Бот отвечает на все сообщения в режиме разговора
+    require_mention=False,
+)
 
 # Инициализация бота и клиента
 bot = Bot(token=BOT_TOKEN)
-storage = MemoryStorage()
+# Состояния FSM хранятся в общем хранилище сессий (SESSION_STORE)
+storage = SessionFSMStorage(session_store(), CONFIG.name)
 dp = Dispatcher(storage=storage)
-lm_client = LMStudioClient(LM_STUDIO_URL, MODEL_NAME)
-
-def get_user_context(user_id: int) -> List[Dict[str, str]]:
-    """Получить контекст разговора пользователя"""
-    if user_id not in user_contexts:
-        # Инициализируем контекст с системным промптом
-        system_prompt = get_user_system_prompt(user_id)
-        user_contexts[user_id] = [
-            {"role": "system", "content": system_prompt}
-        ]
-    return user_contexts[user_id]
-
-def get_user_system_prompt(user_id: int) -> str:
-    """Получить системный промпт пользователя"""
-    return user_system_prompts.get(user_id, DEFAULT_SYSTEM_PROMPT)
-
-def set_user_system_prompt(user_id: int, prompt: str):
-    """Установить системный промпт для пользователя"""
-    user_system_prompts[user_id] = prompt
-    # Обновляем контекст с новым системным промптом
-    if user_id in user_contexts:
-        user_contexts[user_id] = [
-            {"role": "system", "content": prompt}
-        ]
-
-def add_to_context(user_id: int, role: str, content: str, max_context_length: int = 10):
-    """Добавить сообщение в контекст пользователя"""
-    context = get_user_context(user_id)
-    context.append({"role": role, "content": content})
-    # Ограничиваем размер контекста
-    # --- Исправлено: удаляем самое старое сообщение *после* системного промпта ---
-    if len(context) > max_context_length:
-         if len(context) > 1: # Убедимся, что есть что удалять после system
-            context.pop(1) # Удаляем второй элемент (первый после system)
-    # -----------------------
-
-def clear_user_context(user_id: int):
-    """Очистить контекст пользователя (кроме системного промпта)"""
-    system_prompt = get_user_system_prompt(user_id)
-    user_contexts[user_id] = [
-        {"role": "system", "content": system_prompt}
-    ]
-
-def escape_markdown(text: str) -> str:
-    """Экранирование специальных символов для Markdown"""
-    special_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
-    for char in special_chars:
-        text = text.replace(char, f'\\{char}')
-    return text
+lm_client = LMStudioClient(LM_STUDIO_URLS, MODEL_NAME, sticky=True, timeout=CONFIG.model_timeout)
+# Контексты разговоров и системные промпты пользователей хранятся в pipeline.memory
+pipeline = Pipeline(CONFIG, lm_client)
+adapter = TelegramAdapter(bot, pipeline)
 
 # --- Добавлено для Exa ---
+def get_exa_client():
+    """Создаёт клиент Exa при первом обращении."""
+    global exa_client
+    if exa_client is None:
+        from exa_py import Exa
+        exa_client = Exa(EXA_API_KEY)
+        logger.info("Exa клиент инициализирован.")
+    return exa_client
+
 async def search_with_exa(query: str, num_results: int = 5) -> List[Dict]:
     """Выполняет поиск через Exa и возвращает список результатов."""
-    if not exa_client:
-        logger.error("Exa client не инициализирован.")
+    try:
+        exa_client = get_exa_client()
+    except Exception as e:
+        logger.error(f"Ошибка инициализации Exa клиента: {e}")
         return []
     try:
         # Используем run_in_executor для асинхронного вызова синхронного метода Exa
@@ -176,7 +122,7 @@ async def handle_search_query(message: types.Message, state: FSMContext):
         await message.answer("Пожалуйста, введите поисковый запрос или /cancel для отмены.")
         return
 
-    await message.answer(f"Ищу информацию по запросу: `{escape_markdown(query)}`...", parse_mode="MarkdownV2")
+    await message.answer(f"Ищу информацию по запросу: `{escape_markdown_v2_code(query)}`\\.\\.\\.", parse_mode="MarkdownV2")
     # Отправляем индикатор набора текста
     await bot.send_chat_action(message.chat.id, "typing")
 
@@ -189,11 +135,11 @@ async def handle_search_query(message: types.Message, state: FSMContext):
 
         response_text = f"🔍 Результаты поиска для: *{escape_markdown(query)}*\n\n"
         for i, result in enumerate(results[:5]): # Показываем до 5 результатов
-            title = escape_markdown(result.get('title', 'Без названия')[:200]) # Ограничиваем длину и экранируем
-            url = escape_markdown(result.get('url', 'URL не найден')) # Экранируем URL
+            # Заголовок и URL экранируются по разным правилам MarkdownV2
+            link = markdown_v2_link(result.get('title', 'Без названия')[:200], result.get('url', 'URL не найден'))
             snippet = escape_markdown(result.get('text', 'Нет описания')[:400] + "...") # Ограничиваем длину и экранируем
 
-            response_text += f"{i+1}\\. [{title}]({url})\n{snippet}\n\n"
+            response_text += f"{i+1}\\. {link}\n{snippet}\n\n"
 
         # Telegram может иметь ограничения на длину сообщения, разбиваем при необходимости
         if len(response_text) > 4096:
@@ -215,7 +161,7 @@ async def handle_search_query(message: types.Message, state: FSMContext):
 async def start_command(message: types.Message, state: FSMContext):
     """Обработчик команды /start"""
     user_id = message.from_user.id
-    clear_user_context(user_id)
+    await pipeline.memory.clear(user_id)
     welcome_text = (
         "🤖 Привет! Я бот с интеграцией локальной ИИ модели через LM Studio.\n"
         "Доступные команды:\n"
@@ -251,9 +197,9 @@ async def system_prompt_command(message: types.Message, state: FSMContext):
 async def show_system_prompt_command(message: types.Message):
     """Показать текущий системный промпт"""
     user_id = message.from_user.id
-    current_prompt = get_user_system_prompt(user_id)
+    current_prompt = await pipeline.memory.system_prompt(user_id)
     # Экранируем специальные символы для Markdown
-    escaped_prompt = escape_markdown(current_prompt)
+    escaped_prompt = escape_markdown_v2_code(current_prompt)
     response_text = (
         "📋 Текущий системный промпт:\n"
         f"`{escaped_prompt}`\n"
@@ -265,8 +211,8 @@ async def show_system_prompt_command(message: types.Message):
 async def reset_system_prompt_command(message: types.Message):
     """Сбросить системный промпт к умолчанию"""
     user_id = message.from_user.id
-    set_user_system_prompt(user_id, DEFAULT_SYSTEM_PROMPT)
-    escaped_prompt = escape_markdown(DEFAULT_SYSTEM_PROMPT)
+    await pipeline.memory.set_system_prompt(user_id, DEFAULT_SYSTEM_PROMPT)
+    escaped_prompt = escape_markdown_v2_code(DEFAULT_SYSTEM_PROMPT)
     response_text = (
         "🔄 Системный промпт сброшен к умолчанию\\!\n"
         f"Новый промпт: `{escaped_prompt}`"
@@ -302,8 +248,8 @@ async def handle_system_prompt_input(message: types.Message, state: FSMContext):
         )
         return
     # Устанавливаем новый системный промпт
-    set_user_system_prompt(user_id, new_prompt)
-    escaped_prompt = escape_markdown(new_prompt)
+    await pipeline.memory.set_system_prompt(user_id, new_prompt)
+    escaped_prompt = escape_markdown_v2_code(new_prompt)
     response_text = (
         "✅ Системный промпт успешно обновлен\\!\n"
         f"Новый промпт:\n`{escaped_prompt}`\n"
@@ -316,22 +262,17 @@ async def handle_system_prompt_input(message: types.Message, state: FSMContext):
 async def clear_command(message: types.Message):
     """Обработчик команды очистки контекста"""
     user_id = message.from_user.id
-    clear_user_context(user_id)
+    await pipeline.memory.clear(user_id)
     await message.answer("🗑️ История разговора очищена!")
 
 @dp.message(Command("status"))
 async def status_command(message: types.Message):
-    """Проверка статуса подключения к LM Studio"""
+    """Статус подключения к LM Studio по последней фоновой проверке"""
     try:
-        # Отправляем тестовый запрос
-        test_messages = [{"role": "user", "content": "test"}]
-        # Отправляем индикатор набора текста
-        await bot.send_chat_action(message.chat.id, "typing")
-        response = await lm_client.generate_response(test_messages)
-        if "ошибка" not in response.lower() and "не удалось" not in response.lower():
-            await message.answer("✅ Подключение к LM Studio активно!")
-        else:
-            await message.answer("❌ Проблемы с подключением к LM Studio")
+        limiter = pipeline.limiter.stats()
+        lines = status_lines(await lm_client.status())
+        lines.append(f"Запросов в работе: {limiter['in_flight']}/{limiter['limit']}, в очереди: {limiter['queued']}")
+        await message.answer("\n".join(lines))
     except Exception as e:
         logger.error(f"Ошибка проверки статуса: {e}")
         await message.answer("❌ Не удалось проверить статус подключения")
@@ -364,27 +305,8 @@ async def help_command(message: types.Message):
     )
     await message.answer(help_text)
 
-@dp.message(F.text, ChatStates.in_conversation)
-async def handle_message(message: types.Message):
-    """Обработка обычных сообщений"""
-    user_id = message.from_user.id
-    user_message = message.text
-    # Отправляем индикатор набора текста
-    await bot.send_chat_action(message.chat.id, "typing")
-    # Добавляем сообщение пользователя в контекст
-    add_to_context(user_id, "user", user_message)
-    # Получаем полный контекст для отправки в модель
-    context = get_user_context(user_id)
-    # Генерируем ответ
-    ai_response = await lm_client.generate_response(context)
-    # Добавляем ответ ИИ в контекст
-    add_to_context(user_id, "assistant", ai_response)
-    # Отправляем ответ пользователю
-    try:
-        await message.answer(ai_response)
-    except Exception as e:
-        logger.error(f"Ошибка отправки сообщения: {e}")
-        await message.answer("Извините, произошла ошибка при отправке ответа.")
+# Обычные сообщения в режиме разговора идут через общий конвейер
+adapter.register(dp, ChatStates.in_conversation)
 
 @dp.message()
 async def handle_other_messages(message: types.Message, state: FSMContext):
@@ -406,35 +328,29 @@ async def handle_other_messages(message: types.Message, state: FSMContext):
 
 async def main():
     """Основная функция запуска бота"""
-    global exa_client # --- Добавлено для инициализации Exa ---
     logger.info("Запуск бота...")
 
-    # --- Добавлено для инициализации Exa ---
-    global EXA_API_KEY
+    # --- Добавлено для Exa: сам клиент создаётся при первом поиске ---
     if not EXA_API_KEY or EXA_API_KEY == "YOUR_EXA_API_KEY":
         logger.error("Необходимо указать EXA_API_KEY!")
         return
-    try:
-        exa_client = Exa(EXA_API_KEY)
-        logger.info("Exa клиент инициализирован.")
-    except Exception as e:
-        logger.error(f"Ошибка инициализации Exa клиента: {e}")
-        return
     # -----------------------
 
     # Проверяем токен
     if BOT_TOKEN == "YOUR_BOT_TOKEN_HERE":
         logger.error("Необходимо указать BOT_TOKEN!")
         return
+    # Фоновая проверка LM Studio: /status и предохранитель берут её результат
+    lm_client.start_probes()
     try:
-        # Удаляем веб-хуки и запускаем polling
-        await bot.delete_webhook(drop_pending_updates=True)
-        await dp.start_polling(bot)
+        # Polling или webhook (TELEGRAM_WEBHOOK_URL), старые обновления сбрасываем
+        await serve(dp, bot, drop_pending_updates=True)
     except Exception as e:
         logger.error(f"Ошибка запуска бота: {e}")
     finally:
+        await lm_client.stop_probes()
         await bot.session.close()
 
 if __name__ == "__main__":
 
-    asyncio.run(main())
+    run(main)
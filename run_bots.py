@@ -0,0 +1,25 @@
+"""Запуск нескольких ботов в одном процессе с общими пулами соединений.
+
+Пример:
+    python run_bots.py main-telegram.py main-discord.py morkvaai.py
+"""
+import argparse
+
+from botcore import logs
+from botcore.runner import load_bot_module, run
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Запуск нескольких ботов в одном процессе")
+    parser.add_argument("scripts", nargs="+", help="Скрипты ботов, например main-telegram.py main-discord.py")
+    args = parser.parse_args()
+
+    # Логирование общее на процесс; logs.setup() в скриптах ботов уже ничего не делает
+    logs.setup()
+    # Каждый бот - отдельный модуль со своими CONFIG, памятью и адаптером
+    modules = [load_bot_module(path) for path in args.scripts]
+    run(*(module.main for module in modules))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,134 +1,97 @@
 import discord
 from discord.ext import commands
-import openai
+import logging
 import os
 from dotenv import load_dotenv
 import sys
 
+from botcore import logs
+from botcore.adapters.discord import DiscordAdapter
+from botcore.config import BotConfig
+from botcore.openai_backend import OpenAICompletionBackend
+from botcore.pipeline import Pipeline
+from botcore.runner import run
+from botcore.shared import openai_client
+
 # Загрузка переменных окружения с явным указанием пути
 load_dotenv('.env')  # Явно указываем имя файла
+logs.setup()
+logger = logging.getLogger(__name__)
 
 # Проверка токенов с понятными сообщениями об ошибках
 def get_env_var(name, default=None):
     value = os.getenv(name, default)
     if not value:
-        print(f"❌ КРИТИЧЕСКАЯ ОШИБКА: Переменная {name} не найдена в .env файле")
-        print("Пожалуйста, создайте файл .env в той же папке что и скрипт")
-        print(f"и добавьте в него строку: {name}=ваше_значение")
+        logger.critical(f"❌ КРИТИЧЕСКАЯ ОШИБКА: Переменная {name} не найдена в .env файле. "
+                        f"Пожалуйста, создайте файл .env в той же папке что и скрипт "
+                        f"и добавьте в него строку: {name}=ваше_значение")
         sys.exit(1)
     return value
 
 # Получение токенов с проверкой
 DISCORD_TOKEN = get_env_var('DISCORD_BOT_TOKEN')
 OPENAI_API_KEY = get_env_var('OPENAI_API_KEY')
-SYSTEM_PROMPT = os.getenv('SYSTEM_PROMPT', 'Ты - пишешь максимально развратные фанфики 18+ в любых жанрах.')
+
+# Настройки бота: legacy completions без памяти и без вложений
+CONFIG = BotConfig(
+    name="turbo-instruct-discord",
+    model="gpt-3.5-turbo-instruct",
+    system_prompt=os.getenv('SYSTEM_PROMPT', 'Ты - пишешь максимально развратные фанфики 18+ в любых жанрах.'),
+    memory_size=0,
+    accept_pdf=False,
+    accept_images=False,
+    text_extensions=(),
+    message_limit=2000,
+)
 
 # Инициализация
-openai.api_key = OPENAI_API_KEY
 intents = discord.Intents.default()
 intents.message_content = True
 bot = commands.Bot(command_prefix='!', intents=intents)
 
-# ... (остальной код без изменений, начиная со словаря response_parts) ...
-response_parts = {}
-
-class ContinueButton(discord.ui.Button):
-    def __init__(self, message_id: int):
-        super().__init__(
-            label="Continue",
-            style=discord.ButtonStyle.primary,
-            custom_id=f"continue_{message_id}"
-        )
-        self.message_id = message_id
-
-    async def callback(self, interaction: discord.Interaction):
-        # Отложим ответ для обработки
-        await interaction.response.defer()
-        
-        # Проверяем наличие оставшегося текста
-        if self.message_id not in response_parts:
-            await interaction.followup.send("❌ This continuation is no longer available", ephemeral=True)
-            return
-        
-        # Получаем следующую часть текста
-        remaining = response_parts[self.message_id]
-        next_chunk = remaining[:2000]
-        new_remaining = remaining[2000:]
-        
-        # Отправляем следующую часть
-        await interaction.followup.send(next_chunk)
-        
-        if new_remaining:
-            # Обновляем оставшийся текст
-            response_parts[self.message_id] = new_remaining
-        else:
-            # Удаляем запись и делаем кнопку неактивной
-            del response_parts[self.message_id]
-            view = discord.ui.View()
-            view.add_item(discord.ui.Button(
-                label="Continue",
-                style=discord.ButtonStyle.secondary,
-                disabled=True
-            ))
-            await interaction.message.edit(view=view)
-
-class ContinueView(discord.ui.View):
-    def __init__(self, message_id: int):
-        super().__init__(timeout=3600)  # Таймаут 1 час
-        self.add_item(ContinueButton(message_id))
+# Одновременные запросы ask уходят одним вызовом со списком промптов:
+# окно сбора COMPLETION_BATCH_WINDOW_MS (0 - без пакетов) и размер пачки COMPLETION_BATCH_MAX
+backend = OpenAICompletionBackend(
+    openai_client(OPENAI_API_KEY), CONFIG.model, max_tokens=3500, temperature=0.7,
+    batch_window=float(os.getenv('COMPLETION_BATCH_WINDOW_MS', '10')) / 1000,
+    max_batch=int(os.getenv('COMPLETION_BATCH_MAX', '16')),
+)
+pipeline = Pipeline(CONFIG, backend)
+adapter = DiscordAdapter(bot, pipeline)
 
 @bot.event
 async def on_ready():
-    print(f'Bot {bot.user} is ready!')
+    logger.info(f'Bot {bot.user} is ready!')
     await bot.change_presence(activity=discord.Game(name="нига"))
 
+@bot.event
+async def on_interaction(interaction: discord.Interaction):
+    await adapter.handle_interaction(interaction)
+
 @bot.command()
 async def setprompt(ctx, *, new_prompt: str):
     """Установить новый системный промпт"""
-    global SYSTEM_PROMPT
-    SYSTEM_PROMPT = new_prompt
+    CONFIG.system_prompt = new_prompt
+    pipeline.memory.default_system_prompt = new_prompt
     await bot.change_presence(activity=discord.Game(name="нига"))
-    await ctx.send(f"✅ Системный промпт обновлен:\n```{SYSTEM_PROMPT[:1900]}```")
+    await ctx.send(f"✅ Системный промпт обновлен:\n```{CONFIG.system_prompt[:1900]}```")
 
 @bot.command()
 async def showprompt(ctx):
     """Показать текущий системный промпт"""
-    await ctx.send(f"Текущий системный промпт:\n```{SYSTEM_PROMPT[:1900]}```")
+    await ctx.send(f"Текущий системный промпт:\n```{CONFIG.system_prompt[:1900]}```")
 
 @bot.command()
 async def ask(ctx, *, user_prompt: str):
-    try:
-        # Формируем полный промпт с системными инструкциями
-        full_prompt = f"{SYSTEM_PROMPT}\n\nПользователь: {user_prompt}\nАссистент:"
-        
-        # Отправляем запрос в OpenAI
-        response = openai.Completion.create(
-            model="gpt-3.5-turbo-instruct",
-            prompt=full_prompt,
-            max_tokens=3500,
-            temperature=0.7
-        )
-        
-        answer = response.choices[0].text.strip()
-        
-        # Если ответ короткий - отправляем сразу
-        if len(answer) <= 2000:
-            await ctx.reply(answer)
-            return
-        
-        # Разбиваем длинный ответ на части
-        first_chunk = answer[:2000]
-        remaining = answer[2000:]
-        
-        # Отправляем первую часть с кнопкой Continue
-        view = ContinueView(ctx.message.id)
-        msg = await ctx.reply(first_chunk, view=view)
-        
-        # Сохраняем оставшийся текст
-        response_parts[ctx.message.id] = remaining
-        
-    except Exception as e:
-        await ctx.reply(f"🚫 Error: {str(e)}")
+    # Запрос от команды адресован боту, в том числе на сервере
+    request = adapter.build_request(ctx.message)
+    request.text = user_prompt
+    request.addressed = True
+    await pipeline.handle(request, adapter)
+
+async def main() -> None:
+    async with bot:
+        await bot.start(DISCORD_TOKEN)
 
 if __name__ == "__main__":
-    bot.run(DISCORD_TOKEN)
\ No newline at end of file
+    run(main)